@@ -18,12 +18,16 @@ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVE
 POSSIBILITY OF SUCH DAMAGE.
 """
 
+from time import perf_counter
+import numpy as np
+
 
 class Ads7866:
     """Driver for ADS7866, 12-bit ADC."""
 
     def __init__(self, interface):
         self._iface = interface
+        self._sample_rate = None
 
     def read(self):
         """Make ADC measurement.
@@ -34,3 +38,65 @@ class Ads7866:
         rdata = self._iface.read(readlen=2)
         word = ((rdata[0] << 8) | rdata[1]) & 0xFFF
         return (word / 4096)
+
+    def read_block(self, count, dtype=np.float32):
+        """Make back-to-back ADC measurements in a single bus transaction.
+
+        Args:
+            count (int): number of measurements, integer > 0
+            dtype (type, optional): np.float32 or np.float64 for measurements
+                                    normalized to [0, 1), np.uint16 for raw
+                                    12-bit codes
+
+        Returns:
+            ndarray: measurements of shape (count,)
+        """
+        if not isinstance(count, int) or count < 1:
+            raise ValueError('count: Expected integer > 0.')
+        if dtype not in (np.float32, np.float64, np.uint16):
+            raise TypeError('dtype: Expected np.float32, np.float64 or np.uint16.')
+        start = perf_counter()
+        rdata = self._iface.read_repeated(2, count)
+        self._sample_rate = count / (perf_counter() - start)
+        return self.decode(rdata, dtype)
+
+    def queue_block(self, transaction, count):
+        """Queue back-to-back ADC measurements in an open transaction.
+
+        Args:
+            transaction (Transaction): open transaction of the ADC's controller
+            count (int): number of measurements, integer > 0
+
+        Returns:
+            PendingRead: raw data, decode with decode() after commit
+        """
+        if not isinstance(count, int) or count < 1:
+            raise ValueError('count: Expected integer > 0.')
+        return transaction.read(self._iface, 2, count)
+
+    @staticmethod
+    def decode(rdata, dtype=np.float32):
+        """Decode raw ADC words.
+
+        Args:
+            rdata (bytes): big-endian 16-bit words as read from the ADC
+            dtype (type, optional): np.float32 or np.float64 for measurements
+                                    normalized to [0, 1), np.uint16 for raw
+                                    12-bit codes
+
+        Returns:
+            ndarray: measurements
+        """
+        words = np.frombuffer(rdata, dtype='>u2') & np.uint16(0xFFF)
+        if dtype == np.uint16:
+            return words.astype(np.uint16)
+        return words.astype(dtype) * dtype(1 / 4096)
+
+    @property
+    def sample_rate(self):
+        """Sample rate achieved by the last read_block() call.
+
+        Returns:
+            float: sample rate in Hz, None if no block was read yet
+        """
+        return self._sample_rate
@@ -0,0 +1,291 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from collections import deque
+from threading import Condition, Thread
+import asyncio
+from .io import MONITORING, priority
+from .merlin2b_board import Merlin2bBoard, Merlin2bEval, Merlin2bTest
+
+
+# Board methods that only write, consecutive calls are batched in one transaction
+BATCHED = ('apply', 'set_weights', 'clear_weights', 'set_vga_gain', 'set_gain_profile',
+           'set_input_dc_offset', 'set_output_dc_offset', 'set_downmixer_gain',
+           'set_downmixer_iq_correction', 'set_downmixer_im2_correction',
+           'set_downmixer_dc_offset')
+
+UNBATCHED = ('init', 'reset', 'probe', 'setup', 'get_vga_gain', 'get_vga_gain_table',
+             'get_gain_profile', 'get_input_dc_offset', 'get_output_dc_offset',
+             'get_weights', 'get_downmixer_gain', 'get_downmixer_gain_range',
+             'get_downmixer_iq_correction', 'get_downmixer_im2_correction',
+             'get_downmixer_dc_offset')
+
+
+class IoWorker:
+    """Thread that runs the bus operations of one controller.
+
+    Calls are queued from the event loop and run in order. Consecutive batchable
+    calls that are queued while the worker is busy run together in one transaction
+    and their results are returned once it is committed. A failing call only fails
+    its own awaitable: the batch is discarded, as the call may have queued part of
+    its writes, and its calls are run again in a transaction each.
+    """
+
+    def __init__(self, controller, name='merlin2-io'):
+        """
+        Args:
+            controller (Controller): controller of the calls
+            name (str, optional): thread name
+        """
+        self._ctrl = controller
+        self._cond = Condition()
+        self._queue = deque()
+        self._closed = False
+        self.num_calls = 0
+        self.num_batches = 0
+        self.num_batched_calls = 0
+        self._thread = Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, args=(), kwargs=None, batch=False):
+        """Queue a call.
+
+        Args:
+            fn (callable): function to call on the worker thread
+            args (tuple, optional): positional arguments
+            kwargs (dict, optional): keyword arguments
+            batch (bool, optional): call may share a transaction with other calls
+
+        Returns:
+            asyncio.Future: result of the call
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('I/O worker is closed.')
+            self._queue.append((fn, args, kwargs or {}, batch, future, loop))
+            self._cond.notify()
+        return future
+
+    def close(self):
+        """Finish queued calls and stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                items = [self._queue.popleft()]
+                if items[0][3]:
+                    while self._queue and self._queue[0][3]:
+                        items.append(self._queue.popleft())
+            self.num_calls += len(items)
+            if len(items) == 1:
+                self._resolve(items, [self._call(items[0])])
+                continue
+            self.num_batches += 1
+            self.num_batched_calls += len(items)
+            try:
+                outcomes = self._transact(items)
+            except _CallFailed:
+                outcomes = [self._transact_one(item) for item in items]
+            except Exception as e:
+                outcomes = [(None, e)] * len(items)
+            self._resolve(items, outcomes)
+
+    def _transact(self, items):
+        outcomes = []
+        with self._ctrl.transaction():
+            for item in items:
+                outcome = self._call(item)
+                if outcome[1] is not None:
+                    raise _CallFailed(outcome[1])
+                outcomes.append(outcome)
+        return outcomes
+
+    def _transact_one(self, item):
+        try:
+            return self._transact([item])[0]
+        except _CallFailed as e:
+            return None, e.error
+        except Exception as e:
+            return None, e
+
+    @staticmethod
+    def _call(item):
+        fn, args, kwargs = item[:3]
+        try:
+            return fn(*args, **kwargs), None
+        except Exception as e:
+            return None, e
+
+    @staticmethod
+    def _resolve(items, outcomes):
+        for item, (result, error) in zip(items, outcomes):
+            future, loop = item[4:]
+            try:
+                loop.call_soon_threadsafe(_set_future, future, result, error)
+            except RuntimeError:
+                # Event loop closed, nobody is waiting
+                pass
+
+
+class _CallFailed(Exception):
+    """Discards the transaction of a failed call."""
+
+    def __init__(self, error):
+        super().__init__(error)
+        self.error = error
+
+
+def _set_future(future, result, error):
+    if future.done():
+        return
+    if error is None:
+        future.set_result(result)
+    else:
+        future.set_exception(error)
+
+
+def _board_method(name, batch):
+    async def method(self, *args, **kwargs):
+        return await self._board_worker.submit(getattr(self.board, name), args, kwargs, batch)
+    method.__name__ = name
+    method.__qualname__ = 'AsyncMerlin2bBoard.' + name
+    method.__doc__ = getattr(Merlin2bBoard, name).__doc__
+    return method
+
+
+class AsyncMerlin2bBoard:
+    """Asyncio facade of a board.
+
+    Board methods are coroutines with the arguments of the board methods. They run
+    on a dedicated I/O thread per board, so the event loop never blocks on the bus.
+    Writes issued concurrently, e.g. with asyncio.gather(), are batched into single
+    transactions. On multi-interface layouts the ADC has its own I/O thread.
+    """
+
+    BOARD = None
+
+    def __init__(self, *args, board=None, **kwargs):
+        """
+        Args:
+            args, kwargs: board constructor arguments
+            board (Merlin2bBoard, optional): existing board to wrap instead
+        """
+        self.board = self.BOARD(*args, **kwargs) if board is None else board
+        name = 'merlin2-io-{}'.format(self.board.serial_number)
+        self._board_worker = IoWorker(self.board._io, name)
+        adc_io = getattr(self.board, '_adc_io', self.board._io)
+        self._adc_worker = self._board_worker if adc_io is self.board._io else \
+            IoWorker(adc_io, name + '-adc')
+
+    @property
+    def serial_number(self):
+        return self.board.serial_number
+
+    def stats(self):
+        """Call statistics of the I/O threads.
+
+        Returns:
+            dict: 'calls', 'batches' and 'batched_calls' summed over the threads
+        """
+        workers = {self._board_worker, self._adc_worker}
+        return {'calls': sum(w.num_calls for w in workers),
+                'batches': sum(w.num_batches for w in workers),
+                'batched_calls': sum(w.num_batched_calls for w in workers)}
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a function on the board's I/O thread, e.g. a sequence of board calls.
+
+        Args:
+            fn (callable): function, called as fn(*args, **kwargs)
+
+        Returns:
+            object: return value of fn
+        """
+        return await self._board_worker.submit(fn, args, kwargs)
+
+    def close(self):
+        """Finish queued calls and stop the I/O threads."""
+        for worker in {self._board_worker, self._adc_worker}:
+            worker.close()
+
+    async def aclose(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+
+for _name in BATCHED:
+    setattr(AsyncMerlin2bBoard, _name, _board_method(_name, True))
+for _name in UNBATCHED:
+    setattr(AsyncMerlin2bBoard, _name, _board_method(_name, False))
+
+
+class AsyncMerlin2bTest(AsyncMerlin2bBoard):
+    """Asyncio facade of Merlin2bTest."""
+
+    BOARD = Merlin2bTest
+
+
+class AsyncMerlin2bEval(AsyncMerlin2bBoard):
+    """Asyncio facade of Merlin2bEval with ADC reads and streams."""
+
+    BOARD = Merlin2bEval
+
+    async def adc_read(self):
+        """Make ADC measurement, see Ads7866.read()."""
+        return await self._adc_worker.submit(self.board.adc.read)
+
+    async def adc_read_block(self, count, **kwargs):
+        """Make back-to-back ADC measurements, see Ads7866.read_block()."""
+        return await self._adc_worker.submit(self.board.adc.read_block, (count,), kwargs)
+
+    async def adc_stream(self, block_size=64, interval=0., **kwargs):
+        """Stream blocks of ADC measurements at MONITORING bus priority.
+
+        Args:
+            block_size (int, optional): measurements per block
+            interval (float, optional): pause between blocks in seconds
+            kwargs: read_block() arguments
+
+        Returns:
+            async iterator: ndarray blocks of shape (block_size,)
+        """
+        def read():
+            with priority(MONITORING):
+                return self.board.adc.read_block(block_size, **kwargs)
+
+        while True:
+            yield await self._adc_worker.submit(read)
+            if interval:
+                await asyncio.sleep(interval)
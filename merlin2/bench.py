@@ -0,0 +1,310 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+
+Benchmarks of the board API.
+
+Every case times one public board call and counts the transport traffic it causes:
+USB writes ('transfers'), bytes and transport time. Boards on a plan.PlanController
+report the transfer time of the latency model, boards on hardware the time from the
+controller statistics. Results are plain dicts that can be saved as JSON and
+compared against a baseline, e.g. to gate driver upgrades:
+
+    python -m merlin2.bench --output new.json --baseline old.json
+"""
+
+from collections import namedtuple
+from datetime import datetime, timezone
+from statistics import median
+from time import perf_counter, process_time
+import argparse
+import json
+import platform
+import sys
+import numpy as np
+from . import __version__
+from .plan import PlanController, LatencyModel, plan_eval, plan_test
+
+
+Case = namedtuple('Case', ('name', 'prepare', 'call'))
+
+# Metrics compared by compare() and whether they are deterministic
+METRICS = (('transfers', True), ('bytes_out', True), ('bytes_in', True),
+           ('transport_time', False), ('wall_time', False), ('cpu_time', False))
+
+
+def board_cases(board, num_samples=1024):
+    """Benchmark cases of the public board API.
+
+    Setters write back what the matching getter reads after setup, so every case
+    leaves the board configured as before.
+
+    Args:
+        board (Merlin2bBoard): board
+        num_samples (int, optional): ADC block size
+
+    Returns:
+        list: Case(name, prepare, call), prepare is called once before timing
+    """
+    rng = np.random.default_rng(0)
+    weights = 0.5 * np.exp(2j * np.pi * rng.random((12, 4)))
+    other = weights.copy()
+    other[::4] *= 1j
+    state = {}
+
+    def setup():
+        board.setup(2, 2, 80e6, 1700e6)
+
+    def snapshot():
+        setup()
+        state['gains'] = board.get_gain_profile()
+        state['input_dc'] = board.get_input_dc_offset(0)
+        state['output_dc'] = board.get_output_dc_offset(0)
+        state['dm_gain'] = board.get_downmixer_gain(0)
+        state['dm_iq'] = board.get_downmixer_iq_correction(0)
+        state['dm_im2'] = board.get_downmixer_im2_correction(0)
+        state['dm_dc'] = board.get_downmixer_dc_offset(0)
+        state['written'] = board.set_weights(weights)
+
+    cases = [
+        Case('init', None, board.init),
+        Case('probe', None, board.probe),
+        Case('setup', None, setup),
+        Case('setup_chained', None, lambda: board.setup(2, 2, 80e6, 1700e6, chain=True)),
+        Case('set_weights', snapshot, lambda: board.set_weights(weights)),
+        Case('set_weights_diff', snapshot,
+             lambda: board.set_weights(other, previous=state['written'])),
+        Case('get_weights', snapshot, board.get_weights),
+        Case('clear_weights', snapshot, board.clear_weights),
+        Case('set_gain_profile', snapshot, lambda: board.set_gain_profile(state['gains'])),
+        Case('get_gain_profile', snapshot, board.get_gain_profile),
+        Case('set_input_dc_offset', snapshot,
+             lambda: board.set_input_dc_offset(*state['input_dc'], input=0)),
+        Case('get_input_dc_offset', snapshot, lambda: board.get_input_dc_offset(0)),
+        Case('set_output_dc_offset', snapshot,
+             lambda: board.set_output_dc_offset(*state['output_dc'], output=0)),
+        Case('get_output_dc_offset', snapshot, lambda: board.get_output_dc_offset(0)),
+        Case('set_downmixer_gain', snapshot,
+             lambda: board.set_downmixer_gain(state['dm_gain'], input=0)),
+        Case('get_downmixer_gain', snapshot, lambda: board.get_downmixer_gain(0)),
+        Case('set_downmixer_iq_correction', snapshot,
+             lambda: board.set_downmixer_iq_correction(*state['dm_iq'], input=0)),
+        Case('get_downmixer_iq_correction', snapshot,
+             lambda: board.get_downmixer_iq_correction(0)),
+        Case('set_downmixer_im2_correction', snapshot,
+             lambda: board.set_downmixer_im2_correction(*state['dm_im2'], input=0)),
+        Case('get_downmixer_im2_correction', snapshot,
+             lambda: board.get_downmixer_im2_correction(0)),
+        Case('set_downmixer_dc_offset', snapshot,
+             lambda: board.set_downmixer_dc_offset(*state['dm_dc'], input=0)),
+        Case('get_downmixer_dc_offset', snapshot, lambda: board.get_downmixer_dc_offset(0)),
+    ]
+    if hasattr(board, 'adc'):
+        cases.append(Case('adc_read', None, board.adc.read))
+        cases.append(Case('adc_read_block', None, lambda: board.adc.read_block(num_samples)))
+    return cases
+
+
+def run(board, repeat=10, cases=None):
+    """Run benchmark cases on an initialized board.
+
+    Args:
+        board (Merlin2bBoard): board on a PlanController or hardware Controller
+        repeat (int, optional): timed calls per case
+        cases (sequence, optional): case names, default all
+
+    Returns:
+        dict: results by case name, each a dict of per-call 'transfers' (USB writes),
+              'bytes_out', 'bytes_in', 'transport_time', median 'wall_time' and
+              'cpu_time', and 'min_wall_time' in seconds
+    """
+    if not isinstance(repeat, int) or repeat < 1:
+        raise ValueError('repeat: Expected integer >= 1.')
+    available = board_cases(board)
+    if cases is not None:
+        unknown = set(cases) - {c.name for c in available}
+        if unknown:
+            raise ValueError('cases: Unknown cases {}.'.format(sorted(unknown)))
+        available = [c for c in available if c.name in cases]
+    controllers = list(board._ios.values())
+    planned = isinstance(controllers[0], PlanController)
+    if not planned:
+        stats_enabled = [c.stats() is not None for c in controllers]
+        for controller in controllers:
+            controller.enable_stats()
+    results = {}
+    try:
+        for case in available:
+            if case.prepare is not None:
+                case.prepare()
+            walls, cpus, counters = [], [], []
+            for _ in range(repeat):
+                _reset(controllers, planned)
+                wall, cpu = perf_counter(), process_time()
+                case.call()
+                cpus.append(process_time() - cpu)
+                walls.append(perf_counter() - wall)
+                counters.append(_counters(controllers, planned))
+            transfers, bytes_out, bytes_in, transport_time = \
+                (median(values) for values in zip(*counters))
+            results[case.name] = {
+                'transfers': transfers, 'bytes_out': bytes_out, 'bytes_in': bytes_in,
+                'transport_time': transport_time, 'wall_time': median(walls),
+                'min_wall_time': min(walls), 'cpu_time': median(cpus),
+            }
+    finally:
+        if not planned:
+            for controller, enabled in zip(controllers, stats_enabled):
+                controller.enable_stats(enabled)
+    return results
+
+
+def _reset(controllers, planned):
+    for controller in controllers:
+        if planned:
+            controller.reset_report()
+        else:
+            controller.reset_stats()
+
+
+def _counters(controllers, planned):
+    # Summed over the interfaces of the board
+    totals = [0, 0, 0, 0.]
+    for controller in controllers:
+        if planned:
+            report = controller.report()
+            counters = report.usb_writes, report.bytes_out, report.bytes_in, report.time
+        else:
+            stats = controller.stats()
+            counters = stats['usb_writes'], stats['bytes_out'], stats['bytes_in'], stats['time']
+        totals = [t + c for t, c in zip(totals, counters)]
+    return tuple(totals)
+
+
+def save(results, path, **metadata):
+    """Save results as JSON with version and platform information.
+
+    Args:
+        results (dict): results of run()
+        path (str): file name
+        metadata: additional entries, e.g. the latency model
+    """
+    document = {
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': datetime.now(timezone.utc).isoformat(),
+        'metadata': metadata,
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    """Load results saved by save().
+
+    Args:
+        path (str): file name
+
+    Returns:
+        dict: results by case name
+    """
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(baseline, results, tolerance=0.25, metrics=METRICS):
+    """Compare results against a baseline.
+
+    Deterministic metrics such as transfer and byte counts regress on any increase,
+    others such as times when they increase by more than the relative tolerance.
+
+    Args:
+        baseline (dict): baseline results
+        results (dict): new results
+        tolerance (float, optional): relative tolerance of times
+        metrics (sequence, optional): (metric, deterministic) pairs to compare
+
+    Returns:
+        list: (case, metric, baseline, new) tuples of regressions
+    """
+    regressions = []
+    for name in sorted(set(baseline) & set(results)):
+        for metric, exact in metrics:
+            old, new = baseline[name][metric], results[name][metric]
+            if new > old * (1 if exact else 1 + tolerance):
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m merlin2.bench',
+                                     description='Benchmark the Merlin2 board API.')
+    parser.add_argument('--board', choices=('eval', 'test'), default='eval')
+    parser.add_argument('--layout', default='ft232h', help='board layout, e.g. ft2232h')
+    parser.add_argument('--hardware', action='store_true',
+                        help='run on hardware instead of the planning controller')
+    parser.add_argument('--serial-number', help='hardware serial number')
+    parser.add_argument('--usb-write', type=float, default=125e-6,
+                        help='simulated USB write latency in seconds')
+    parser.add_argument('--usb-read', type=float, default=500e-6,
+                        help='simulated USB read latency in seconds')
+    parser.add_argument('--usb-byte-rate', type=float, default=30e6,
+                        help='simulated USB throughput in bytes per second')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--case', action='append', dest='cases', help='case to run')
+    parser.add_argument('--output', help='save results as JSON')
+    parser.add_argument('--baseline', help='fail on regressions against saved results')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='relative tolerance of times')
+    args = parser.parse_args(argv)
+
+    if args.hardware:
+        from . import Merlin2bEval, Merlin2bTest
+        board = (Merlin2bEval if args.board == 'eval' else Merlin2bTest)(
+            args.serial_number, layout=args.layout)
+        metadata = {'board': args.board, 'layout': args.layout, 'hardware': True,
+                    'serial_number': board.serial_number}
+    else:
+        latency = LatencyModel(args.usb_write, args.usb_read, args.usb_byte_rate)
+        board = (plan_eval if args.board == 'eval' else plan_test)(latency=latency,
+                                                                   layout=args.layout)
+        metadata = {'board': args.board, 'layout': args.layout, 'hardware': False,
+                    'latency': vars(latency)}
+    board.init()
+    results = run(board, repeat=args.repeat, cases=args.cases)
+
+    print('{:<30} {:>9} {:>9} {:>9} {:>12} {:>12} {:>12}'.format(
+        'case', 'transfers', 'bytes out', 'bytes in', 'transport us', 'wall us', 'cpu us'))
+    for name, r in results.items():
+        print('{:<30} {:>9.0f} {:>9.0f} {:>9.0f} {:>12.1f} {:>12.1f} {:>12.1f}'.format(
+            name, r['transfers'], r['bytes_out'], r['bytes_in'], r['transport_time'] * 1e6,
+            r['wall_time'] * 1e6, r['cpu_time'] * 1e6))
+    if args.output:
+        save(results, args.output, **metadata)
+    if args.baseline:
+        regressions = compare(load(args.baseline), results, args.tolerance)
+        for name, metric, old, new in regressions:
+            print('REGRESSION {} {}: {:g} -> {:g}'.format(name, metric, old, new))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
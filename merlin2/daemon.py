@@ -0,0 +1,371 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+
+Board daemon serving the board API over a Unix domain socket.
+
+The daemon opens and initializes a board once and keeps it, so clients attach
+without re-opening the FTDI device or resetting the analog state:
+
+    python -m merlin2.daemon --socket /tmp/merlin2.sock --init --setup 2 2 80e6 1700e6
+
+Messages are frames of a header with the pickle and buffer lengths, a pickle
+(protocol 5) and its out-of-band buffers. NumPy arrays travel as raw buffers that
+are sent straight from the array memory and received into the array of the other
+side, without intermediate copies. Frames are loaded with an unpickler that only
+resolves NumPy arrays and builtin types and exceptions, and the lengths in the
+header are checked against limits before the frame is received.
+"""
+
+from threading import Lock, Thread
+import argparse
+import builtins
+import io
+import os
+import pickle
+import socket
+import struct
+from .aio import BATCHED, UNBATCHED
+
+
+HEADER = struct.Struct('<II')
+
+# Frame limits, checked against the header before anything is allocated
+MAX_PICKLE_SIZE = 1 << 20
+MAX_BUFFERS = 256
+MAX_BUFFER_SIZE = 1 << 30
+
+# Globals a frame may reference: the NumPy array reconstruction and builtin types
+# and exceptions, so a frame cannot call arbitrary functions while it is loaded
+NUMPY_GLOBALS = frozenset((
+    ('numpy', 'dtype'),
+    ('numpy', 'ndarray'),
+    ('numpy.core.multiarray', '_reconstruct'),
+    ('numpy.core.multiarray', 'scalar'),
+    ('numpy.core.numeric', '_frombuffer'),
+    ('numpy._core.multiarray', '_reconstruct'),
+    ('numpy._core.multiarray', 'scalar'),
+    ('numpy._core.numeric', '_frombuffer'),
+))
+BUILTIN_TYPES = frozenset(('bool', 'int', 'float', 'complex', 'str', 'bytes', 'bytearray',
+                           'tuple', 'list', 'dict', 'set', 'frozenset', 'slice', 'range'))
+
+ADC_METHODS = ('adc.read', 'adc.read_block')
+
+# Methods that reset the analog state, only served if allowed
+RESET_METHODS = ('init', 'reset')
+
+
+def send_message(sock, obj):
+    """Send an object as frame.
+
+    Args:
+        sock (socket): connected socket
+        obj (object): picklable object
+    """
+    buffers = []
+    data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    raws = [b.raw() for b in buffers]
+    header = HEADER.pack(len(data), len(raws)) + \
+        struct.pack('<{}Q'.format(len(raws)), *(r.nbytes for r in raws))
+    chunks = [memoryview(header), memoryview(data)] + [r.cast('B') for r in raws]
+    while chunks:
+        sent = sock.sendmsg(chunks[:64])
+        while sent:
+            if sent >= chunks[0].nbytes:
+                sent -= chunks[0].nbytes
+                chunks.pop(0)
+            else:
+                chunks[0] = chunks[0][sent:]
+                sent = 0
+        while chunks and not chunks[0].nbytes:
+            chunks.pop(0)
+
+
+def recv_message(sock):
+    """Receive a frame.
+
+    Args:
+        sock (socket): connected socket
+
+    Returns:
+        object: received object
+
+    Raises:
+        EOFError: connection closed
+        ValueError: frame exceeds the size limits
+        pickle.UnpicklingError: frame references a global that is not allowed
+    """
+    length, count = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    if length > MAX_PICKLE_SIZE or count > MAX_BUFFERS:
+        raise ValueError('recv_message: Frame of {} bytes and {} buffers exceeds the limits.'
+                         .format(length, count))
+    sizes = struct.unpack('<{}Q'.format(count), _recv_exact(sock, 8 * count))
+    if any(size > MAX_BUFFER_SIZE for size in sizes):
+        raise ValueError('recv_message: Buffer of {} bytes exceeds the limit.'
+                         .format(max(sizes)))
+    data = _recv_exact(sock, length)
+    buffers = [_recv_exact(sock, size) for size in sizes]
+    return _Unpickler(io.BytesIO(data), buffers=buffers).load()
+
+
+class _Unpickler(pickle.Unpickler):
+
+    def find_class(self, module, name):
+        if (module, name) in NUMPY_GLOBALS:
+            return super().find_class(module, name)
+        if module == 'builtins':
+            obj = getattr(builtins, name, None)
+            if name in BUILTIN_TYPES or \
+                    (isinstance(obj, type) and issubclass(obj, BaseException)):
+                return obj
+        raise pickle.UnpicklingError('Global {}.{} is not allowed.'.format(module, name))
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    while view.nbytes:
+        received = sock.recv_into(view)
+        if not received:
+            raise EOFError('Connection closed.')
+        view = view[received:]
+    return buffer
+
+
+class BoardServer:
+    """Serves a board to clients on a Unix domain socket.
+
+    Every client connection is handled by its own thread; the bus lock of the board
+    serializes their bus traffic. init() and reset() are refused unless allowed, so
+    clients never reset the analog state.
+    """
+
+    def __init__(self, board, path, mode=0o600, allow_reset=False):
+        """
+        Args:
+            board (Merlin2bBoard): board
+            path (str): socket file name
+            mode (int, optional): socket file permissions
+            allow_reset (bool, optional): serve init() and reset()
+        """
+        self.board = board
+        self.path = path
+        self.allow_reset = allow_reset
+        self.num_requests = 0
+        self._methods = set(BATCHED + UNBATCHED)
+        if hasattr(board, 'adc'):
+            self._methods.update(ADC_METHODS)
+        if os.path.exists(path):
+            os.unlink(path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(path)
+        os.chmod(path, mode)
+        self._sock.listen()
+        self._clients = set()
+        self._lock = Lock()
+        self._thread = None
+
+    def serve_forever(self):
+        """Accept clients until close()."""
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            thread = Thread(target=self._serve, args=(conn,), name='merlin2-client',
+                            daemon=True)
+            with self._lock:
+                self._clients.add(conn)
+            thread.start()
+
+    def start(self):
+        """Serve on a background thread."""
+        self._thread = Thread(target=self.serve_forever, name='merlin2-daemon', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop accepting clients, disconnect them and remove the socket file."""
+        # Shutdown wakes a thread blocked in accept(), close alone does not
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        with self._lock:
+            for conn in self._clients:
+                conn.shutdown(socket.SHUT_RDWR)
+            self._clients.clear()
+        if self._thread is not None:
+            self._thread.join()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _serve(self, conn):
+        try:
+            while True:
+                try:
+                    name, args, kwargs = recv_message(conn)
+                except (EOFError, OSError, ValueError, pickle.UnpicklingError):
+                    return
+                with self._lock:
+                    self.num_requests += 1
+                try:
+                    reply = (True, self._call(name, args, kwargs))
+                except Exception as e:
+                    # Clients only load builtin exceptions
+                    if type(e).__module__ != 'builtins':
+                        e = RuntimeError(repr(e))
+                    reply = (False, e)
+                try:
+                    send_message(conn, reply)
+                except (pickle.PicklingError, TypeError, AttributeError):
+                    send_message(conn, (False, RuntimeError(repr(reply[1]))))
+        finally:
+            with self._lock:
+                self._clients.discard(conn)
+            conn.close()
+
+    def _call(self, name, args, kwargs):
+        if name == 'serial_number':
+            return self.board.serial_number
+        if name in RESET_METHODS and not self.allow_reset:
+            raise PermissionError('{}() is not allowed by the daemon.'.format(name))
+        if name not in self._methods and name not in RESET_METHODS:
+            raise AttributeError('Unknown method {}.'.format(name))
+        target = self.board
+        for part in name.split('.'):
+            target = getattr(target, part)
+        return target(*args, **kwargs)
+
+
+class BoardClient:
+    """Client of a BoardServer with the board API. Methods take the arguments of the
+    board methods, ADC methods are available as adc_read() and adc_read_block().
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): socket file name
+        """
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(path)
+        self._lock = Lock()
+
+    @property
+    def serial_number(self):
+        return self.call('serial_number')
+
+    def call(self, name, *args, **kwargs):
+        """Call a board method on the daemon.
+
+        Args:
+            name (str): method name, e.g. 'set_weights' or 'adc.read_block'
+            args, kwargs: method arguments
+
+        Returns:
+            object: return value
+        """
+        with self._lock:
+            send_message(self._sock, (name, args, kwargs))
+            ok, result = recv_message(self._sock)
+        if not ok:
+            raise result
+        return result
+
+    def adc_read(self):
+        return self.call('adc.read')
+
+    def adc_read_block(self, count, **kwargs):
+        return self.call('adc.read_block', count, **kwargs)
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _client_method(name):
+    def method(self, *args, **kwargs):
+        return self.call(name, *args, **kwargs)
+    method.__name__ = name
+    method.__qualname__ = 'BoardClient.' + name
+    return method
+
+
+for _name in BATCHED + UNBATCHED:
+    setattr(BoardClient, _name, _client_method(_name))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m merlin2.daemon',
+                                     description='Serve a Merlin2 board on a Unix socket.')
+    parser.add_argument('--socket', required=True, help='socket file name')
+    parser.add_argument('--board', choices=('eval', 'test'), default='eval')
+    parser.add_argument('--serial-number', help='FTDI serial number')
+    parser.add_argument('--layout', default='ft232h', help='board layout')
+    parser.add_argument('--chip-revision', type=int, default=2)
+    parser.add_argument('--init', action='store_true', help='initialize the board once')
+    parser.add_argument('--attach', action='store_true',
+                        help='attach to a board that is already set up')
+    parser.add_argument('--setup', nargs=4, metavar=('INPUTS', 'OUTPUTS', 'BW', 'LO'),
+                        help='setup the board once')
+    parser.add_argument('--allow-reset', action='store_true',
+                        help='serve init() and reset() to clients')
+    parser.add_argument('--shadow', metavar='NAME',
+                        help='publish the register shadow in shared memory segment NAME')
+    args = parser.parse_args(argv)
+
+    from . import Merlin2bEval, Merlin2bTest
+    board = (Merlin2bEval if args.board == 'eval' else Merlin2bTest)(
+        args.serial_number, chip_revision=args.chip_revision, layout=args.layout)
+    if args.attach:
+        board.attach()
+    if args.init:
+        board.init()
+    if args.setup:
+        board.setup(int(args.setup[0]), int(args.setup[1]), float(args.setup[2]),
+                    float(args.setup[3]))
+    publisher = None
+    if args.shadow:
+        from .shared import ShadowPublisher
+        publisher = ShadowPublisher(board, args.shadow)
+    server = BoardServer(board, args.socket, allow_reset=args.allow_reset)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if publisher is not None:
+            publisher.close()
+
+
+if __name__ == '__main__':
+    main()
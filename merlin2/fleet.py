@@ -0,0 +1,342 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier, BrokenBarrierError, Thread
+from time import perf_counter
+import numpy as np
+from pyftdi.ftdi import Ftdi
+from .io import REALTIME, priority
+from .merlin2b_board import Merlin2bEval
+from .optimizer import WeightOptimizer
+
+
+FleetResult = namedtuple('FleetResult', ('results', 'errors', 'times', 'elapsed'))
+
+ApplyResult = namedtuple('ApplyResult', ('offsets', 'skew', 'errors', 'elapsed'))
+
+
+class FleetError(RuntimeError):
+    """Raised by checked fleet operations that failed on some boards."""
+
+    def __init__(self, message, result):
+        super().__init__(message)
+        self.result = result
+
+
+def discover(url='ftdi://ftdi:232h/1'):
+    """Serial numbers of the attached FTDI devices.
+
+    Args:
+        url (str, optional): pyftdi URL pattern restricting the search
+
+    Returns:
+        list: sorted serial numbers
+    """
+    return sorted({desc.sn for desc, _ in Ftdi.list_devices(url) if desc.sn})
+
+
+class Fleet:
+    """Boards operated collectively, one worker thread per board.
+
+    Each board has its own FTDI device and bus lock, so operations on different
+    boards overlap: USB transfers and sleeps release the GIL. Every operation
+    returns a FleetResult with per-board return values, exceptions and durations;
+    an error on one board does not stop the others.
+    """
+
+    def __init__(self, boards, workers=None):
+        """
+        Args:
+            boards (dict): boards by serial number
+            workers (int, optional): maximum concurrent boards, default all
+        """
+        if not isinstance(boards, dict):
+            raise TypeError('boards: Expected dict.')
+        if workers is not None and (not isinstance(workers, int) or workers < 1):
+            raise ValueError('workers: Expected integer >= 1.')
+        self.boards = dict(boards)
+        self.workers = workers
+        self.open_errors = {}
+        self.skews = []
+
+    @classmethod
+    def open(cls, serial_numbers=None, factory=Merlin2bEval, workers=None, **kwargs):
+        """Open boards concurrently. Boards that fail to open are left out and their
+        exceptions kept in open_errors.
+
+        Args:
+            serial_numbers (sequence, optional): serial numbers, default discover()
+            factory (callable, optional): called as factory(serial_number, **kwargs),
+                                          e.g. Merlin2bEval or Merlin2bTest
+            workers (int, optional): maximum concurrent boards, default all
+            kwargs: passed to factory, e.g. chip_revision
+
+        Returns:
+            Fleet: opened boards
+        """
+        if serial_numbers is None:
+            serial_numbers = discover()
+        fleet = cls({}, workers)
+        result = fleet._run(lambda sn: factory(sn, **kwargs), list(serial_numbers))
+        fleet.boards = result.results
+        fleet.open_errors = result.errors
+        return fleet
+
+    @property
+    def serial_numbers(self):
+        """Serial numbers of the boards.
+
+        Returns:
+            list: serial numbers
+        """
+        return list(self.boards)
+
+    def __len__(self):
+        return len(self.boards)
+
+    def __getitem__(self, serial_number):
+        return self.boards[serial_number]
+
+    def __iter__(self):
+        return iter(self.boards.values())
+
+    def map(self, fn, *args, serial_numbers=None, check=False, **kwargs):
+        """Call fn(board, *args, **kwargs) on every board concurrently.
+
+        Args:
+            fn (callable): function of a board
+            serial_numbers (sequence, optional): subset of boards, default all
+            check (bool, optional): raise FleetError if any board failed
+
+        Returns:
+            FleetResult: dicts of return values, exceptions and durations in seconds
+                         by serial number, and the total elapsed time
+        """
+        return self._map(lambda sn: fn(self.boards[sn], *args, **kwargs), serial_numbers,
+                         check)
+
+    def call(self, method, *args, **kwargs):
+        """Call a board method on every board concurrently.
+
+        Args:
+            method (str): board method name, e.g. 'probe'
+            args, kwargs: passed to the method, and serial_numbers / check as map()
+
+        Returns:
+            FleetResult: see map()
+        """
+        return self.map(lambda board, *a, **kw: getattr(board, method)(*a, **kw),
+                        *args, **kwargs)
+
+    def init(self, **kwargs):
+        """Initialize all boards.
+
+        Returns:
+            FleetResult: see map()
+        """
+        return self.call('init', **kwargs)
+
+    def setup(self, num_input, num_output, bandwidth, lo_freq, chain=False, **kwargs):
+        """Setup all boards, see Merlin2bBoard.setup().
+
+        Returns:
+            FleetResult: see map()
+        """
+        return self.call('setup', num_input, num_output, bandwidth, lo_freq, chain=chain,
+                         **kwargs)
+
+    def set_weights(self, weights, apply=True, **kwargs):
+        """Set weights on all boards.
+
+        Args:
+            weights (ndarray or dict): weights for all boards, or by serial number
+                                       for a subset of boards
+            apply (bool, optional): apply weights to filter
+            kwargs: serial_numbers / check as map()
+
+        Returns:
+            FleetResult: see map()
+        """
+        if isinstance(weights, np.ndarray):
+            return self.call('set_weights', weights, apply=apply, **kwargs)
+        if not isinstance(weights, dict):
+            raise TypeError('weights: Expected ndarray or dict.')
+        return self._map(lambda sn: self.boards[sn].set_weights(weights[sn], apply=apply),
+                         list(weights), kwargs.get('check', False))
+
+    def stage_weights(self, weights, **kwargs):
+        """Write weights to all boards without applying them, see apply_all().
+
+        Args:
+            weights (ndarray or dict): weights for all boards, or by serial number
+                                       for a subset of boards
+            kwargs: serial_numbers / check as map()
+
+        Returns:
+            FleetResult: see map()
+        """
+        return self.set_weights(weights, apply=False, **kwargs)
+
+    def apply_all(self, serial_numbers=None, trigger=None, timeout=10.):
+        """Apply staged weights on all boards at the same time.
+
+        Every board gets a dedicated thread that sends pending write-behind writes,
+        queues its APLS strobe in a transaction on the controller of the APLS pin, so
+        the strobe is a single prepared USB write, and waits at a barrier. All threads
+        then send their strobes at once. If any board fails before the barrier, no
+        board is strobed, and if the barrier times out every waiting board reports a
+        TimeoutError. A board whose strobe fails after the
+        barrier reports its error while the boards that were strobed are still
+        listed in offsets.
+
+        With a trigger, the boards' APLS inputs are expected to be wired to one
+        shared line and only the trigger is strobed, the boards' own APLS outputs
+        must not drive the line.
+
+        Args:
+            serial_numbers (sequence, optional): subset of boards, default all
+            trigger (Gpio, optional): output GPIO driving the shared APLS line
+            timeout (float, optional): barrier timeout in seconds
+
+        Returns:
+            ApplyResult: strobe completion offsets in seconds by serial number relative
+                         to the earliest strobed board, skew between the earliest and
+                         latest strobed board or None if none was strobed, exceptions
+                         by serial number and elapsed time
+        """
+        start = perf_counter()
+        if trigger is not None:
+            trigger.set(True)
+            trigger.set(False)
+            return ApplyResult({}, 0., {}, perf_counter() - start)
+        if serial_numbers is None:
+            serial_numbers = self.serial_numbers
+        unknown = [sn for sn in serial_numbers if sn not in self.boards]
+        if unknown:
+            raise KeyError('serial_numbers: Unknown boards {}.'.format(unknown))
+        barrier = Barrier(len(serial_numbers))
+        completed, errors, cancelled = {}, {}, []
+
+        def strobe(sn):
+            board = self.boards[sn]
+            passed = False
+            try:
+                with priority(REALTIME):
+                    # Staged weight writes go out before the barrier, so the flush after
+                    # it only carries the strobe
+                    board._io.flush()
+                    controller = board.ic._apls_gpio._ctrl
+                    with controller.transaction() as txn:
+                        txn.flush()
+                        board.apply()
+                        barrier.wait(timeout)
+                        passed = True
+                        txn.flush()
+                        completed[sn] = perf_counter()
+            except BrokenBarrierError:
+                cancelled.append(sn)
+            except Exception as e:
+                errors[sn] = e
+                if not passed:
+                    barrier.abort()
+
+        threads = [Thread(target=strobe, args=(sn,), name='apply-{}'.format(sn))
+                   for sn in serial_numbers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if cancelled and not errors:
+            # Nobody failed, the barrier broke on its timeout
+            for sn in cancelled:
+                errors[sn] = TimeoutError('Barrier timed out after {} s.'.format(timeout))
+        if not completed:
+            return ApplyResult({}, None, errors, perf_counter() - start)
+        first = min(completed.values())
+        offsets = {sn: t - first for sn, t in completed.items()}
+        skew = max(offsets.values())
+        if not errors:
+            self.skews.append(skew)
+        return ApplyResult(offsets, skew, errors, perf_counter() - start)
+
+    def skew_stats(self):
+        """Distribution of the skews of apply_all() calls.
+
+        Returns:
+            dict: 'count', 'mean', 'median', 'p90', 'p99' and 'max' skew in seconds,
+                  or None if apply_all() has not completed yet
+        """
+        if not self.skews:
+            return None
+        skews = np.array(self.skews)
+        return {'count': skews.size, 'mean': float(skews.mean()),
+                'median': float(np.median(skews)),
+                'p90': float(np.percentile(skews, 90)),
+                'p99': float(np.percentile(skews, 99)), 'max': float(skews.max())}
+
+    def calibrate(self, optimizer=None, **kwargs):
+        """Optimize the weights of all boards with WeightOptimizer.
+
+        Args:
+            optimizer (dict, optional): WeightOptimizer arguments
+            kwargs: WeightOptimizer.run() arguments, and serial_numbers / check as
+                    map()
+
+        Returns:
+            FleetResult: OptimizerResult by serial number, see map()
+        """
+        optimizer = {} if optimizer is None else optimizer
+        fleet_kwargs = {k: kwargs.pop(k) for k in ('serial_numbers', 'check') if k in kwargs}
+        return self.map(lambda board: WeightOptimizer(board, **optimizer).run(**kwargs),
+                        **fleet_kwargs)
+
+    def _map(self, fn, serial_numbers, check):
+        if serial_numbers is None:
+            serial_numbers = self.serial_numbers
+        unknown = [sn for sn in serial_numbers if sn not in self.boards]
+        if unknown:
+            raise KeyError('serial_numbers: Unknown boards {}.'.format(unknown))
+        result = self._run(fn, list(serial_numbers))
+        if check and result.errors:
+            raise FleetError('Failed on {} of {} boards: {}.'.format(
+                len(result.errors), len(serial_numbers), sorted(result.errors)), result)
+        return result
+
+    def _run(self, fn, serial_numbers):
+        results, errors, times = {}, {}, {}
+
+        def task(sn):
+            start = perf_counter()
+            try:
+                results[sn] = fn(sn)
+            except Exception as e:
+                errors[sn] = e
+            times[sn] = perf_counter() - start
+
+        start = perf_counter()
+        if serial_numbers:
+            workers = len(serial_numbers) if self.workers is None else self.workers
+            with ThreadPoolExecutor(min(workers, len(serial_numbers))) as pool:
+                list(pool.map(task, serial_numbers))
+        # Keep the order of serial_numbers
+        results = {sn: results[sn] for sn in serial_numbers if sn in results}
+        return FleetResult(results, errors, times, perf_counter() - start)
@@ -18,36 +18,880 @@ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVE
 POSSIBILITY OF SUCH DAMAGE.
 """
 
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from struct import pack
+from threading import Condition, Lock, Thread, get_ident, local
+from time import perf_counter, sleep
+from pyftdi.ftdi import Ftdi
 from pyftdi.spi import SpiController
+import pyftdi
 
+# Transaction builds MPSSE command buffers itself and relies on internals of pyftdi's
+# SpiController and SpiPort, which are only accessed through Mpsse. Supported pyftdi
+# versions [low, high), keep in sync with setup.py.
+PYFTDI_VERSIONS = ((0, 55), (0, 58))
 
-class Controller:
+SpiPortSetup = namedtuple('SpiPortSetup', ('cs_prolog', 'cs_epilog', 'cpol', 'cpha'))
 
-    def __init__(self, cs_count=None, serial_number=None):
+
+class Mpsse:
+    """pyftdi SpiController internals used by Transaction.
+
+    Transaction bypasses the SpiController API to queue commands of several chip
+    selects and GPIO updates into one USB write, so it has to keep the controller's
+    cached clock and GPIO state in sync and hold its lock while writing.
+    """
+
+    CONTROLLER_ATTRS = ('_lock', '_frequency', '_clock_phase', '_cs_bits', '_spi_mask',
+                        '_gpio_low')
+    PORT_ATTRS = ('_cs_prolog', '_cs_epilog', '_cpol', '_cpha')
+
+    def __init__(self, dev):
+        """
+        Args:
+            dev (SpiController): configured controller
+
+        Raises:
+            RuntimeError: if the installed pyftdi is not supported
+        """
+        version = tuple(int(v) for v in pyftdi.__version__.split('.')[:2])
+        low, high = PYFTDI_VERSIONS
+        if not low <= version < high:
+            raise RuntimeError('pyftdi {} is not supported, expected >={},<{}.'.format(
+                pyftdi.__version__, '.'.join(map(str, low)), '.'.join(map(str, high))))
+        self._check(dev, self.CONTROLLER_ATTRS)
+        self._dev = dev
+        self.ftdi = dev.ftdi
+        # Held while sending, like the SpiController methods do
+        self.lock = dev._lock
+
+    @staticmethod
+    def _check(obj, attrs):
+        missing = [attr for attr in attrs if not hasattr(obj, attr)]
+        if missing:
+            raise RuntimeError('pyftdi {}: Missing {}.'.format(type(obj).__name__, missing))
+
+    def port_setup(self, port):
+        """Chip select sequences and clock mode of a port.
+
+        Args:
+            port (SpiPort): port of the controller
+
+        Returns:
+            SpiPortSetup: setup
+        """
+        return SpiPortSetup(port._cs_prolog, port._cs_epilog, port._cpol, port._cpha)
+
+    @property
+    def direction(self):
+        return self._dev.direction
+
+    @property
+    def cs_bits(self):
+        return self._dev._cs_bits
+
+    @property
+    def spi_mask(self):
+        return self._dev._spi_mask
+
+    @property
+    def gpio_low(self):
+        return self._dev._gpio_low
+
+    @gpio_low.setter
+    def gpio_low(self, value):
+        self._dev._gpio_low = value
+
+    def clock(self):
+        return self._dev._frequency, self._dev._clock_phase
+
+    def set_clock(self, frequency, cpha):
+        """Send a clock change and update the controller's cached clock.
+
+        Args:
+            frequency (float): MPSSE clock in Hz
+            cpha (bool): three phase clocking
+        """
+        dev = self._dev
+        with self.lock:
+            if dev._frequency != frequency:
+                self.ftdi.set_frequency(frequency)
+                dev._frequency = frequency
+            if dev._clock_phase != cpha:
+                self.ftdi.enable_3phase_clock(cpha)
+                dev._clock_phase = cpha
+
+
+class BusController:
+    """Bus lock, transactions, write-behind and transport statistics of a controller.
+
+    Shared by Controller and plan.PlanController, which provide the transport:
+    get_gpio(), get_spi(), serial_number and _new_transaction().
+    """
+
+    def __init__(self, stats=False):
+        """
+        Args:
+            stats (bool, optional): collect transport statistics
+        """
+        self._transaction = None
+        self._stats = TransportStats() if stats else None
+        self._recorder = None
+        self._discard_callbacks = []
+        self._write_behind = None
+        self.lock = BusLock()
+
+    def _new_transaction(self):
+        raise NotImplementedError
+
+    @contextmanager
+    def transaction(self):
+        """Batch SPI writes, reads and GPIO updates into as few USB transfers as possible.
+
+        While the transaction is open, writes and GPIO updates issued through this
+        controller are queued instead of being sent. Synchronous reads flush the queue
+        first. The queue is committed when the context exits, or discarded if an
+        exception is raised. Callbacks registered with Spi.on_discard() are invoked on a
+        discard and when the commit fails. Nested transactions join the outer one.
+        Pending write-behind writes are sent ahead of the transaction's own.
+
+        The bus lock is held for the lifetime of the transaction.
+
+        Returns:
+            Transaction: open transaction
+        """
+        with self.lock:
+            if self._transaction is not None:
+                yield self._transaction
+                return
+            txn = self._new_transaction()
+            self._transaction = txn
+            if self._recorder is not None:
+                self._recorder.begin()
+            try:
+                try:
+                    if self._write_behind is not None:
+                        self._write_behind.drain()
+                    yield txn
+                finally:
+                    self._transaction = None
+                # A failed commit is a discard too, part of the queue may not have been sent
+                txn.commit()
+                if self._recorder is not None:
+                    self._recorder.end()
+            except BaseException:
+                if self._recorder is not None:
+                    self._recorder.abort()
+                for callback in self._discard_callbacks:
+                    callback()
+                raise
+
+    def enable_write_behind(self, enable=True, linger=0.):
+        """Enable or disable write-behind. Disabling flushes pending writes.
+
+        With write-behind enabled, SPI writes issued outside a transaction return as
+        soon as they are queued. A background thread sends the queue in transactions,
+        coalescing consecutive writes to the same register. Reads, GPIO updates and
+        transactions flush the queue first, so they observe all earlier writes.
+
+        Args:
+            enable (bool, optional): enable
+            linger (float, optional): time in seconds the sender waits for more writes
+                                      before sending a batch
+        """
+        with self.lock:
+            write_behind = self._write_behind
+            if enable:
+                if write_behind is None:
+                    self._write_behind = WriteBehind(self, linger)
+                else:
+                    write_behind.linger = linger
+                return
+            if write_behind is None:
+                return
+            write_behind.close()
+            with self.transaction():
+                self._write_behind = None
+        write_behind.join()
+
+    def flush(self):
+        """Send pending write-behind writes and wait until they are sent.
+
+        Raises:
+            RuntimeError: if the background sender failed since the last flush
+        """
+        write_behind = self._write_behind
+        if write_behind is None:
+            return
+        with self.transaction():
+            pass
+        write_behind.check()
+
+    def barrier(self):
+        """Order pending write-behind writes before later ones: writes queued after
+        the barrier are not coalesced with writes queued before it."""
+        write_behind = self._write_behind
+        if write_behind is not None:
+            write_behind.barrier()
+
+    def _drain(self):
+        # Called with the bus lock held before synchronous bus access
+        write_behind = self._write_behind
+        if write_behind is not None and self._transaction is None and write_behind.pending:
+            with self.transaction():
+                pass
+
+    def enable_stats(self, enable=True):
+        """Enable or disable collection of transport statistics. Disabling discards
+        collected statistics.
+
+        Args:
+            enable (bool, optional): enable
+        """
+        with self.lock:
+            if not enable:
+                self._stats = None
+            elif self._stats is None:
+                self._stats = TransportStats()
+
+    def stats(self, reset=False):
+        """Transport statistics since statistics were enabled or last reset.
+
+        Operations are keyed by (target, operation), where target is 'cs<n>' for
+        SPI chip selects, 'gpio<n>' for GPIO pins or 'bus' for transaction flushes,
+        and operation is one of 'write', 'read', 'exchange', 'gpio_read',
+        'gpio_write' or 'flush'. Writes and reads issued inside a transaction are
+        counted when queued, the USB transfer time is counted by its flush.
+
+        Args:
+            reset (bool, optional): start a new window after taking the snapshot
+
+        Returns:
+            dict: 'window' duration in seconds, 'bytes_out', 'bytes_in', 'time' spent
+                  in calls, 'usb_writes' and 'operations' mapping keys to
+                  OperationStats, or None if statistics are disabled
+        """
+        with self.lock:
+            if self._stats is None:
+                return None
+            snapshot = self._stats.snapshot()
+            if reset:
+                self._stats = TransportStats()
+            return snapshot
+
+    def reset_stats(self):
+        """Start a new statistics window."""
+        with self.lock:
+            if self._stats is not None:
+                self._stats = TransportStats()
+
+    def _count_usb(self, count=1):
+        if self._stats is not None:
+            self._stats.usb(count)
+
+
+class Controller(BusController):
+    """SPI and GPIO controller of one FTDI MPSSE interface.
+
+    Every controller has its own bus lock and transaction queue, so controllers of
+    the interfaces of a multi-interface device can be used concurrently from
+    separate threads.
+    """
+
+    def __init__(self, cs_count=None, serial_number=None, stats=False, device='232h',
+                 interface=1):
+        """
+        Args:
+            cs_count (int, optional): number of chip selects
+            serial_number (str, optional): FTDI serial number, default first device
+            stats (bool, optional): collect transport statistics
+            device (str, optional): FTDI device type, '232h', '2232h' or '4232h'
+            interface (int, optional): MPSSE interface, 1 or 2 on '2232h' and '4232h'
+        """
+        if device not in ('232h', '2232h', '4232h'):
+            raise ValueError('device: Expected \'232h\', \'2232h\' or \'4232h\'.')
+        if interface not in ((1,) if device == '232h' else (1, 2)):
+            raise ValueError('interface: Expected MPSSE interface of {}.'.format(device))
+        super().__init__(stats)
         kwargs = {} if cs_count is None else {'cs_count': cs_count}
         self._dev = SpiController(**kwargs)
-        url = 'ftdi://ftdi:232h/1' if serial_number is None else \
-              'ftdi://::{}/1'.format(serial_number)
+        url = 'ftdi://ftdi:{}/{}'.format(device, interface) if serial_number is None else \
+              'ftdi://::{}/{}'.format(serial_number, interface)
         self._dev.configure(url)
+        self._mpsse = Mpsse(self._dev)
         self._gpio_port = self._dev.get_gpio()
 
     def get_gpio(self, pin, direction='input', active_low=False):
-        return Gpio(self._gpio_port, pin, direction, active_low)
+        return Gpio(self, pin, direction, active_low)
 
     def get_spi(self, cs, freq_hz, mode, miso_en_gpio=None):
         port = self._dev.get_port(cs, freq=freq_hz, mode=mode)
-        return Spi(port, miso_en_gpio)
+        Mpsse._check(port, Mpsse.PORT_ATTRS)
+        return Spi(self, port, miso_en_gpio)
+
+    def _new_transaction(self):
+        return Transaction(self)
 
     @property
     def serial_number(self):
-        return self._dev._ftdi.usb_dev.serial_number
+        return self._dev.ftdi.usb_dev.serial_number
+
+
+OperationStats = namedtuple('OperationStats', ('count', 'bytes_out', 'bytes_in', 'time',
+                                               'min_time', 'max_time', 'histogram'))
+
+
+class TransportStats:
+    """Counters and latency histograms of transport calls. Calls are timed including
+    the calls they make themselves, e.g. a read including its MISO enable updates,
+    while the total time only counts the outermost calls. Calls that raise are not
+    counted.
+
+    Histogram bucket 0 counts calls shorter than 1 us, bucket b > 0 counts calls of
+    [2^(b-1), 2^b) us, and the last bucket everything longer. USB writes are counted
+    separately, as a call issues none when queued in a transaction and several when
+    it reads the GPIO port first.
+    """
+
+    NUM_BUCKETS = 24
+
+    def __init__(self):
+        self._start = perf_counter()
+        self._records = {}
+        self._depth = 0
+        self._time = 0.
+        self._usb_writes = 0
+
+    def start(self):
+        self._depth += 1
+        return perf_counter()
+
+    def cancel(self):
+        # Ends a started call that raised
+        self._depth -= 1
+
+    def usb(self, count=1):
+        self._usb_writes += count
+
+    def record(self, target, operation, start, bytes_out=0, bytes_in=0):
+        elapsed = perf_counter() - start
+        self._depth -= 1
+        if not self._depth:
+            self._time += elapsed
+        record = self._records.get((target, operation))
+        if record is None:
+            record = [0, 0, 0, 0., elapsed, elapsed, [0] * self.NUM_BUCKETS]
+            self._records[(target, operation)] = record
+        record[0] += 1
+        record[1] += bytes_out
+        record[2] += bytes_in
+        record[3] += elapsed
+        if elapsed < record[4]:
+            record[4] = elapsed
+        if elapsed > record[5]:
+            record[5] = elapsed
+        record[6][min(int(elapsed * 1e6).bit_length(), self.NUM_BUCKETS - 1)] += 1
+
+    def snapshot(self):
+        operations = {key: OperationStats(*r[:6], tuple(r[6])) for key, r in self._records.items()}
+        # Queued transaction calls and their flushes would count bytes twice
+        counted = [op for key, op in operations.items() if key[1] != 'flush']
+        return {
+            'window': perf_counter() - self._start,
+            'bytes_out': sum(op.bytes_out for op in counted),
+            'bytes_in': sum(op.bytes_in for op in counted),
+            'time': self._time,
+            'usb_writes': self._usb_writes,
+            'operations': operations,
+        }
+
+
+# Bus priority classes, lower is served first
+REALTIME = 0
+CONTROL = 1
+MONITORING = 2
+PRIORITY_NAMES = ('realtime', 'control', 'monitoring')
+
+_priority = local()
+
+
+@contextmanager
+def priority(value):
+    """Set the bus priority class of the calling thread, default CONTROL.
+
+    Weight updates and APLS strobes use REALTIME, background polling such as
+    AdcSampler uses MONITORING.
+
+    Args:
+        value (int): REALTIME, CONTROL or MONITORING
+    """
+    if value not in (REALTIME, CONTROL, MONITORING):
+        raise ValueError('value: Expected REALTIME, CONTROL or MONITORING.')
+    previous = getattr(_priority, 'value', CONTROL)
+    _priority.value = value
+    try:
+        yield
+    finally:
+        _priority.value = previous
+
+
+def get_priority():
+    """Bus priority class of the calling thread.
+
+    Returns:
+        int: REALTIME, CONTROL or MONITORING
+    """
+    return getattr(_priority, 'value', CONTROL)
+
+
+BusClassStats = namedtuple('BusClassStats', ('grants', 'queued', 'max_queued', 'wait_time',
+                                             'max_wait', 'overdue'))
+
+
+class BusLock:
+    """Re-entrant lock that schedules the bus between threads.
+
+    Waiting threads are granted the bus by priority class of the thread (see
+    priority()), then in request order. A thread that releases and immediately
+    re-acquires the lock (e.g. a background sampler) queues behind threads that are
+    already waiting. Grants are not preemptive, the owner keeps the bus until it
+    releases it after one call or transaction.
+
+    Latency is bounded: a thread that has waited longer than the max_wait of its
+    class is served before any thread that has not, so lower classes are never
+    starved by a stream of higher priority traffic.
+    """
+
+    MAX_WAIT = (None, 0.05, 0.25)
+
+    def __init__(self, max_wait=MAX_WAIT):
+        """
+        Args:
+            max_wait (sequence, optional): wait in seconds after which a waiting
+                                           thread of each priority class is overdue,
+                                           None to wait by priority only
+        """
+        if len(max_wait) != len(PRIORITY_NAMES):
+            raise ValueError('max_wait: Expected sequence of length {}.'
+                             .format(len(PRIORITY_NAMES)))
+        self._cond = Condition(Lock())
+        self._queue = deque()
+        self._owner = None
+        self._depth = 0
+        self._seq = 0
+        self.max_wait = tuple(max_wait)
+        self._queued = [0] * len(PRIORITY_NAMES)
+        self._reset_stats()
+
+    def acquire(self):
+        ident = get_ident()
+        with self._cond:
+            if self._owner == ident:
+                self._depth += 1
+                return True
+            cls = get_priority()
+            if self._owner is None and not self._queue:
+                self._grant(ident, cls, 0., False)
+                return True
+            start = perf_counter()
+            waiter = (cls, self._seq, start, ident)
+            self._seq += 1
+            self._queue.append(waiter)
+            self._queued[cls] += 1
+            if self._queued[cls] > self._max_queued[cls]:
+                self._max_queued[cls] = self._queued[cls]
+            while self._owner != ident:
+                self._cond.wait()
+            return True
+
+    def owned(self):
+        """
+        Returns:
+            bool: the calling thread holds the lock
+        """
+        return self._owner == get_ident()
+
+    def release(self):
+        with self._cond:
+            if self._owner != get_ident():
+                raise RuntimeError('Cannot release un-acquired lock.')
+            self._depth -= 1
+            if self._depth:
+                return
+            self._owner = None
+            if not self._queue:
+                return
+            # Hand the bus to the next waiter: overdue ones first, then by class
+            now = perf_counter()
+
+            def key(waiter):
+                cls, seq, start, _ = waiter
+                limit = self.max_wait[cls]
+                return (limit is None or now - start < limit, cls, seq)
+
+            waiter = min(self._queue, key=key)
+            self._queue.remove(waiter)
+            cls, _, start, ident = waiter
+            self._queued[cls] -= 1
+            limit = self.max_wait[cls]
+            self._grant(ident, cls, now - start, limit is not None and now - start >= limit)
+            self._cond.notify_all()
+
+    def stats(self, reset=False):
+        """Scheduling statistics by priority class.
+
+        Args:
+            reset (bool, optional): reset counters after taking the snapshot
+
+        Returns:
+            dict: BusClassStats(grants, queued, max_queued, wait_time, max_wait,
+                  overdue) by class name, queued is the current queue depth and
+                  overdue counts grants made after max_wait
+        """
+        with self._cond:
+            stats = {name: BusClassStats(self._grants[c], self._queued[c],
+                                         self._max_queued[c], self._wait_time[c],
+                                         self._longest_wait[c], self._overdue[c])
+                     for c, name in enumerate(PRIORITY_NAMES)}
+            if reset:
+                self._reset_stats()
+            return stats
+
+    def _reset_stats(self):
+        n = len(PRIORITY_NAMES)
+        self._grants = [0] * n
+        self._max_queued = list(self._queued)
+        self._wait_time = [0.] * n
+        self._longest_wait = [0.] * n
+        self._overdue = [0] * n
+
+    def _grant(self, ident, cls, wait, overdue):
+        self._owner = ident
+        self._depth = 1
+        self._grants[cls] += 1
+        self._wait_time[cls] += wait
+        if wait > self._longest_wait[cls]:
+            self._longest_wait[cls] = wait
+        self._overdue[cls] += int(overdue)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class WriteBehind:
+    """Queue of SPI writes sent by a background thread, see
+    Controller.enable_write_behind().
+
+    Writes carry an optional register address. A write of the same length to the same
+    address on the same chip select as the last queued write replaces it, unless a
+    barrier was placed in between.
+    """
+
+    def __init__(self, controller, linger=0.):
+        """
+        Args:
+            controller (BusController): controller
+            linger (float, optional): time in seconds the sender waits for more writes
+                                      before sending a batch
+        """
+        self._ctrl = controller
+        self.linger = linger
+        self._cond = Condition(Lock())
+        self._queue = []
+        self._barrier = 0
+        self._closed = False
+        self._error = None
+        self.writes = 0
+        self.coalesced = 0
+        self.batches = 0
+        self._thread = Thread(target=self._run, name='merlin2-write-behind', daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self):
+        return bool(self._queue)
+
+    def put(self, spi, data, address=None):
+        """Queue a write.
+
+        Returns:
+            bool: False if write-behind is closed and the write must be sent directly
+        """
+        with self._cond:
+            if self._closed:
+                return False
+            queue = self._queue
+            if address is not None and len(queue) > self._barrier:
+                last_spi, last_data, last_address = queue[-1]
+                if last_spi is spi and last_address == address and \
+                  len(last_data) == len(data):
+                    queue[-1] = (spi, bytes(data), address)
+                    self.coalesced += 1
+                    return True
+            queue.append((spi, bytes(data), address))
+            self.writes += 1
+            if len(queue) == 1:
+                self._cond.notify()
+            return True
+
+    def barrier(self):
+        with self._cond:
+            self._barrier = len(self._queue)
+
+    def drain(self):
+        """Move the queue into the controller's open transaction. Called with the bus
+        lock held."""
+        with self._cond:
+            queue = self._queue
+            self._queue = []
+            self._barrier = 0
+        if queue:
+            self.batches += 1
+        for spi, data, _ in queue:
+            spi.write(data)
+
+    def check(self):
+        error, self._error = self._error, None
+        if error is not None:
+            raise RuntimeError('Write-behind failed.') from error
+
+    def close(self):
+        """Stop accepting writes. Pending writes remain queued until drained."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def join(self):
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            if self.linger:
+                sleep(self.linger)
+            try:
+                with self._ctrl.transaction():
+                    pass
+            except Exception as e:
+                self._error = e
+
+
+class Transaction:
+    """MPSSE command buffer spanning several chip selects and GPIOs.
+
+    Reads are returned as PendingRead objects which are filled in on commit. The
+    buffer is cut into segments of at most SEGMENT_SIZE read bytes so the FTDI
+    transmit FIFO never fills up while the command buffer is still being written.
+    """
+
+    SEGMENT_SIZE = 512
+
+    def __init__(self, controller):
+        self._ctrl = controller
+        self._mpsse = controller._mpsse
+        self._cmd = bytearray()
+        self._reads = []
+        self._readlen = 0
+        self._segments = []
+        self._frequency = None
+        self._cpha = None
+        self._gpio = None
+
+    def write(self, spi, data):
+        """Queue SPI write.
+
+        Args:
+            spi (Spi): SPI interface
+            data (bytes): data to write
+        """
+        port = spi._port
+        setup = self._mpsse.port_setup(port)
+        self._configure(port.frequency, setup.cpha)
+        self._select(setup.cs_prolog)
+        opcode = Ftdi.WRITE_BYTES_PVE_MSB if setup.cpol else Ftdi.WRITE_BYTES_NVE_MSB
+        self._cmd.extend(pack('<BH', opcode, len(data) - 1))
+        self._cmd.extend(data)
+        self._deselect(setup.cs_epilog)
+
+    def read(self, spi, readlen, count=1):
+        """Queue SPI read(s). Each read is a separate chip select cycle. If the
+        interface has a MISO enable, it is asserted once around all reads.
+
+        Args:
+            spi (Spi): SPI interface
+            readlen (int): number of bytes per read
+            count (int, optional): number of back-to-back reads
+
+        Returns:
+            PendingRead: read data, available after commit
+        """
+        if not isinstance(readlen, int) or not 0 < readlen <= self.SEGMENT_SIZE:
+            raise ValueError('readlen: Expected integer in range [1, {}].'
+                             .format(self.SEGMENT_SIZE))
+        if not isinstance(count, int) or count < 1:
+            raise ValueError('count: Expected integer > 0.')
+        port = spi._port
+        pending = PendingRead()
+        miso_en = spi._miso_en_gpio
+        if miso_en is not None:
+            self.gpio(miso_en, True)
+        setup = self._mpsse.port_setup(port)
+        self._configure(port.frequency, setup.cpha)
+        opcode = Ftdi.READ_BYTES_PVE_MSB if setup.cpol else Ftdi.READ_BYTES_NVE_MSB
+        read_cmd = pack('<BH', opcode, readlen - 1)
+        for _ in range(count):
+            if self._readlen + readlen > self.SEGMENT_SIZE:
+                self._end_segment()
+            self._select(setup.cs_prolog)
+            self._cmd.extend(read_cmd)
+            self._deselect(setup.cs_epilog)
+            self._reads.append((pending, self._readlen, readlen))
+            self._readlen += readlen
+        if miso_en is not None:
+            self.gpio(miso_en, False)
+        if self._ctrl._recorder is not None:
+            self._ctrl._recorder.txn_read(spi, readlen, count)
+        return pending
+
+    def gpio(self, gpio, value):
+        """Queue GPIO update.
+
+        Args:
+            gpio (Gpio): output GPIO
+            value (bool): logical value
+        """
+        if self._gpio is None:
+            self._ctrl._count_usb()
+            self._gpio = self._ctrl._gpio_port.read(with_output=True) & \
+                         self._ctrl._gpio_port.direction
+        if value ^ gpio._active_low:
+            self._gpio |= gpio._mask
+        else:
+            self._gpio &= ~gpio._mask
+        direction = self._mpsse.direction
+        if gpio._mask & 0xFF:
+            self._cmd.extend((Ftdi.SET_BITS_LOW, self._idle(), direction & 0xFF))
+        else:
+            self._cmd.extend((Ftdi.SET_BITS_HIGH, (self._gpio >> 8) & 0xFF,
+                              (direction >> 8) & 0xFF))
+
+    def flush(self):
+        """Send all queued operations now. The transaction stays open."""
+        if self._ctrl._recorder is not None:
+            self._ctrl._recorder.flush()
+        self._flush()
+
+    def _flush(self):
+        self._end_segment()
+        stats = self._ctrl._stats
+        if stats is not None and self._segments:
+            start = stats.start()
+            bytes_out = sum(len(cmd) for cmd, _, _ in self._segments)
+            bytes_in = sum(readlen for _, _, readlen in self._segments)
+        mpsse = self._mpsse
+        completed = []
+        try:
+            with mpsse.lock:
+                for cmd, reads, readlen in self._segments:
+                    self._ctrl._count_usb()
+                    mpsse.ftdi.write_data(cmd)
+                    if not readlen:
+                        continue
+                    data = mpsse.ftdi.read_data_bytes(readlen, 4)
+                    if len(data) != readlen:
+                        raise IOError('Expected {} bytes, got {}.'.format(readlen, len(data)))
+                    for pending, offset, length in reads:
+                        if not pending._chunks:
+                            completed.append(pending)
+                        pending._chunks.append(data[offset:offset + length])
+                if self._gpio is not None:
+                    mpsse.gpio_low = self._gpio & 0xFF & ~mpsse.spi_mask
+        except BaseException:
+            if stats is not None and self._segments:
+                stats.cancel()
+            raise
+        if stats is not None and self._segments:
+            stats.record('bus', 'flush', start, bytes_out, bytes_in)
+        self._segments = []
+        for pending in completed:
+            pending._complete()
+        if self._ctrl._recorder is not None:
+            for pending in completed:
+                self._ctrl._recorder.read_data(pending.data)
+
+    def commit(self):
+        self._flush()
+
+    def _configure(self, frequency, cpha):
+        if cpha:
+            frequency = (3 * frequency) // 2
+        if frequency == self._frequency and cpha == self._cpha:
+            return
+        if self._mpsse.clock() != (frequency, cpha):
+            # Clock changes are sent immediately, so cut the buffer here
+            self._flush()
+            self._mpsse.set_clock(frequency, cpha)
+        self._frequency = frequency
+        self._cpha = cpha
+
+    def _gpio_low(self):
+        if self._gpio is None:
+            return self._mpsse.gpio_low
+        return self._gpio & 0xFF & ~self._mpsse.spi_mask
+
+    def _idle(self):
+        return self._mpsse.cs_bits | self._gpio_low()
+
+    def _select(self, sequence):
+        direction = self._mpsse.direction & 0xFF
+        gpio_low = self._gpio_low()
+        spi_mask = self._mpsse.spi_mask
+        for ctrl in sequence:
+            self._cmd.extend((Ftdi.SET_BITS_LOW, (ctrl & spi_mask) | gpio_low, direction))
+
+    def _deselect(self, sequence):
+        self._select(sequence)
+        self._cmd.extend((Ftdi.SET_BITS_LOW, self._idle(), self._mpsse.direction & 0xFF))
+
+    def _end_segment(self):
+        if not self._cmd:
+            return
+        if self._readlen:
+            self._cmd.append(Ftdi.SEND_IMMEDIATE)
+        self._segments.append((self._cmd, self._reads, self._readlen))
+        self._cmd = bytearray()
+        self._reads = []
+        self._readlen = 0
+
+
+class PendingRead:
+    """Data of a read queued in a Transaction."""
+
+    def __init__(self):
+        self._chunks = []
+        self.data = None
+
+    def _complete(self):
+        self.data = b''.join(self._chunks)
 
 
 class Gpio:
 
-    def __init__(self, gpio_port, pin, direction, active_low):
-        self._gpio_port = gpio_port
+    def __init__(self, controller, pin, direction, active_low):
+        self._ctrl = controller
+        self._gpio_port = controller._gpio_port
+        self._pin = pin
         self._mask = 1 << pin
+        self._target = 'gpio{}'.format(pin)
         if direction == 'input':
             self._output = False
         elif direction == 'output':
@@ -62,12 +906,39 @@ class Gpio:
         gpio_dir |= self._mask if self._output else 0
         self._gpio_port.set_direction(gpio_mask, gpio_dir)
 
+    def _config(self):
+        return {'type': 'gpio', 'pin': self._pin,
+                'direction': 'output' if self._output else 'input',
+                'active_low': self._active_low}
+
     def set(self, value):
         if not self._output:
             raise RuntimeError('Gpio is not an output, cannot set value' \
                                ' of an input.')
         if not isinstance(value, bool):
             raise TypeError('value: Expected bool.')
+        with self._ctrl.lock:
+            self._ctrl._drain()
+            stats = self._ctrl._stats
+            if stats is not None:
+                start = stats.start()
+            try:
+                self._set(value)
+            except BaseException:
+                if stats is not None:
+                    stats.cancel()
+                raise
+            if self._ctrl._recorder is not None:
+                self._ctrl._recorder.gpio_set(self, value)
+            if stats is not None:
+                stats.record(self._target, 'gpio_write', start)
+
+    def _set(self, value):
+        txn = self._ctrl._transaction
+        if txn is not None:
+            txn.gpio(self, value)
+            return
+        self._ctrl._count_usb(2)
         read = self._gpio_port.read(with_output=True) & self._gpio_port.direction
         if value ^ self._active_low:
             self._gpio_port.write(read | self._mask)
@@ -75,30 +946,161 @@ class Gpio:
             self._gpio_port.write(read & ~self._mask)
 
     def get(self):
-        return bool(self._gpio_port.read(with_output=True) & self._mask) ^ self._active_low
+        with self._ctrl.lock:
+            self._ctrl._drain()
+            stats = self._ctrl._stats
+            if stats is not None:
+                start = stats.start()
+            try:
+                txn = self._ctrl._transaction
+                if txn is not None:
+                    txn._flush()
+                self._ctrl._count_usb()
+                value = bool(self._gpio_port.read(with_output=True) & self._mask) ^ \
+                    self._active_low
+            except BaseException:
+                if stats is not None:
+                    stats.cancel()
+                raise
+            if self._ctrl._recorder is not None:
+                self._ctrl._recorder.gpio_get(self, value)
+            if stats is not None:
+                stats.record(self._target, 'gpio_read', start)
+            return value
 
 
 class Spi:
 
-    def __init__(self, port, miso_en_gpio=None):
+    def __init__(self, controller, port, miso_en_gpio=None):
+        self._ctrl = controller
         self._port = port
-        self.write = port.write
-        if miso_en_gpio is None:
-            self.read = port.read
-            self.query = port.exchange
-        else:
-            self._miso_en_gpio = miso_en_gpio
-            self.read = self._read
-            self.query = self._exchange
-
-    def _read(self, *args, **kwargs):
-        self._miso_en_gpio.set(True)
-        rdata = self._port.read(*args, **kwargs)
-        self._miso_en_gpio.set(False)
-        return rdata
-
-    def _exchange(self, *args, **kwargs):
-        self._miso_en_gpio.set(True)
-        rdata = self._port.exchange(*args, **kwargs)
-        self._miso_en_gpio.set(False)
-        return rdata
+        self._miso_en_gpio = miso_en_gpio
+        self._target = 'cs{}'.format(port.cs)
+
+    def _config(self):
+        port = self._port
+        setup = self._ctrl._mpsse.port_setup(port)
+        return {'type': 'spi', 'cs': port.cs, 'freq_hz': port.frequency,
+                'mode': (setup.cpol << 1) | setup.cpha, 'miso_en_gpio': self._miso_en_gpio}
+
+    def on_discard(self, callback):
+        """Register a callback invoked when a transaction is discarded, so drivers can
+        invalidate state derived from queued writes that never reached the device.
+
+        Args:
+            callback (callable): callback without arguments
+        """
+        self._ctrl._discard_callbacks.append(callback)
+
+    def write(self, data, address=None):
+        """Write data. Queued when write-behind is enabled and the calling thread is
+        not in a transaction.
+
+        Args:
+            data (bytes): data
+            address (optional): register address, lets write-behind coalesce
+                                consecutive writes to the same register
+        """
+        write_behind = self._ctrl._write_behind
+        if write_behind is not None and not self._ctrl.lock.owned() and \
+          write_behind.put(self, data, address):
+            return
+        with self._ctrl.lock:
+            stats = self._ctrl._stats
+            if stats is not None:
+                start = stats.start()
+            try:
+                txn = self._ctrl._transaction
+                if txn is not None:
+                    txn.write(self, data)
+                else:
+                    self._ctrl._count_usb()
+                    self._port.write(data)
+            except BaseException:
+                if stats is not None:
+                    stats.cancel()
+                raise
+            if self._ctrl._recorder is not None:
+                self._ctrl._recorder.write(self, data)
+            if stats is not None:
+                stats.record(self._target, 'write', start, len(data))
+
+    def read(self, *args, **kwargs):
+        with self._ctrl.lock:
+            self._ctrl._drain()
+            stats = self._ctrl._stats
+            if stats is not None:
+                start = stats.start()
+            try:
+                if self._miso_en_gpio is not None:
+                    self._miso_en_gpio._set(True)
+                txn = self._ctrl._transaction
+                if txn is not None:
+                    txn._flush()
+                self._ctrl._count_usb()
+                rdata = self._port.read(*args, **kwargs)
+                if self._miso_en_gpio is not None:
+                    self._miso_en_gpio._set(False)
+            except BaseException:
+                if stats is not None:
+                    stats.cancel()
+                raise
+            if self._ctrl._recorder is not None:
+                self._ctrl._recorder.read(self, rdata)
+            if stats is not None:
+                stats.record(self._target, 'read', start, 0, len(rdata))
+            return rdata
+
+    def query(self, out, *args, **kwargs):
+        with self._ctrl.lock:
+            self._ctrl._drain()
+            stats = self._ctrl._stats
+            if stats is not None:
+                start = stats.start()
+            try:
+                if self._miso_en_gpio is not None:
+                    self._miso_en_gpio._set(True)
+                txn = self._ctrl._transaction
+                if txn is not None:
+                    txn._flush()
+                self._ctrl._count_usb()
+                rdata = self._port.exchange(out, *args, **kwargs)
+                if self._miso_en_gpio is not None:
+                    self._miso_en_gpio._set(False)
+            except BaseException:
+                if stats is not None:
+                    stats.cancel()
+                raise
+            if self._ctrl._recorder is not None:
+                self._ctrl._recorder.exchange(self, out, rdata)
+            if stats is not None:
+                stats.record(self._target, 'exchange', start, len(out),
+                             len(rdata))
+            return rdata
+
+    def read_repeated(self, readlen, count):
+        """Back-to-back reads, each in its own chip select cycle, issued as one
+        transaction with MISO enable asserted once.
+
+        Args:
+            readlen (int): number of bytes per read
+            count (int): number of reads
+
+        Returns:
+            bytes: concatenated read data of length readlen * count
+        """
+        with self._ctrl.lock:
+            stats = self._ctrl._stats
+            if stats is not None:
+                start = stats.start()
+            try:
+                with self._ctrl.transaction() as txn:
+                    pending = txn.read(self, readlen, count)
+                    txn.flush()
+            except BaseException:
+                if stats is not None:
+                    stats.cancel()
+                raise
+            if stats is not None:
+                stats.record(self._target, 'read', start, 0, len(pending.data))
+            return pending.data
@@ -43,8 +43,17 @@ class Ltc5594:
         (3500, 9000): (1, 0, 0, 0),
     }
 
+    # Registers mirrored in the shadow, 0x16 and 0x17 hold the self-clearing reset bit and
+    # status and are always read from the device
+    SHADOW_REGISTERS = range(0x0, 0x16)
+
     def __init__(self, interface):
         self._iface = interface
+        self._shadow = {}
+        self._shadow_cached = False
+        on_discard = getattr(interface, 'on_discard', None)
+        if on_discard is not None:
+            on_discard(self._clear_shadow)
 
     def init(self):
         """Initialize device."""
@@ -61,6 +70,20 @@ class Ltc5594:
         data = self.read(0x16)
         return data == 0xF0
 
+    def attach(self):
+        """Attach to a device that is already running, without resetting it. Reads back
+        the register file into the shadow.
+
+        Returns:
+            dict: register values by address
+        """
+        if not self.probe():
+            raise RuntimeError('Probe failed.')
+        self._shadow.clear()
+        for address in Ltc5594.SHADOW_REGISTERS:
+            self.read(address)
+        return dict(self._shadow)
+
     def setup(self, lo_freq):
         """Setup downmixer.
 
@@ -362,6 +385,7 @@ class Ltc5594:
 
     def reset(self):
         """Reset all registers to their default values."""
+        self._shadow.clear()
         self._write(0x16, 1, 3, 0x08)
 
     def write(self, address, data):
@@ -394,10 +418,24 @@ class Ltc5594:
         if data > 0xFF:
             raise RuntimeError('Data out-of-range.')
         if mask < 0xFF:
-            reg_val = self._read(address, 0, 0xFF)
+            reg_val = self._shadow.get(address)
+            if reg_val is None:
+                reg_val = self._read(address, 0, 0xFF)
             data |= (reg_val & ~mask & 0xFF)
         wdata = ((address << 8) | data).to_bytes(2, byteorder='big')
-        self._iface.write(wdata)
+        # The shadow is updated once the write is accepted. Transactions that fail to
+        # commit clear it through the discard hook, a failed direct write clears it here.
+        try:
+            self._iface.write(wdata, address=address)
+        except BaseException:
+            self._clear_shadow()
+            raise
+        if address in Ltc5594.SHADOW_REGISTERS:
+            self._shadow[address] = data
+
+    def _clear_shadow(self):
+        # Looked up on call, the shadow may be replaced by a shared.SharedShadow
+        self._shadow.clear()
 
     def _read(self, address, position, mask):
         if not isinstance(address, int) or not 0x0 <= address <= 0x17:
@@ -406,7 +444,11 @@ class Ltc5594:
             raise ValueError('position: Expected integer in range [0, 7].')
         if not isinstance(mask, int) or not 0x0 <= mask <= 0xFF:
             raise ValueError('mask: Expected integer in range [0x0, 0xFF].')
+        if self._shadow_cached and address in self._shadow:
+            return (self._shadow[address] & mask) >> position
         rdata = self._iface.query((0x80 | address).to_bytes(1, byteorder='big'), 1)
+        if address in Ltc5594.SHADOW_REGISTERS:
+            self._shadow[address] = rdata[0]
         return (rdata[0] & mask) >> position
 
 
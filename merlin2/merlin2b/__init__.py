@@ -23,20 +23,52 @@ from time import sleep
 from itertools import product
 import numpy as np
 
+from ..ready import Readiness
 from ..util import issequence
 from .input import Input
 from .output import Output
 from .filter import Filter
 from .delaygroup import DelayGroup
 from .summer import Summer
+from .model import FilterModel
+from .solver import WeightSolver
+from .quantizer import Quantizer
+from .profile import GainProfileOptimizer
+from .twin import DigitalTwin
 
 
 class Merlin2b:
 
-    def __init__(self, interface, reset_gpio, apls_gpio, use_vga=True, revision=2):
+    # (address, words) register regions mirrored in the shadow: both delay groups with
+    # their filters and summers, bandgap / LO control, and inputs / outputs
+    SHADOW_REGIONS = ((0x4, 40), (0x1004, 40), (0x2004, 3), (0x3004, 22))
+    # Minimum RESETN pulse width and bandgap enable toggle in seconds. Neither can be
+    # polled: the IC does not respond while in reset and the bandgap has no status.
+    RESET_PULSE = 1e-3
+    BANDGAP_SETTLE = 10e-3
+
+    def __init__(self, interface, reset_gpio, apls_gpio, use_vga=True, revision=2,
+                 readiness=None):
+        """
+        Args:
+            interface (Spi): SPI interface
+            reset_gpio (Gpio): RESETN pin
+            apls_gpio (Gpio): APLS pin
+            use_vga (bool, optional): enable input VGAs in setup()
+            revision (int, optional): IC revision in range [1, 2]
+            readiness (Readiness, optional): readiness polling, default own
+        """
         self._iface = interface
+        self.readiness = Readiness() if readiness is None else readiness
         self._resetn_gpio = reset_gpio
         self._apls_gpio = apls_gpio
+        self._shadow = {}
+        self._shadow_cached = False
+        self._shadow_addresses = frozenset(
+            base + 4 * index for base, words in Merlin2b.SHADOW_REGIONS for index in range(words))
+        on_discard = getattr(interface, 'on_discard', None)
+        if on_discard is not None:
+            on_discard(self._clear_shadow)
         self._chained = False
         self._use_vga = use_vga
         self._revision = revision
@@ -86,17 +118,62 @@ class Merlin2b:
 
     def reset(self):
         """Reset IC by toggling RESETN pin."""
+        self._shadow.clear()
         self._apls_gpio.set(False)
         self._resetn_gpio.set(True)
-        sleep(1e-3)
+        sleep(Merlin2b.RESET_PULSE)
+        self._resetn_gpio.set(False)
+        self.readiness.wait('reset', self.probe)
+
+    def wait_powered(self):
+        """Release RESETN and poll until the IC answers the probe, e.g. after its
+        supplies are enabled. init() resets it afterwards.
+
+        Returns:
+            float: time until the IC answered in seconds
+        """
+        self._apls_gpio.set(False)
         self._resetn_gpio.set(False)
-        sleep(1e-3)
+        return self.readiness.wait('power', self.probe)
 
     def apply(self):
         """Apply weights by toggling APLS pin."""
         self._apls_gpio.set(True)
         self._apls_gpio.set(False)
 
+    def attach(self):
+        """Attach to an IC that is already running, without resetting it.
+
+        Reads back the shadowed register regions and reconstructs driver state from them,
+        so a restarted process can continue where the previous one left off without
+        disturbing the analog path.
+
+        Returns:
+            dict: 'configured' (bool, bandgap enabled by setup()), 'chained' (bool),
+                  'bandwidth' (float), 'gains' (tuple), 'vga_gain' (tuple) and
+                  'weights' (ndarray)
+        """
+        self._apls_gpio.set(False)
+        self._resetn_gpio.set(False)
+        if not self.probe():
+            raise RuntimeError('Probe failed.')
+        self._shadow.clear()
+        for base, words in Merlin2b.SHADOW_REGIONS:
+            self.read(base, length=words)
+        self._chained = bool(self._shadow[0x4] & 0x1)
+        self._shadow_cached = True
+        try:
+            return {
+                'configured': self._shadow[0x2004] == 0x1990F,
+                'chained': self._chained,
+                'bandwidth': self.delays[0].bandwidth,
+                'gains': self.get_gain_profile(),
+                'vga_gain': self.get_vga_gain(),
+                'weights': self.get_weights(),
+            }
+        finally:
+            self._shadow_cached = False
+
     def probe(self):
         """Probe for IC. This will test SPI communication.
 
@@ -127,7 +204,7 @@ class Merlin2b:
         self.init()
         # Initialize bandgap: toggle enable
         self.write(0x2004, 0x1990E)
-        sleep(10e-3)
+        self.readiness.wait('bandgap', minimum=Merlin2b.BANDGAP_SETTLE)
         self.write(0x2004, 0x1990F)
         # Disable LO in / out
         self.write(0x200C, 0x7)
@@ -285,13 +362,18 @@ class Merlin2b:
             raise TypeError('output: Expected integer in range [0, 1].')
         return self.outputs[output].dc_offset
 
-    def set_weights(self, weights, apply=True):
+    def set_weights(self, weights, apply=True, quantizer=None, previous=None):
         """Set weights.
 
         Args:
             weights (ndarray): ndarray of shape (12, 4) if not chained, else
                                of shape (23, 2)
             apply (bool, optional): apply weights to filter
+            quantizer (callable, optional): maps weights to integer codes of shape
+                                            (num_taps, num_filters, 2), e.g. a
+                                            Quantizer, default rounding
+            previous (ndarray, optional): mapped weights currently written, only
+                                          taps that differ are written
 
         Returns:
             ndarray: mapped weights
@@ -301,19 +383,44 @@ class Merlin2b:
         if not isinstance(weights, np.ndarray) or weights.shape != (num_taps, num_filters):
             raise TypeError('weights: Expected ndarray of shape ({}, {}).'
                             .format(num_taps, num_filters))
-        fixed = []
-        mapped = np.zeros((num_taps, num_filters), dtype=np.complex128)
-        for col in range(num_filters):
-            data = np.empty((num_taps, 2), dtype=np.int16)
-            real = np.round(np.real(weights[:, col]) * 255)
-            imag = np.round(np.imag(weights[:, col]) * 255)
-            if (np.abs(real) > 255).any() or (np.abs(imag) > 255).any():
-                raise ValueError('weights: real and/or imaginary components out-of-range,'
-                                 ' must be in [-1, +1].')
-            data[:, 0] = real
-            data[:, 1] = imag
-            fixed.append(data)
-            mapped[:, col] = (data[:, 0] / 255) + 1j * (data[:, 1] / 255)
+        if previous is not None and (not isinstance(previous, np.ndarray)
+                                     or previous.shape != (num_taps, num_filters)):
+            raise TypeError('previous: Expected ndarray of shape ({}, {}).'
+                            .format(num_taps, num_filters))
+        if quantizer is None:
+            codes = np.stack((np.round(np.real(weights) * 255),
+                              np.round(np.imag(weights) * 255)), axis=-1)
+        else:
+            codes = np.asarray(quantizer(weights))
+            if codes.shape != (num_taps, num_filters, 2):
+                raise ValueError('quantizer: Expected codes of shape ({}, {}, 2).'
+                                 .format(num_taps, num_filters))
+        if (np.abs(codes) > 255).any():
+            raise ValueError('weights: real and/or imaginary components out-of-range,'
+                             ' must be in [-1, +1].')
+        codes = codes.astype(np.int16)
+        mapped = (codes[:, :, 0] / 255) + 1j * (codes[:, :, 1] / 255)
+        words = self._map_codes(codes)
+        if previous is None:
+            for inp, out in product(range(2), repeat=2):
+                self.filters[inp][out].set_weights(words[inp * 2 + out])
+        else:
+            written = self._map_codes(np.stack((np.round(np.real(previous) * 255),
+                                                np.round(np.imag(previous) * 255)),
+                                               axis=-1).astype(np.int16))
+            for inp, out in product(range(2), repeat=2):
+                index = inp * 2 + out
+                taps = np.flatnonzero((words[index] != written[index]).any(axis=1))
+                if taps.size:
+                    self.filters[inp][out].set_weights(words[index], taps=taps)
+        if apply:
+            self.apply()
+        return mapped
+
+    def _map_codes(self, codes):
+        # Map integer codes of shape (num_taps, num_filters, 2) to filter words
+        num_filters = codes.shape[1]
+        fixed = [codes[:, col, :] for col in range(num_filters)]
         words = [np.zeros((12, 3), dtype=np.int16) for _ in range(4)]
         if self._chained:
             words[0][:,:2] = fixed[0][:12,:]
@@ -330,11 +437,7 @@ class Merlin2b:
             tmp = words[0][11,:].copy()
             words[0][11,:] = words[1][11,:]
             words[1][11,:] = tmp
-        for inp, out in product(range(2), repeat=2):
-            self.filters[inp][out].set_weights(words[inp * 2 + out])
-        if apply:
-            self.apply()
-        return mapped
+        return words
 
     def get_weights(self):
         """Get weights.
@@ -393,13 +496,30 @@ class Merlin2b:
             raise TypeError('mask: Expected integer in range [1, 2^32).')
         if mask << position >= 2**32:
             raise ValueError('Invalid mask / position, must be < 2^32.')
+        addresses = range(address, address + 4 * len(data), 4)
+        shadowed = all(a in self._shadow for a in addresses)
         if mask != 2**32 - 1:
-            rdata = self.read(address, length=len(data))
-            rdata = rdata if len(data) > 1 else [rdata]
+            if shadowed:
+                rdata = [self._shadow[a] for a in addresses]
+            else:
+                rdata = self.read(address, length=len(data))
+                rdata = rdata if len(data) > 1 else [rdata]
             data = [((w << position) & mask) | (r & ~mask) for w, r in zip(data, rdata)]
         write_data = b''.join([(address // 4).to_bytes(2, byteorder='big')] + \
                      [x.to_bytes(4, byteorder='big') for x in data])
-        self._iface.write(write_data)
+        # The shadow is updated once the write is accepted. Transactions that fail to
+        # commit clear it through the discard hook, a failed direct write clears it here.
+        try:
+            self._iface.write(write_data, address=address)
+        except BaseException:
+            self._clear_shadow()
+            raise
+        self._shadow.update((a, d) for a, d in zip(addresses, data)
+                            if a in self._shadow_addresses)
+
+    def _clear_shadow(self):
+        # Looked up on call, the shadow may be replaced by a shared.SharedShadow
+        self._shadow.clear()
 
     def read(self, address, position=0, mask=2**32-1, length=1):
         if not isinstance(address, int) or not 0 <= address <= 0x7FFC \
@@ -413,9 +533,15 @@ class Merlin2b:
             raise TypeError('mask: Expected integer in range [1, 2^32).')
         if mask << position >= 2**32:
             raise ValueError('Invalid mask / position, must be < 2^32.')
-        cmd = ((address // 4) | 0x2000).to_bytes(2, byteorder='big')
-        data = self._iface.query(cmd, length * 4)
-        words = struct.unpack('>{}I'.format(length), data)
+        addresses = range(address, address + 4 * length, 4)
+        if self._shadow_cached and all(a in self._shadow for a in addresses):
+            words = tuple(self._shadow[a] for a in addresses)
+        else:
+            cmd = ((address // 4) | 0x2000).to_bytes(2, byteorder='big')
+            data = self._iface.query(cmd, length * 4)
+            words = struct.unpack('>{}I'.format(length), data)
+            self._shadow.update((a, d) for a, d in zip(addresses, words)
+                                if a in self._shadow_addresses)
         if mask != 2**32 - 1:
             words = [(d & mask) >> position for d in words]
         return words[0] if length == 1 else words
@@ -70,7 +70,7 @@ class Filter(Block):
             raise ValueError('bypass: Expected bool.')
         self.write(0x0, 0x7 if bypass else 0x0, 2, 0x1C)
 
-    def set_weights(self, weights):
+    def set_weights(self, weights, taps=None):
         if not isinstance(weights, np.ndarray) or weights.shape != (12, 3) \
           or weights.dtype != np.int16:
             raise TypeError('weights: Expected ndarray of size (12, 3) of type int16.')
@@ -84,7 +84,19 @@ class Filter(Block):
             i = int(i if i >= 0 else abs(i) + 0x100)
             q = int(q if q >= 0 else abs(q) + 0x100)
             words.append(i | q << 9 | int(disconnect) << 28)
-        self.write(0x4, words)
+        if taps is None:
+            self.write(0x4, words)
+            return
+        # Write runs of consecutive taps in single bursts
+        taps = sorted(set(int(tap) for tap in taps))
+        if taps and not 0 <= taps[0] <= taps[-1] < 12:
+            raise ValueError('taps: Expected indices in range [0, 12).')
+        start = 0
+        for index in range(1, len(taps) + 1):
+            if index == len(taps) or taps[index] != taps[index - 1] + 1:
+                first, last = taps[start], taps[index - 1]
+                self.write(0x4 + 4 * first, words[first:last + 1])
+                start = index
 
     def get_weights(self):
         words = self.read(0x4, length=12)
@@ -0,0 +1,184 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from functools import lru_cache
+import numpy as np
+
+from ..util import issequence
+
+
+# Nominal delay between adjacent taps for each bandwidth setting in seconds. The delay
+# cells are scaled with the bandwidth setting; measure and pass tap_delay to FilterModel
+# for more accurate predictions.
+TAP_DELAY = {20e6: 1 / (2 * 20e6), 40e6: 1 / (2 * 40e6), 80e6: 1 / (2 * 80e6)}
+
+DEFAULT_GAINS = (0, 0, 0, -2, 0, 0, 0, 0, 0, 0, 0)
+
+
+class FilterModel:
+    """Frequency response model of the Merlin2b analog FIR filters.
+
+    Tap k of a filter sees the input delayed by k tap delays and scaled by the
+    cumulative gain of the k delay cells before it. In chained mode, the 11 delay cells
+    of delay group 1 extend the 11 cells of delay group 0 to a 23-tap filter. Weight
+    matrices use the same layout as Merlin2b.set_weights(): (12, 4) with columns
+    (i0o0, i0o1, i1o0, i1o1), or (23, 2) with columns (o0, o1) if chained.
+    """
+
+    def __init__(self, bandwidth, gains=None, chain=False, tap_delay=None):
+        """
+        Args:
+            bandwidth (float): bandwidth in Hz, float in set {20e6, 40e6, 80e6}
+            gains (sequence, optional): gain-delay profile in dB of length 11, or 22
+                                        if chained, default setup() profile
+            chain (bool, optional): chained filters
+            tap_delay (float, optional): delay between taps in seconds, default
+                                         nominal delay for bandwidth
+        """
+        if bandwidth not in TAP_DELAY:
+            raise ValueError('bandwidth: Expected float in set {20, 40, 80} MHz.')
+        if not isinstance(chain, bool):
+            raise TypeError('chain: Expected bool.')
+        if gains is None:
+            gains = DEFAULT_GAINS * 2 if chain else DEFAULT_GAINS
+        expected = 22 if chain else 11
+        if not issequence(gains) or len(gains) != expected:
+            raise TypeError('gains: Expected sequence of length {}.'.format(expected))
+        for group in range(expected // 11):
+            cells = gains[group * 11:(group + 1) * 11]
+            if not all(g in (-4, -2, 0) for g in cells[:2]):
+                raise ValueError('gains[0..1]: Expected float / integer in set {-4, -2, 0} dB.')
+            if not all(g in (-2, 0, 2) for g in cells[2:]):
+                raise ValueError('gains[2..10]: Expected float / integer in set {-2, 0, 2} dB.')
+        if tap_delay is None:
+            tap_delay = TAP_DELAY[bandwidth]
+        if not isinstance(tap_delay, (float, int)) or tap_delay <= 0:
+            raise ValueError('tap_delay: Expected float > 0.')
+        self.bandwidth = float(bandwidth)
+        self.gains = tuple(float(g) for g in gains)
+        self.chain = chain
+        self.tap_delay = float(tap_delay)
+
+    @classmethod
+    def from_ic(cls, ic, tap_delay=None):
+        """Create model of current IC configuration.
+
+        Args:
+            ic (Merlin2b): configured IC
+            tap_delay (float, optional): delay between taps in seconds
+
+        Returns:
+            FilterModel: model
+        """
+        return cls(ic.delays[0].bandwidth, ic.get_gain_profile(), chain=ic._chained,
+                   tap_delay=tap_delay)
+
+    @property
+    def shape(self):
+        """Weight matrix shape.
+
+        Returns:
+            tuple: (12, 4) if not chained, else (23, 2)
+        """
+        return (23, 2) if self.chain else (12, 4)
+
+    @property
+    def amplitudes(self):
+        """Linear amplitude of each tap.
+
+        Returns:
+            ndarray: ndarray of shape (num_taps,)
+        """
+        return _tap_amplitudes(self.gains)
+
+    @property
+    def delays(self):
+        """Delay of each tap.
+
+        Returns:
+            ndarray: ndarray of shape (num_taps,) in seconds
+        """
+        return np.arange(self.shape[0]) * self.tap_delay
+
+    def grid(self, num=64):
+        """Evenly spaced baseband frequencies across the bandwidth.
+
+        Args:
+            num (int, optional): number of frequencies
+
+        Returns:
+            ndarray: frequencies in Hz
+        """
+        return np.linspace(-self.bandwidth / 2, self.bandwidth / 2, num)
+
+    def basis(self, freqs):
+        """Tap basis matrix. Entry (f, k) is the response of tap k with unit weight at
+        frequency f. Matrices are cached per bandwidth, gain profile, chain, tap delay
+        and frequency grid and must not be modified.
+
+        Args:
+            freqs (ndarray): baseband frequencies in Hz of shape (num_freqs,)
+
+        Returns:
+            ndarray: read-only complex ndarray of shape (num_freqs, num_taps)
+        """
+        freqs = np.ascontiguousarray(freqs, dtype=np.float64)
+        if freqs.ndim != 1:
+            raise TypeError('freqs: Expected 1-dimensional ndarray.')
+        return _tap_basis(self.gains, self.tap_delay, freqs.tobytes())
+
+    def response(self, weights, freqs):
+        """Frequency response of every filter for one or many weight matrices.
+
+        Args:
+            weights (ndarray): ndarray of shape (..., num_taps, num_filters)
+            freqs (ndarray): baseband frequencies in Hz of shape (num_freqs,)
+
+        Returns:
+            ndarray: complex ndarray of shape (..., num_freqs, num_filters)
+        """
+        weights = np.asarray(weights)
+        if weights.ndim < 2 or weights.shape[-2:] != self.shape:
+            raise TypeError('weights: Expected ndarray of shape (..., {}, {}).'
+                            .format(*self.shape))
+        return np.matmul(self.basis(freqs), weights)
+
+    def __repr__(self):
+        return 'FilterModel(bandwidth={!r}, gains={!r}, chain={!r}, tap_delay={!r})'.format(
+            self.bandwidth, self.gains, self.chain, self.tap_delay)
+
+
+@lru_cache(maxsize=256)
+def _tap_amplitudes(gains):
+    # Tap k sits behind delay cells 0..k-1
+    cumulative = np.concatenate(([0.], np.cumsum(gains)))
+    amplitudes = 10 ** (cumulative / 20)
+    amplitudes.setflags(write=False)
+    return amplitudes
+
+
+@lru_cache(maxsize=64)
+def _tap_basis(gains, tap_delay, freqs):
+    freqs = np.frombuffer(freqs, dtype=np.float64)
+    amplitudes = _tap_amplitudes(gains)
+    delays = np.arange(len(amplitudes)) * tap_delay
+    basis = amplitudes * np.exp(-2j * np.pi * np.outer(freqs, delays))
+    basis.setflags(write=False)
+    return basis
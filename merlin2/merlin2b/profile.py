@@ -0,0 +1,187 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import os
+import numpy as np
+
+from .model import FilterModel, DEFAULT_GAINS
+from .solver import WeightSolver
+
+
+ProfileResult = namedtuple('ProfileResult', ('gains', 'weights', 'error'))
+
+# Gain choices of the first two and the remaining nine delay cells of a delay group
+LOW_GAINS = (-4., -2., 0.)
+HIGH_GAINS = (-2., 0., 2.)
+
+
+class GainProfileOptimizer:
+    """Search of the gain-delay profile for a target channel.
+
+    Scaling taps does not change the span of the tap basis, so profiles only differ in
+    how well the required weights fit the [-1, +1] range and the 1 / 255 grid. Every
+    profile is scored by clipping and rounding the least-squares weights of a unit-gain
+    model, rescaled to the tap amplitudes of the profile. The error of the rounded
+    weights follows exactly from the Gram matrix of the unit-gain basis, so scoring is
+    a few vectorized operations per chunk of profiles. Chunks are spread across a
+    process pool. The best scoring profiles, refine times the number requested, are
+    refined with WeightSolver together with the default profile, and ranked by their
+    quantized fit.
+
+    Without chaining all 3^11 profiles are scored. With chaining, the 3^22 profiles
+    are pruned by optimizing one delay group at a time over all its 3^11 profiles with
+    the other group fixed, alternating for a number of rounds.
+    """
+
+    def __init__(self, bandwidth, freqs, chain=False, tap_delay=None,
+                 regularization=1e-4, workers=None, chunk_size=8192):
+        """
+        Args:
+            bandwidth (float): bandwidth in Hz, float in set {20e6, 40e6, 80e6}
+            freqs (ndarray): baseband frequencies in Hz of shape (num_freqs,)
+            chain (bool, optional): chained filters
+            tap_delay (float, optional): delay between taps in seconds
+            regularization (float, optional): regularization of WeightSolver
+            workers (int, optional): number of processes, default number of CPUs,
+                                     1 scores in the calling process
+            chunk_size (int, optional): number of profiles scored at once
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError('workers: Expected integer > 0.')
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            raise ValueError('chunk_size: Expected integer > 0.')
+        self._unit = FilterModel(bandwidth, gains=(0,) * (22 if chain else 11), chain=chain,
+                                 tap_delay=tap_delay)
+        self.freqs = np.ascontiguousarray(freqs, dtype=np.float64)
+        self.regularization = regularization
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def optimize(self, channel, top_k=5, rounds=2, refine=4):
+        """Find best gain-delay profiles.
+
+        Args:
+            channel (ndarray): complex ndarray of shape (num_freqs, num_filters)
+            top_k (int, optional): number of profiles to return
+            rounds (int, optional): alternating group rounds if chained
+            refine (int, optional): profiles refined per profile returned
+
+        Returns:
+            list: ProfileResult(gains, weights, error) sorted by error, where gains
+                  is a tuple for Merlin2b.set_gain_profile(), weights the quantized
+                  weights of WeightSolver and error the residual energy relative
+                  to the channel energy
+        """
+        if not isinstance(top_k, int) or top_k < 1:
+            raise ValueError('top_k: Expected integer > 0.')
+        if not isinstance(refine, int) or refine < 1:
+            raise ValueError('refine: Expected integer > 0.')
+        solver = WeightSolver(self._unit, self.freqs, self.regularization)
+        channel = np.asarray(channel)
+        if channel.shape != solver.shape:
+            raise TypeError('channel: Expected ndarray of shape {}.'.format(solver.shape))
+        basis = self._unit.basis(self.freqs)
+        weights = solver.solve(channel, quantize=False)
+        residual = basis @ weights - channel
+        state = {
+            'weights': weights,
+            'gram': basis.conj().T @ basis,
+            'grad': basis.conj().T @ residual,
+            'offset': np.sum(np.abs(residual) ** 2),
+        }
+        groups = 2 if self._unit.chain else 1
+        fixed = np.zeros(11 * groups)
+        candidates = None
+        for _ in range(rounds if self._unit.chain else 1):
+            for group in range(groups):
+                state['fixed'] = fixed
+                state['group'] = group
+                candidates = self._search(state, top_k * refine)
+                fixed = _profiles(np.array([candidates[0][0]]), fixed, group)[0]
+        gains = _profiles(np.array([index for index, _ in candidates]),
+                          state['fixed'], state['group'])
+        # The default profile is always refined as well
+        default = np.array(DEFAULT_GAINS * groups, dtype=np.float64)
+        if not (gains == default).all(axis=1).any():
+            gains = np.concatenate((gains, default[np.newaxis]))
+        energy = np.sum(np.abs(channel) ** 2)
+        results = []
+        for profile in gains:
+            model = FilterModel(self._unit.bandwidth, tuple(profile), chain=self._unit.chain,
+                                tap_delay=self._unit.tap_delay)
+            profile_solver = WeightSolver(model, self.freqs, self.regularization)
+            solved = profile_solver.solve(channel)
+            error = np.sum(np.abs(model.response(solved, self.freqs) - channel) ** 2)
+            results.append(ProfileResult(model.gains, solved,
+                                         float(error / energy) if energy else 0.))
+        return sorted(results, key=lambda r: r.error)[:top_k]
+
+    def _search(self, state, top_k):
+        total = 3 ** 11
+        chunks = [(start, min(start + self.chunk_size, total), top_k)
+                  for start in range(0, total, self.chunk_size)]
+        if self.workers == 1:
+            _init_worker(state)
+            parts = [_score_chunk(chunk) for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                     initargs=(state,)) as pool:
+                parts = list(pool.map(_score_chunk, chunks))
+        indices = np.concatenate([p[0] for p in parts])
+        scores = np.concatenate([p[1] for p in parts])
+        order = np.argsort(scores)[:top_k]
+        return [(int(indices[i]), float(scores[i])) for i in order]
+
+
+_worker_state = {}
+
+
+def _init_worker(state):
+    _worker_state.clear()
+    _worker_state.update(state)
+
+
+def _score_chunk(args):
+    start, stop, top_k = args
+    s = _worker_state
+    gains = _profiles(np.arange(start, stop), s['fixed'], s['group'])
+    cumulative = np.concatenate((np.zeros((len(gains), 1)), np.cumsum(gains, axis=1)), axis=1)
+    amplitudes = (10 ** (cumulative / 20))[:, :, np.newaxis]
+    # Weights of the profile, rounded to the grid, mapped back to the unit-gain basis
+    scaled = s['weights'] / amplitudes
+    codes = np.clip(np.round(scaled.real * 255), -255, 255) + \
+        1j * np.clip(np.round(scaled.imag * 255), -255, 255)
+    error = amplitudes * codes / 255 - s['weights']
+    scores = np.einsum('pkc,pkc->p', error.conj(), s['gram'] @ error + 2 * s['grad']).real + \
+        s['offset']
+    best = np.argsort(scores)[:top_k]
+    return start + best, scores[best]
+
+
+def _profiles(indices, fixed, group):
+    digits = (indices[:, np.newaxis] // 3 ** np.arange(11)) % 3
+    table = np.array((LOW_GAINS,) * 2 + (HIGH_GAINS,) * 9)
+    gains = np.tile(fixed, (len(indices), 1))
+    gains[:, group * 11:(group + 1) * 11] = table[np.arange(11), digits]
+    return gains
@@ -0,0 +1,178 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
+
+from .model import FilterModel, _tap_basis
+
+
+class Quantizer:
+    """Quantization of weights to integer codes minimizing the modeled response error.
+
+    Rounding the real and imaginary part of every tap independently ignores that tap
+    responses overlap in frequency. This quantizer minimizes the error of the quantized
+    filter response instead:
+
+        ||B (q / 255 - w)||^2
+
+    where B is the tap basis of the model on the given frequency grid. The search
+    starts from the better of plain rounding and successive rounding on the Cholesky
+    factor of B^H B (Babai's nearest plane), then greedily applies the single +-1 code
+    move that reduces the error most until no move improves it. Every step is
+    vectorized over all filters of all weight matrices.
+
+    A Quantizer can be passed to Merlin2b.set_weights() as quantizer. With more than
+    one worker, close() shuts down the worker threads.
+    """
+
+    def __init__(self, model, freqs, max_iter=64, workers=1):
+        """
+        Args:
+            model (FilterModel): filter model
+            freqs (ndarray): baseband frequencies in Hz of shape (num_freqs,)
+            max_iter (int, optional): maximum number of +-1 code moves per filter
+            workers (int, optional): number of threads splitting large batches
+        """
+        if not isinstance(model, FilterModel):
+            raise TypeError('model: Expected FilterModel.')
+        if not isinstance(max_iter, int) or max_iter < 0:
+            raise ValueError('max_iter: Expected integer >= 0.')
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError('workers: Expected integer > 0.')
+        self.model = model
+        self.freqs = np.ascontiguousarray(freqs, dtype=np.float64)
+        self.max_iter = max_iter
+        self.workers = workers
+        self._gram, self._chol = _gram_matrices(model.gains, model.tap_delay,
+                                                self.freqs.tobytes())
+        self._pool = None
+
+    def close(self):
+        """Shut down worker threads."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __call__(self, weights):
+        """Quantize weights.
+
+        Args:
+            weights (ndarray): complex ndarray of shape (..., num_taps, num_filters)
+
+        Returns:
+            ndarray: int16 ndarray of shape (..., num_taps, num_filters, 2) with (real,
+                     imag) codes in range [-255, 255]
+        """
+        return self.quantize(weights)[0]
+
+    def quantize(self, weights):
+        """Quantize weights.
+
+        Args:
+            weights (ndarray): complex ndarray of shape (..., num_taps, num_filters)
+
+        Returns:
+            tuple: int16 ndarray of shape (..., num_taps, num_filters, 2) with (real,
+                   imag) codes in range [-255, 255], and ndarray of shape
+                   (..., num_filters) with the error energy of the quantized response
+                   relative to the energy of the unquantized response
+        """
+        weights = np.asarray(weights)
+        num_taps, num_filters = self.model.shape
+        if weights.ndim < 2 or weights.shape[-2:] != self.model.shape:
+            raise TypeError('weights: Expected ndarray of shape (..., {}, {}).'
+                            .format(num_taps, num_filters))
+        batch = weights.shape[:-2]
+        # Flatten to rows of real-stacked filter weights, shape (N, 2 * num_taps)
+        w = np.swapaxes(weights, -1, -2).reshape(-1, num_taps)
+        w = np.clip(np.concatenate((w.real, w.imag), axis=-1), -1., 1.)
+        if self.workers > 1 and len(w) >= 2 * self.workers:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers)
+            parts = list(self._pool.map(self._quantize_rows, np.array_split(w, self.workers)))
+            codes = np.concatenate([p[0] for p in parts])
+            error = np.concatenate([p[1] for p in parts])
+        else:
+            codes, error = self._quantize_rows(w)
+        codes = codes.reshape(batch + (num_filters, 2, num_taps))
+        codes = np.moveaxis(codes, (-3, -2, -1), (-2, -1, -3)).astype(np.int16)
+        return codes, error.reshape(batch + (num_filters,))
+
+    def _quantize_rows(self, w):
+        gram = self._gram
+        # Candidate starting points: plain rounding and nearest plane
+        rounded = np.round(w * 255)
+        babai = self._nearest_plane(w)
+        cost_rounded = self._cost(rounded / 255 - w)
+        cost_babai = self._cost(babai / 255 - w)
+        q = np.where((cost_babai < cost_rounded)[:, np.newaxis], babai, rounded)
+        error = q / 255 - w
+        grad = np.matmul(error, gram)
+        diag = np.diag(gram) / 255 ** 2
+        rows = np.arange(len(q))
+        active = np.ones(len(q), dtype=bool)
+        for it in range(self.max_iter):
+            # Cost change of moving code i by +-1: 2 * d / 255 * grad_i + G_ii / 255^2
+            up = np.where(q < 255, 2 / 255 * grad + diag, np.inf)
+            down = np.where(q > -255, -2 / 255 * grad + diag, np.inf)
+            use_up = up <= down
+            delta = np.where(use_up, up, down)
+            index = np.argmin(delta, axis=-1)
+            active &= delta[rows, index] < -1e-15
+            if not active.any():
+                break
+            step = np.where(use_up[rows, index], 1., -1.) * active
+            q[rows, index] += step
+            grad += (step / 255)[:, np.newaxis] * gram[index]
+        error = q / 255 - w
+        reference = self._cost(w)
+        return q, self._cost(error) / np.where(reference > 0, reference, 1.)
+
+    def _nearest_plane(self, w):
+        r = self._chol
+        target = np.matmul(w, r.T)
+        q = np.zeros(w.shape)
+        for i in reversed(range(r.shape[0])):
+            value = target[:, i] - np.matmul(q[:, i + 1:], r[i, i + 1:]) / 255
+            q[:, i] = np.clip(np.round(value / r[i, i] * 255), -255, 255)
+        return q
+
+    def _cost(self, error):
+        return np.einsum('ni,ij,nj->n', error, self._gram, error)
+
+
+@lru_cache(maxsize=64)
+def _gram_matrices(gains, tap_delay, freqs):
+    basis = _tap_basis(gains, tap_delay, freqs)
+    a = np.block([[basis.real, -basis.imag], [basis.imag, basis.real]])
+    gram = a.T @ a
+    # Small diagonal loading keeps the factorization stable for coarse grids
+    chol = np.linalg.cholesky(gram + 1e-9 * np.trace(gram) * np.eye(len(gram))).T
+    for m in (gram, chol):
+        m.setflags(write=False)
+    return gram, chol
@@ -0,0 +1,133 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from functools import lru_cache
+import numpy as np
+
+from .model import FilterModel, _tap_basis
+
+
+class WeightSolver:
+    """Least-squares weight solver for a measured channel.
+
+    Fits the filter response of FilterModel to a channel response H(f), one filter
+    column at a time:
+
+        minimize ||B w - h||^2 + regularization * ||w||^2
+
+    where B is the tap basis of the model. Weights are quantized to the hardware grid
+    (integer codes / 255 with real and imaginary parts in [-255, 255]) by successive
+    rounding on the QR factor of B (Babai's nearest plane), so the rounding error of
+    each tap is partly compensated by the taps quantized after it. The solver matrices
+    are cached per model configuration, frequency grid and regularization, and all
+    methods are vectorized over leading dimensions of the channel.
+    """
+
+    def __init__(self, model, freqs, regularization=1e-4):
+        """
+        Args:
+            model (FilterModel): filter model
+            freqs (ndarray): baseband frequencies in Hz of shape (num_freqs,)
+            regularization (float, optional): Tikhonov regularization relative to the
+                                              mean tap energy
+        """
+        if not isinstance(model, FilterModel):
+            raise TypeError('model: Expected FilterModel.')
+        if not isinstance(regularization, (float, int)) or regularization < 0:
+            raise ValueError('regularization: Expected float >= 0.')
+        self.model = model
+        self.freqs = np.ascontiguousarray(freqs, dtype=np.float64)
+        self.regularization = float(regularization)
+        self._basis = model.basis(self.freqs)
+        self._proj, self._r, self._r_inv = _solver_matrices(
+            model.gains, model.tap_delay, self.freqs.tobytes(), self.regularization)
+
+    @property
+    def shape(self):
+        """Channel shape.
+
+        Returns:
+            tuple: (num_freqs, num_filters)
+        """
+        return (len(self.freqs), self.model.shape[1])
+
+    def solve(self, channel, quantize=True):
+        """Solve for weights.
+
+        Args:
+            channel (ndarray): complex ndarray of shape (..., num_freqs, num_filters)
+            quantize (bool, optional): quantize weights to the hardware grid
+
+        Returns:
+            ndarray: complex ndarray of shape (..., num_taps, num_filters)
+        """
+        channel = np.asarray(channel)
+        if channel.ndim < 2 or channel.shape[-2:] != self.shape:
+            raise TypeError('channel: Expected ndarray of shape (..., {}, {}).'
+                            .format(*self.shape))
+        target = np.matmul(self._proj, np.concatenate((channel.real, channel.imag), axis=-2))
+        if quantize:
+            x = self._nearest_plane(target)
+        else:
+            x = np.clip(np.matmul(self._r_inv, target), -1., 1.)
+        num_taps = self.model.shape[0]
+        return x[..., :num_taps, :] + 1j * x[..., num_taps:, :]
+
+    def residual(self, weights, channel):
+        """Residual energy of the filter response relative to the channel energy.
+
+        Args:
+            weights (ndarray): complex ndarray of shape (..., num_taps, num_filters)
+            channel (ndarray): complex ndarray of shape (..., num_freqs, num_filters)
+
+        Returns:
+            ndarray: ndarray of shape (..., num_filters)
+        """
+        error = np.matmul(self._basis, weights) - channel
+        energy = np.sum(np.abs(channel) ** 2, axis=-2)
+        return np.sum(np.abs(error) ** 2, axis=-2) / np.where(energy > 0, energy, 1.)
+
+    def _nearest_plane(self, target):
+        r = self._r
+        x = np.zeros(target.shape, dtype=np.float64)
+        for i in reversed(range(r.shape[0])):
+            value = target[..., i, :] - np.matmul(r[i, i + 1:], x[..., i + 1:, :])
+            x[..., i, :] = np.clip(np.round(value / r[i, i] * 255), -255, 255) / 255
+        return x
+
+
+@lru_cache(maxsize=64)
+def _solver_matrices(gains, tap_delay, freqs, regularization):
+    basis = _tap_basis(gains, tap_delay, freqs)
+    num_taps = basis.shape[1]
+    # Real-valued system on stacked (real, imag) parts of weights and channel
+    a = np.block([[basis.real, -basis.imag], [basis.imag, basis.real]])
+    scale = np.sqrt(regularization * np.sum(np.abs(basis) ** 2) / num_taps)
+    augmented = np.concatenate((a, scale * np.eye(2 * num_taps)))
+    q, r = np.linalg.qr(augmented)
+    # Flip signs so that the diagonal of r is positive
+    signs = np.sign(np.diag(r))
+    signs[signs == 0] = 1.
+    q, r = q * signs, r * signs[:, np.newaxis]
+    proj = np.ascontiguousarray(q[:a.shape[0], :].T)
+    r_inv = np.linalg.inv(r)
+    for m in (proj, r, r_inv):
+        m.setflags(write=False)
+    return proj, r, r_inv
@@ -0,0 +1,210 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from .model import FilterModel
+
+
+class DigitalTwin:
+    """Sample-domain replica of the Merlin2b analog filters.
+
+    Tap k of a filter becomes a fractional delay of k tap delays at the sample rate,
+    realized as a Kaiser-windowed sinc of 2 * half_width + 1 samples and scaled by the
+    tap amplitude and weight. Sample streams are filtered with an overlap-save FFT
+    engine in blocks of fft_size samples, so memory use is bounded for streams of any
+    length, and output channels are computed in parallel threads.
+
+    Without chaining, output o is the sum of input i filtered by weight column
+    (i0o0, i0o1, i1o0, i1o1)[2 * i + o]. With chaining, output o is input 0 filtered
+    by weight column o. Weights read with Merlin2b.get_weights() are logical, i.e.
+    the revision 1 tap swap and revision 2 filter and output flips are undone.
+    The input VGAs and DC offsets are not modeled.
+    """
+
+    def __init__(self, model, weights, sample_rate, half_width=16, fft_size=4096,
+                 workers=None):
+        """
+        Args:
+            model (FilterModel): filter model
+            weights (ndarray): complex ndarray of shape (12, 4) if not chained, else
+                               of shape (23, 2)
+            sample_rate (float): complex sample rate of the streams in Hz
+            half_width (int, optional): half width of the tap interpolation kernels
+            fft_size (int, optional): FFT size of the overlap-save blocks
+            workers (int, optional): threads across outputs, default one per output
+        """
+        if not isinstance(model, FilterModel):
+            raise TypeError('model: Expected FilterModel.')
+        if not isinstance(weights, np.ndarray) or weights.shape != model.shape:
+            raise TypeError('weights: Expected ndarray of shape {}.'.format(model.shape))
+        if not sample_rate > 0:
+            raise ValueError('sample_rate: Expected float > 0.')
+        if not isinstance(half_width, int) or half_width < 1:
+            raise ValueError('half_width: Expected integer > 0.')
+        self.model = model
+        self.weights = weights.astype(np.complex128)
+        self.sample_rate = float(sample_rate)
+        self.latency = half_width
+        self.num_inputs = 1 if model.chain else 2
+        self.num_outputs = 2
+        delays = model.delays * self.sample_rate
+        length = 2 * half_width + int(np.ceil(delays[-1])) + 1
+        if not isinstance(fft_size, int) or fft_size < 2 * length:
+            raise ValueError('fft_size: Expected integer >= {}.'.format(2 * length))
+        self.fft_size = fft_size
+        self.workers = self.num_outputs if workers is None else workers
+        # Windowed sinc kernels of shape (length, num_taps)
+        offset = np.arange(length)[:, np.newaxis] - half_width - delays
+        window = np.i0(8.6 * np.sqrt(np.clip(1 - (offset / (half_width + 1)) ** 2, 0, 1))) / \
+            np.i0(8.6)
+        kernels = np.sinc(offset) * window * model.amplitudes
+        columns = kernels @ self.weights
+        if model.chain:
+            self.impulse_response = columns.T[np.newaxis, :, :]
+        else:
+            self.impulse_response = columns.T.reshape(2, 2, length)
+        self.impulse_response.setflags(write=False)
+        self._spectrum = np.fft.fft(self.impulse_response, fft_size)
+        self._history = None
+        self._pool = None
+        self.reset()
+
+    @classmethod
+    def from_ic(cls, ic, sample_rate, tap_delay=None, **kwargs):
+        """Create twin of current IC configuration and weights.
+
+        Args:
+            ic (Merlin2b): configured IC
+            sample_rate (float): complex sample rate of the streams in Hz
+            tap_delay (float, optional): delay between taps in seconds
+            **kwargs: see DigitalTwin()
+
+        Returns:
+            DigitalTwin: twin
+        """
+        return cls(FilterModel.from_ic(ic, tap_delay), ic.get_weights(), sample_rate, **kwargs)
+
+    @property
+    def length(self):
+        """Impulse response length in samples.
+
+        Returns:
+            int: length
+        """
+        return self.impulse_response.shape[-1]
+
+    def reset(self):
+        """Clear stream state."""
+        self._history = np.zeros((self.num_inputs, self.length - 1), dtype=np.complex128)
+
+    def close(self):
+        """Shut down worker threads."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def process(self, samples):
+        """Filter next samples of the streams. Output lags input by latency samples.
+
+        Args:
+            samples (ndarray): complex ndarray of shape (num_inputs, num_samples)
+
+        Returns:
+            ndarray: complex128 ndarray of shape (num_outputs, num_samples)
+        """
+        samples = np.asarray(samples)
+        if samples.ndim != 2 or samples.shape[0] != self.num_inputs:
+            raise TypeError('samples: Expected ndarray of shape ({}, num_samples).'
+                            .format(self.num_inputs))
+        overlap = self.length - 1
+        step = self.fft_size - overlap
+        num_samples = samples.shape[1]
+        output = np.empty((self.num_outputs, num_samples), dtype=np.complex128)
+        if self.workers > 1 and self._pool is None:
+            self._pool = ThreadPoolExecutor(self.workers)
+        # Transform a batch of overlapping blocks at once
+        batch = max(1, 2**18 // self.fft_size)
+        for start in range(0, num_samples, batch * step):
+            count = min(batch * step, num_samples - start)
+            num_blocks = -(-count // step)
+            data = np.zeros((self.num_inputs, num_blocks * step + overlap), dtype=np.complex128)
+            data[:, :overlap] = self._history
+            data[:, overlap:overlap + count] = samples[:, start:start + count]
+            blocks = np.lib.stride_tricks.sliding_window_view(
+                data, self.fft_size, axis=1)[:, ::step]
+            spectrum = np.fft.fft(blocks)
+
+            def convolve(out):
+                filtered = np.einsum('ibn,in->bn', spectrum, self._spectrum[:, out])
+                block = np.fft.ifft(filtered)[:, overlap:].reshape(-1)
+                output[out, start:start + count] = block[:count]
+
+            if self._pool is None:
+                for out in range(self.num_outputs):
+                    convolve(out)
+            else:
+                list(self._pool.map(convolve, range(self.num_outputs)))
+            self._history = data[:, count:count + overlap].copy()
+        return output
+
+    def run(self, inputs, out=None, chunk_size=2**20):
+        """Filter complete streams aligned to the input, e.g. memory-mapped captures.
+
+        Args:
+            inputs (ndarray): complex ndarray of shape (num_samples, num_inputs),
+                              e.g. np.memmap or np.load(..., mmap_mode='r')
+            out (ndarray, optional): complex ndarray of shape (num_samples,
+                                     num_outputs), e.g. np.memmap, default allocated
+            chunk_size (int, optional): samples read from inputs at once
+
+        Returns:
+            ndarray: out
+        """
+        if inputs.ndim != 2 or inputs.shape[1] != self.num_inputs:
+            raise TypeError('inputs: Expected ndarray of shape (num_samples, {}).'
+                            .format(self.num_inputs))
+        num_samples = inputs.shape[0]
+        if out is None:
+            out = np.empty((num_samples, self.num_outputs),
+                           dtype=np.result_type(inputs.dtype, np.complex64))
+        if out.shape != (num_samples, self.num_outputs):
+            raise TypeError('out: Expected ndarray of shape ({}, {}).'
+                            .format(num_samples, self.num_outputs))
+        self.reset()
+        skip, position = self.latency, 0
+        tail = np.zeros((self.latency, self.num_inputs), dtype=np.complex128)
+        for start in range(0, num_samples + self.latency, chunk_size):
+            stop = min(start + chunk_size, num_samples + self.latency)
+            chunk = np.asarray(inputs[start:min(stop, num_samples)])
+            if stop > num_samples:
+                chunk = np.concatenate((chunk, tail[:stop - max(start, num_samples)]))
+            output = self.process(chunk.T)[:, skip:]
+            skip = max(skip - chunk.shape[0], 0)
+            out[position:position + output.shape[1]] = output.T
+            position += output.shape[1]
+        return out
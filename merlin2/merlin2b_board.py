@@ -18,27 +18,111 @@ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVE
 POSSIBILITY OF SUCH DAMAGE.
 """
 
-from .io import Controller
+from .io import Controller, REALTIME, priority
 from .ltc55xx import Ltc5586, Ltc5594
 from .ads7866 import Ads7866
 from .merlin2b import Merlin2b
-from time import sleep
+from .ready import Readiness
+from collections import namedtuple
+from time import perf_counter
+
+
+BoardLayout = namedtuple('BoardLayout', ('device', 'spi', 'gpio'))
+BoardLayout.__doc__ = """Wiring of a board to FTDI MPSSE interfaces.
+
+Args:
+    device (str): FTDI device type, '232h', '2232h' or '4232h'
+    spi (dict): (interface, chip select) by device name
+    gpio (dict): (interface, pin) by signal name
+"""
 
 
 class Merlin2bBoard:
 
+    LAYOUTS = {}
+
+    def _open(self, serial_number, controller, layout, readiness):
+        if readiness is not None and not isinstance(readiness, Readiness):
+            raise TypeError('readiness: Expected Readiness.')
+        self.readiness = Readiness() if readiness is None else readiness
+        # Create one controller per interface of the layout
+        if serial_number is not None and not isinstance(serial_number, str):
+            raise TypeError('serial_number: Expected str.')
+        if isinstance(layout, str):
+            if layout not in self.LAYOUTS:
+                raise ValueError('layout: Expected one of {}.'.format(sorted(self.LAYOUTS)))
+            layout = self.LAYOUTS[layout]
+        if not isinstance(layout, BoardLayout):
+            raise TypeError('layout: Expected str or BoardLayout.')
+        interfaces = sorted({i for i, _ in layout.spi.values()} |
+                            {i for i, _ in layout.gpio.values()})
+        if controller is None:
+            controller = {}
+            for interface in interfaces:
+                # pyftdi needs at least one chip select, also on GPIO-only interfaces
+                cs_count = max((cs for i, cs in layout.spi.values() if i == interface),
+                               default=0) + 1
+                controller[interface] = Controller(cs_count=cs_count,
+                                                   serial_number=serial_number,
+                                                   device=layout.device, interface=interface)
+        elif not isinstance(controller, dict):
+            if len(interfaces) != 1:
+                raise TypeError('controller: Expected dict of controllers by interface.')
+            controller = {interfaces[0]: controller}
+        if sorted(controller) != interfaces:
+            raise ValueError('controller: Expected controllers of interfaces {}.'
+                             .format(interfaces))
+        self._layout = layout
+        self._ios = controller
+        self._io = controller[layout.spi['ic'][0]]
+
+    def _get_spi(self, name, miso_en_gpio=None):
+        interface, cs = self._layout.spi[name]
+        return self._ios[interface].get_spi(cs=cs, freq_hz=1e6, mode=0,
+                                            miso_en_gpio=miso_en_gpio)
+
+    def _get_gpio(self, name, active_low):
+        interface, pin = self._layout.gpio[name]
+        return self._ios[interface].get_gpio(pin, direction='output', active_low=active_low)
+
     def init(self):
         """Initialize board."""
+        self._init_ic()
+        self._init_downmixers()
+
+    def _init_ic(self):
         try:
             self.ic.init()
         except Exception as e:
             raise RuntimeError('Failed to initialize IC.') from e
+
+    def _init_downmixers(self):
         for index, dm in enumerate(self.downmixers):
             try:
                 dm.init()
             except Exception as e:
                 raise RuntimeError('Failed to initialize downmixer {}.'.format(index)) from e
 
+    def attach(self):
+        """Attach to a board that is already set up, e.g. by a previous process, without
+        resetting or reconfiguring it. Driver state is read back from the ICs.
+
+        Returns:
+            dict: IC state, see Merlin2b.attach(), with the downmixer register files
+                  under 'downmixers'
+        """
+        try:
+            state = self.ic.attach()
+        except Exception as e:
+            raise RuntimeError('Failed to attach IC.') from e
+        state['downmixers'] = []
+        for index, dm in enumerate(self.downmixers):
+            try:
+                state['downmixers'].append(dm.attach())
+            except Exception as e:
+                raise RuntimeError('Failed to attach downmixer {}.'.format(index)) from e
+        return state
+
     def reset(self):
         """Reset board."""
         self.ic.reset()
@@ -74,7 +158,31 @@ class Merlin2bBoard:
 
     def apply(self):
         """Apply weights by toggling APLS pin."""
-        self.ic.apply()
+        with priority(REALTIME):
+            self.ic.apply()
+
+    def enable_write_behind(self, enable=True, linger=0.):
+        """Enable or disable write-behind on all controllers of the board, see
+        io.Controller.enable_write_behind(). Register writes then return once queued,
+        reads and apply() flush the queue first.
+
+        Args:
+            enable (bool, optional): enable
+            linger (float, optional): time in seconds the sender waits for more writes
+                                      before sending a batch
+        """
+        for io in self._ios.values():
+            io.enable_write_behind(enable, linger)
+
+    def flush(self):
+        """Send pending write-behind writes and wait until they are sent."""
+        for io in self._ios.values():
+            io.flush()
+
+    def barrier(self):
+        """Keep write-behind from coalescing writes across this point."""
+        for io in self._ios.values():
+            io.barrier()
 
     def set_vga_gain(self, *args, **kwargs):
         """Set VGA gain.
@@ -175,11 +283,17 @@ class Merlin2bBoard:
             weights (ndarray): ndarray of shape (12, 4) if not chained, else
                                of shape (23, 2)
             apply (bool, optional): apply weights to filter
+            quantizer (callable, optional): maps weights to integer codes of shape
+                                            (num_taps, num_filters, 2), e.g. a
+                                            Quantizer, default rounding
+            previous (ndarray, optional): mapped weights currently written, only
+                                          taps that differ are written
 
         Returns:
             ndarray: mapped weights
         """
-        return self.ic.set_weights(*args, **kwargs)
+        with priority(REALTIME):
+            return self.ic.set_weights(*args, **kwargs)
 
     def get_weights(self):
         """Get weights.
@@ -200,7 +314,8 @@ class Merlin2bBoard:
             ndarray: ndarray of shape (12, 4) if not chained, else
                      of shape (23, 2)
         """
-        return self.ic.clear_weights(*args, **kwargs)
+        with priority(REALTIME):
+            return self.ic.clear_weights(*args, **kwargs)
 
     @property
     def serial_number(self):
@@ -361,26 +476,46 @@ class Merlin2bBoard:
 
 class Merlin2bTest(Merlin2bBoard):
 
-    def __init__(self, serial_number=None, chip_revision=2):
-        if serial_number is not None and not isinstance(serial_number, str):
-            raise TypeError('serial_number: Expected str.')
-        self._io = Controller(cs_count=3, serial_number=serial_number)
-        self._en_5v_gpio = self._io.get_gpio(11, direction='output', active_low=False)
-        self._en_3p3v_gpio = self._io.get_gpio(12, direction='output', active_low=False)
-        self._en_2p5v_gpio = self._io.get_gpio(7, direction='output', active_low=False)
-        self._miso_en_gpio = self._io.get_gpio(10, direction='output', active_low=True)
+    LAYOUTS = {
+        'ft232h': BoardLayout(
+            '232h', {'downmixer0': (1, 0), 'downmixer1': (1, 1), 'ic': (1, 2)},
+            {'reset': (1, 8), 'apls': (1, 9), 'miso_en': (1, 10), 'en_5v': (1, 11),
+             'en_3p3v': (1, 12), 'en_2p5v': (1, 7)}),
+        # Merlin2b on interface A, downmixers on interface B
+        'ft2232h': BoardLayout(
+            '2232h', {'ic': (1, 0), 'downmixer0': (2, 0), 'downmixer1': (2, 1)},
+            {'reset': (1, 8), 'apls': (1, 9), 'miso_en': (2, 10), 'en_5v': (1, 11),
+             'en_3p3v': (1, 12), 'en_2p5v': (1, 7)}),
+    }
+
+    def __init__(self, serial_number=None, chip_revision=2, controller=None,
+                 layout='ft232h', readiness=None):
+        """
+        Args:
+            serial_number (str, optional): FTDI serial number, default first device
+            chip_revision (int, optional): Merlin2b revision
+            controller (Controller or dict, optional): controller, or controllers by
+                                                       interface, default opened
+            layout (str or BoardLayout, optional): 'ft232h' or 'ft2232h'
+            readiness (Readiness, optional): readiness polling of init() and setup()
+        """
+        self._open(serial_number, controller, layout, readiness)
+        self._en_5v_gpio = self._get_gpio('en_5v', active_low=False)
+        self._en_3p3v_gpio = self._get_gpio('en_3p3v', active_low=False)
+        self._en_2p5v_gpio = self._get_gpio('en_2p5v', active_low=False)
+        self._miso_en_gpio = self._get_gpio('miso_en', active_low=True)
         # Create downmixers
         self.downmixers = []
         for index in range(2):
-            dm = Ltc5586(self._io.get_spi(cs=index, freq_hz=1e6, mode=0,
-                                          miso_en_gpio=self._miso_en_gpio))
+            dm = Ltc5586(self._get_spi('downmixer{}'.format(index),
+                                       miso_en_gpio=self._miso_en_gpio))
             self.downmixers.append(dm)
         # Create merlin
         self.ic = Merlin2b(
-            self._io.get_spi(cs=2, freq_hz=1e6, mode=0),
-            self._io.get_gpio(8, direction='output', active_low=True),
-            self._io.get_gpio(9, direction='output', active_low=False),
-            use_vga=True, revision=chip_revision,
+            self._get_spi('ic'),
+            self._get_gpio('reset', active_low=True),
+            self._get_gpio('apls', active_low=False),
+            use_vga=True, revision=chip_revision, readiness=self.readiness,
         )
 
     def init(self):
@@ -389,36 +524,79 @@ class Merlin2bTest(Merlin2bBoard):
         self._en_5v_gpio.set(True)
         self._en_3p3v_gpio.set(True)
         self._en_2p5v_gpio.set(True)
-        sleep(10e-3)
+        # The IC answers the probe once its supplies are up, it is reset afterwards
+        try:
+            self.ic.wait_powered()
+        except Exception as e:
+            raise RuntimeError('Failed to power up IC.') from e
         super().init()
 
+    def attach(self):
+        """See Merlin2bBoard.attach(). Supplies are kept enabled."""
+        self._miso_en_gpio.set(False)
+        self._en_5v_gpio.set(True)
+        self._en_3p3v_gpio.set(True)
+        self._en_2p5v_gpio.set(True)
+        return super().attach()
+
 
 class Merlin2bEval(Merlin2bBoard):
 
-    def __init__(self, serial_number=None, chip_revision=2):
-        if serial_number is not None and not isinstance(serial_number, str):
-            raise TypeError('serial_number: Expected str.')
-        self._io = Controller(cs_count=4, serial_number=serial_number)
-        self._miso_en_gpio = self._io.get_gpio(10, direction='output', active_low=True)
+    LAYOUTS = {
+        'ft232h': BoardLayout(
+            '232h', {'downmixer0': (1, 0), 'downmixer1': (1, 1), 'ic': (1, 2), 'adc': (1, 3)},
+            {'reset': (1, 8), 'apls': (1, 9), 'miso_en': (1, 10)}),
+        # Merlin2b on interface A, downmixers and ADC on interface B
+        'ft2232h': BoardLayout(
+            '2232h', {'ic': (1, 0), 'downmixer0': (2, 0), 'downmixer1': (2, 1), 'adc': (2, 2)},
+            {'reset': (1, 8), 'apls': (1, 9), 'miso_en': (2, 10)}),
+        # FT4232H MPSSE interfaces only have the low byte GPIOs
+        'ft4232h': BoardLayout(
+            '4232h', {'ic': (1, 0), 'downmixer0': (2, 0), 'downmixer1': (2, 1), 'adc': (2, 2)},
+            {'reset': (1, 4), 'apls': (1, 5), 'miso_en': (2, 6)}),
+    }
+
+    def __init__(self, serial_number=None, chip_revision=2, controller=None,
+                 layout='ft232h', readiness=None):
+        """
+        Args:
+            serial_number (str, optional): FTDI serial number, default first device
+            chip_revision (int, optional): Merlin2b revision
+            controller (Controller or dict, optional): controller, or controllers by
+                                                       interface, default opened
+            layout (str or BoardLayout, optional): 'ft232h', 'ft2232h' or 'ft4232h'
+            readiness (Readiness, optional): readiness polling of init() and setup()
+        """
+        self._open(serial_number, controller, layout, readiness)
+        self._miso_en_gpio = self._get_gpio('miso_en', active_low=True)
         # Create downmixers
         self.downmixers = []
         for index in range(2):
-            dm = Ltc5594(self._io.get_spi(cs=index, freq_hz=1e6, mode=0,
-                                          miso_en_gpio=self._miso_en_gpio))
+            dm = Ltc5594(self._get_spi('downmixer{}'.format(index),
+                                       miso_en_gpio=self._miso_en_gpio))
             self.downmixers.append(dm)
-        # Create ADC
-        self.adc = Ads7866(self._io.get_spi(cs=3, freq_hz=1e6, mode=0,
-                                            miso_en_gpio=self._miso_en_gpio))
+        # Create ADC, it has its own bus on multi-interface layouts
+        self.adc = Ads7866(self._get_spi('adc', miso_en_gpio=self._miso_en_gpio))
+        self._adc_io = self._ios[self._layout.spi['adc'][0]]
         # Create merlin
         self.ic = Merlin2b(
-            self._io.get_spi(cs=2, freq_hz=1e6, mode=0),
-            self._io.get_gpio(8, direction='output', active_low=True),
-            self._io.get_gpio(9, direction='output', active_low=False),
-            use_vga=False, revision=chip_revision,
+            self._get_spi('ic'),
+            self._get_gpio('reset', active_low=True),
+            self._get_gpio('apls', active_low=False),
+            use_vga=False, revision=chip_revision, readiness=self.readiness,
         )
 
     def init(self):
         """Initialize board."""
         self._miso_en_gpio.set(False)
-        sleep(1e-3)
-        super().init()
+        start = perf_counter()
+        # The MISO buffer settles while the IC is reset and polled, only the
+        # downmixers are read through it
+        self._init_ic()
+        self.readiness.wait('miso_en', minimum=1e-3, start=start)
+        self._init_downmixers()
+
+    def attach(self):
+        """See Merlin2bBoard.attach()."""
+        self._miso_en_gpio.set(False)
+        return super().attach()
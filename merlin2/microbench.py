@@ -0,0 +1,210 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+
+CPU microbenchmarks of the encode / decode paths.
+
+The Merlin2b driver runs on a null transport that discards writes and answers
+reads with a fixed byte pattern, so only the Python work of quantizing, packing
+and unpacking is measured. Each case reports the time per call and its memory use in
+bytes traced with tracemalloc: the peak of memory allocated during one call and the
+memory still allocated per call after many calls. These are byte sizes, not numbers
+of allocations, tracemalloc does not count allocations that are freed again. Results
+use the JSON format of merlin2.bench:
+
+    python -m merlin2.microbench --output new.json --baseline old.json
+"""
+
+from collections import namedtuple
+from timeit import Timer
+import argparse
+import sys
+import tracemalloc
+import numpy as np
+from . import bench
+from .merlin2b import Merlin2b
+
+
+Case = namedtuple('Case', ('name', 'call'))
+
+# Peak bytes are the tracemalloc peak of a call, not an allocation count. Retained
+# bytes are reported only, they are zero unless a path leaks
+METRICS = (('ns_per_op', False), ('peak_bytes', False))
+
+
+class NullSpi:
+    """SPI interface that discards writes and answers reads with a fixed pattern."""
+
+    PATTERN = bytes(range(256)) * 128
+
+    def __init__(self):
+        self.bytes_out = 0
+
+    def write(self, data, address=None):
+        self.bytes_out += len(data)
+
+    def read(self, readlen=0, start=True, stop=True):
+        return self.PATTERN[:readlen]
+
+    def query(self, out, readlen=0, start=True, stop=True, duplex=False):
+        self.bytes_out += len(out)
+        return self.PATTERN[:readlen]
+
+
+class NullGpio:
+    """GPIO that keeps its value."""
+
+    def __init__(self):
+        self.value = False
+
+    def set(self, value):
+        self.value = bool(value)
+
+    def get(self):
+        return self.value
+
+
+def null_ic(revision=2):
+    """Merlin2b on the null transport.
+
+    Args:
+        revision (int, optional): Merlin2b revision
+
+    Returns:
+        Merlin2b: IC
+    """
+    return Merlin2b(NullSpi(), NullGpio(), NullGpio(), revision=revision)
+
+
+def cases(ic=None):
+    """Microbenchmark cases.
+
+    Args:
+        ic (Merlin2b, optional): IC, default null_ic()
+
+    Returns:
+        list: Case(name, call)
+    """
+    ic = null_ic() if ic is None else ic
+    rng = np.random.default_rng(0)
+    weights = 0.5 * np.exp(2j * np.pi * rng.random((12, 4)))
+    codes = np.zeros((12, 3), dtype=np.int16)
+    codes[:, :2] = rng.integers(-255, 256, (12, 2))
+    words = [int(w) for w in rng.integers(0, 2**32, 12)]
+    filt = ic.filters[0][0]
+    # Revision 2 output 0 is the block with bit-reversed DC offset words
+    output = ic.outputs[0]
+    inp = ic.inputs[0]
+    return [
+        Case('merlin2b_set_weights', lambda: ic.set_weights(weights, apply=False)),
+        Case('filter_set_weights', lambda: filt.set_weights(codes)),
+        Case('filter_get_weights', filt.get_weights),
+        Case('merlin2b_write', lambda: ic.write(0x4, words)),
+        Case('merlin2b_write_masked', lambda: ic.write(0x0, 1, 2, 0x1C)),
+        Case('merlin2b_read', lambda: ic.read(0x4)),
+        Case('merlin2b_read_burst', lambda: ic.read(0x4, length=12)),
+        Case('output_set_dc_offset', lambda: setattr(output, 'dc_offset', (0.25, -0.5))),
+        Case('output_get_dc_offset', lambda: output.dc_offset),
+        Case('input_set_vga_gain', lambda: setattr(inp, 'vga_gain', 1.)),
+        Case('input_get_vga_gain', lambda: inp.vga_gain),
+    ]
+
+
+def run(repeat=5, names=None, ic=None):
+    """Run microbenchmarks.
+
+    Args:
+        repeat (int, optional): timing runs per case, the fastest is reported
+        names (sequence, optional): case names, default all
+        ic (Merlin2b, optional): IC, default null_ic()
+
+    Returns:
+        dict: results by case name, each a dict of 'ns_per_op', 'peak_bytes', the
+              tracemalloc peak of traced memory above the baseline during a call,
+              and 'retained_bytes' per call still allocated after many calls
+    """
+    if not isinstance(repeat, int) or repeat < 1:
+        raise ValueError('repeat: Expected integer >= 1.')
+    available = cases(ic)
+    if names is not None:
+        unknown = set(names) - {c.name for c in available}
+        if unknown:
+            raise ValueError('names: Unknown cases {}.'.format(sorted(unknown)))
+        available = [c for c in available if c.name in names]
+    results = {}
+    for case in available:
+        timer = Timer(case.call)
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat, number)) / number
+        peak, retained = _allocations(case.call, number)
+        results[case.name] = {'ns_per_op': best * 1e9, 'peak_bytes': peak,
+                              'retained_bytes': retained}
+    return results
+
+
+def _allocations(call, number):
+    # Warm up caches (e.g. struct formats) before tracing
+    call()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        call()
+        current, peak = tracemalloc.get_traced_memory()
+        for _ in range(number):
+            call()
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return peak - base, max(retained - current, 0) / number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m merlin2.microbench',
+                                     description='Microbenchmark the Merlin2 encode / '
+                                                 'decode paths.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--case', action='append', dest='cases', help='case to run')
+    parser.add_argument('--output', help='save results as JSON')
+    parser.add_argument('--baseline', help='fail on regressions against saved results')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='relative tolerance')
+    args = parser.parse_args(argv)
+
+    results = run(repeat=args.repeat, names=args.cases)
+    print('{:<26} {:>12} {:>12} {:>14}'.format('case', 'ns/op', 'peak bytes',
+                                               'retained bytes'))
+    for name, r in results.items():
+        print('{:<26} {:>12.0f} {:>12d} {:>14.1f}'.format(
+            name, r['ns_per_op'], r['peak_bytes'], r['retained_bytes']))
+    if args.output:
+        bench.save(results, args.output, transport='null')
+    if args.baseline:
+        regressions = bench.compare(bench.load(args.baseline), results, args.tolerance,
+                                    metrics=METRICS)
+        for name, metric, old, new in regressions:
+            print('REGRESSION {} {}: {:g} -> {:g}'.format(name, metric, old, new))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
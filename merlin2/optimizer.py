@@ -0,0 +1,214 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from collections import namedtuple
+from time import perf_counter
+import numpy as np
+
+from .ads7866 import Ads7866
+
+
+OptimizerResult = namedtuple('OptimizerResult',
+                             ('weights', 'cost', 'trace', 'num_probes', 'elapsed'))
+
+
+class WeightOptimizer:
+    """Closed-loop weight optimization using the ADC as residual-power metric.
+
+    Every probe writes the weights, toggles APLS and reads a block of ADC
+    measurements in a single bus transaction, or one per interface if the ADC has
+    its own interface. The cost of a weight set is the mean
+    of the ADC block. Weights are optimized as real / imaginary parts in [-1, +1] of
+    the (12, 4) or, if chained, (23, 2) weight matrix.
+    """
+
+    METHODS = ('spsa', 'gradient', 'coordinate')
+
+    def __init__(self, board, num_samples=64, discard=4, mask=None, maximize=False,
+                 seed=None):
+        """
+        Args:
+            board (Merlin2bEval): board with ADC monitoring the residual power
+            num_samples (int, optional): ADC measurements averaged per probe
+            discard (int, optional): ADC measurements discarded after apply
+            mask (ndarray, optional): boolean ndarray of weight matrix shape
+                                      selecting the taps to optimize, default all
+            maximize (bool, optional): maximize instead of minimize the ADC reading
+            seed (int, optional): random seed for perturbations
+        """
+        if not isinstance(num_samples, int) or num_samples < 1:
+            raise ValueError('num_samples: Expected integer > 0.')
+        if not isinstance(discard, int) or discard < 0:
+            raise ValueError('discard: Expected integer >= 0.')
+        self._io = board._io
+        self._adc_io = board._adc_io
+        self._ic = board.ic
+        self._adc = board.adc
+        self._num_samples = num_samples
+        self._discard = discard
+        self._sign = -1. if maximize else 1.
+        self._mask = mask
+        self._rng = np.random.RandomState(seed)
+        self._num_probes = 0
+
+    @property
+    def shape(self):
+        """Weight matrix shape of current filter configuration.
+
+        Returns:
+            tuple: (12, 4) if not chained, else (23, 2)
+        """
+        return (23, 2) if self._ic._chained else (12, 4)
+
+    def measure(self, weights):
+        """Apply weights and measure residual power.
+
+        Args:
+            weights (ndarray): weight matrix
+
+        Returns:
+            float: mean ADC measurement normalized to [0, 1)
+        """
+        count = self._discard + self._num_samples
+        if self._adc_io is self._io:
+            with self._io.transaction() as txn:
+                self._ic.set_weights(weights, apply=True)
+                pending = self._adc.queue_block(txn, count)
+        else:
+            # ADC on another interface, read once the weights are applied
+            with self._io.transaction():
+                self._ic.set_weights(weights, apply=True)
+            with self._adc_io.transaction() as txn:
+                pending = self._adc.queue_block(txn, count)
+        self._num_probes += 1
+        return float(Ads7866.decode(pending.data)[self._discard:].mean())
+
+    def run(self, weights=None, method='spsa', iterations=100, step=0.1,
+            perturbation=8 / 255, tol=None, callback=None):
+        """Run optimization. The best weights found are applied on return.
+
+        Args:
+            weights (ndarray, optional): initial weights, default current weights
+            method (str, optional): 'spsa', 'gradient' or 'coordinate'
+            iterations (int, optional): maximum number of iterations
+            step (float, optional): initial step size
+            perturbation (float, optional): perturbation size, should be at least
+                                            a few LSBs (1 / 255)
+            tol (float, optional): stop once the cost is below tol
+            callback (callable, optional): called as callback(iteration, weights,
+                                           cost) after every iteration, stops the
+                                           optimization if it returns True
+
+        Returns:
+            OptimizerResult: best weights, best cost, cost trace of shape
+                             (iterations + 1,), number of probes, elapsed time
+        """
+        if method not in WeightOptimizer.METHODS:
+            raise ValueError('method: Expected one of {}.'.format(WeightOptimizer.METHODS))
+        if not isinstance(iterations, int) or iterations < 1:
+            raise ValueError('iterations: Expected integer > 0.')
+        shape = self.shape
+        if weights is None:
+            weights = self._ic.get_weights()
+        if not isinstance(weights, np.ndarray) or weights.shape != shape:
+            raise TypeError('weights: Expected ndarray of shape {}.'.format(shape))
+        mask = np.ones(shape, dtype=bool) if self._mask is None else self._mask
+        if not isinstance(mask, np.ndarray) or mask.shape != shape:
+            raise TypeError('mask: Expected ndarray of shape {}.'.format(shape))
+        # Optimize real-valued (re, im) pairs of the selected taps
+        mask = np.stack((mask, mask), axis=-1)
+        x = np.stack((np.real(weights), np.imag(weights)), axis=-1).astype(np.float64)
+        start = perf_counter()
+        self._num_probes = 0
+        step_fn = getattr(self, '_{}_step'.format(method))
+        state = {'step': step, 'perturbation': perturbation, 'iteration': 0}
+        cost = self._cost(x)
+        best_x, best_cost = x.copy(), cost
+        trace = [cost]
+        for it in range(iterations):
+            state['iteration'] = it
+            x, cost = step_fn(x, cost, mask, state)
+            if cost < best_cost:
+                best_x, best_cost = x.copy(), cost
+            trace.append(cost)
+            if callback is not None and callback(it, self._to_complex(x), self._sign * cost):
+                break
+            if tol is not None and self._sign * cost <= tol:
+                break
+            if state['step'] < 0.5 / 255:
+                break
+        best = self._ic.set_weights(self._to_complex(best_x), apply=True)
+        return OptimizerResult(best, self._sign * best_cost, self._sign * np.array(trace),
+                               self._num_probes, perf_counter() - start)
+
+    def _spsa_step(self, x, cost, mask, state):
+        k = state['iteration'] + 1
+        a = state['step'] / k ** 0.602
+        c = max(state['perturbation'] / k ** 0.101, 1 / 255)
+        delta = np.where(mask, self._rng.choice((-1., 1.), size=x.shape), 0.)
+        cost_pos = self._cost(self._clip(x + c * delta))
+        cost_neg = self._cost(self._clip(x - c * delta))
+        x = self._clip(x - a * (cost_pos - cost_neg) / (2 * c) * delta)
+        return x, self._cost(x)
+
+    def _gradient_step(self, x, cost, mask, state):
+        c = state['perturbation']
+        grad = np.zeros_like(x)
+        for index in zip(*np.nonzero(mask)):
+            delta = np.zeros_like(x)
+            delta[index] = c
+            grad[index] = (self._cost(self._clip(x + delta)) -
+                           self._cost(self._clip(x - delta))) / (2 * c)
+        scale = np.abs(grad).max()
+        if not scale:
+            state['step'] /= 2
+            return x, cost
+        candidate = self._clip(x - state['step'] * grad / scale)
+        candidate_cost = self._cost(candidate)
+        if candidate_cost < cost:
+            return candidate, candidate_cost
+        state['step'] /= 2
+        return x, cost
+
+    def _coordinate_step(self, x, cost, mask, state):
+        improved = False
+        for index in zip(*np.nonzero(mask)):
+            for sign in (1., -1.):
+                candidate = x.copy()
+                candidate[index] += sign * state['step']
+                candidate = self._clip(candidate)
+                candidate_cost = self._cost(candidate)
+                if candidate_cost < cost:
+                    x, cost, improved = candidate, candidate_cost, True
+                    break
+        if not improved:
+            state['step'] /= 2
+        return x, cost
+
+    def _cost(self, x):
+        return self._sign * self.measure(self._to_complex(x))
+
+    @staticmethod
+    def _clip(x):
+        return np.clip(x, -1., 1.)
+
+    @staticmethod
+    def _to_complex(x):
+        return x[..., 0] + 1j * x[..., 1]
@@ -0,0 +1,650 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from collections import namedtuple
+from contextlib import contextmanager
+
+from .io import BusController, PendingRead
+
+
+Operation = namedtuple('Operation', ('kind', 'target', 'bytes_out', 'bytes_in', 'transaction'))
+
+CostReport = namedtuple('CostReport', (
+    'transactions', 'usb_writes', 'usb_reads', 'bytes_out', 'bytes_in', 'spi_writes',
+    'spi_reads', 'gpio_updates', 'rmw_reads', 'time', 'devices'))
+
+# MPSSE command bytes around a SPI transfer (opcode + length, chip select and idle)
+CMD_BYTES = 3
+CS_BYTES = 9
+SEGMENT_SIZE = 512
+
+
+class LatencyModel:
+    """USB / SPI timing used to estimate the duration of planned operations."""
+
+    def __init__(self, usb_write=125e-6, usb_read=500e-6, usb_byte_rate=30e6, fail=False):
+        """
+        Args:
+            usb_write (float, optional): latency of a USB write in seconds
+            usb_read (float, optional): additional latency of reading back data in
+                                        seconds, i.e. round trip minus write
+            usb_byte_rate (float, optional): USB throughput in bytes per second
+            fail (bool, optional): fail USB transfers with OSError, can be changed
+                                   at any time to inject transport errors
+        """
+        self.usb_write = usb_write
+        self.usb_read = usb_read
+        self.usb_byte_rate = usb_byte_rate
+        self.fail = fail
+
+    def transfer(self, bytes_out, bytes_in, read):
+        """Duration of a USB transfer.
+
+        Args:
+            bytes_out (int): bytes written
+            bytes_in (int): bytes read back
+            read (bool): transfer reads data back
+
+        Returns:
+            float: duration in seconds
+
+        Raises:
+            OSError: if fail is set
+        """
+        if self.fail:
+            raise OSError('USB transfer failed.')
+        return self.usb_write + (self.usb_read if read else 0.) + \
+            (bytes_out + bytes_in) / self.usb_byte_rate
+
+
+class PlanController(BusController):
+    """Drop-in replacement of io.Controller that runs without hardware.
+
+    Every SPI and GPIO operation is recorded and answered by register models of the
+    devices on the bus, and its cost is accumulated: USB transfers, bytes, SPI
+    transfers, read-modify-write reads and an estimate of the time from a latency
+    model and the SPI clock. Transfers are counted the way io.Controller issues
+    them, including batching into transactions. Host sleeps are not included.
+    Transport statistics, see io.BusController.stats(), time the host calls.
+    """
+
+    def __init__(self, devices, latency=None, serial_number='PLAN', stats=False):
+        """
+        Args:
+            devices (dict): device register models by chip select
+            latency (LatencyModel, optional): latency model
+            serial_number (str, optional): reported serial number
+            stats (bool, optional): collect transport statistics
+        """
+        super().__init__(stats)
+        self.devices = devices
+        self.latency = LatencyModel() if latency is None else latency
+        self._serial_number = serial_number
+        # Output latch levels by pin, the MPSSE latch is 0 after open
+        self._levels = {}
+        self._watchers = {}
+        self.reset_report()
+
+    def get_gpio(self, pin, direction='input', active_low=False):
+        return PlanGpio(self, pin, direction, active_low)
+
+    def watch(self, pin, callback):
+        """Call callback(level) with the current level of pin and whenever it changes,
+        e.g. to connect a reset pin to a device model.
+
+        Args:
+            pin (int): GPIO pin
+            callback (callable): called with the bool electrical level
+        """
+        self._watchers.setdefault(pin, []).append(callback)
+        callback(self._levels.get(pin, False))
+
+    def _set_level(self, pin, level):
+        if self._levels.get(pin, False) == level:
+            return
+        self._levels[pin] = level
+        for callback in self._watchers.get(pin, ()):
+            callback(level)
+
+    def get_spi(self, cs, freq_hz, mode, miso_en_gpio=None):
+        if cs not in self.devices:
+            raise ValueError('cs: No device model for chip select {}.'.format(cs))
+        return PlanSpi(self, cs, self.devices[cs], freq_hz, mode, miso_en_gpio)
+
+    def _new_transaction(self):
+        return PlanTransaction(self)
+
+    @property
+    def serial_number(self):
+        return self._serial_number
+
+    def reset_report(self):
+        """Clear recorded operations and costs."""
+        self.operations = []
+        self._transactions = 0
+        self._usb_writes = 0
+        self._usb_reads = 0
+        self._bytes_out = 0
+        self._bytes_in = 0
+        self._gpio_updates = 0
+        self._time = 0.
+        for device in self.devices.values():
+            device.reset_counters()
+
+    def report(self):
+        """Cost of the operations since creation or reset_report().
+
+        Returns:
+            CostReport: totals, with per-device dicts of 'writes', 'reads',
+                        'bytes_out', 'bytes_in' and 'rmw_reads' by device name
+        """
+        devices = {d.name: d.counters() for d in self.devices.values()}
+        return CostReport(
+            transactions=self._transactions, usb_writes=self._usb_writes,
+            usb_reads=self._usb_reads, bytes_out=self._bytes_out, bytes_in=self._bytes_in,
+            spi_writes=sum(d['writes'] for d in devices.values()),
+            spi_reads=sum(d['reads'] for d in devices.values()),
+            gpio_updates=self._gpio_updates,
+            rmw_reads=sum(d['rmw_reads'] for d in devices.values()),
+            time=self._time, devices=devices)
+
+    @contextmanager
+    def measure(self):
+        """Report the cost of the operations issued inside the context.
+
+        Returns:
+            list: filled with the CostReport on exit
+        """
+        self.reset_report()
+        result = []
+        yield result
+        result.append(self.report())
+
+    def _usb(self, bytes_out, bytes_in=0, read=False, spi_bytes=0, freq_hz=None):
+        self._count_usb()
+        self._usb_writes += 1
+        self._usb_reads += int(read)
+        self._bytes_out += bytes_out
+        self._bytes_in += bytes_in
+        self._time += self.latency.transfer(bytes_out, bytes_in, read)
+        if spi_bytes:
+            self._time += 8 * spi_bytes / freq_hz
+
+    def _record(self, kind, target, bytes_out=0, bytes_in=0):
+        self.operations.append(Operation(kind, target, bytes_out, bytes_in,
+                                         self._transaction is not None))
+
+
+class PlanTransaction:
+    """Counterpart of io.Transaction. Operations are applied to the device models
+    immediately, reads complete on flush, and USB transfers are counted per segment."""
+
+    def __init__(self, controller):
+        self._ctrl = controller
+        self._cmd = 0
+        self._spi = 0
+        self._readlen = 0
+        self._reads = []
+        self._segments = []
+        self._gpio = False
+        self._freq_hz = None
+
+    def write(self, spi, data):
+        self._freq_hz = spi._freq_hz
+        spi._device.write(bytes(data))
+        self._ctrl._record('write', spi._device.name, len(data))
+        self._cmd += CMD_BYTES + CS_BYTES + len(data)
+        self._spi += len(data)
+
+    def read(self, spi, readlen, count=1):
+        if not isinstance(readlen, int) or not 0 < readlen <= SEGMENT_SIZE:
+            raise ValueError('readlen: Expected integer in range [1, {}].'.format(SEGMENT_SIZE))
+        if not isinstance(count, int) or count < 1:
+            raise ValueError('count: Expected integer > 0.')
+        pending = PendingRead()
+        if spi._miso_en_gpio is not None:
+            self.gpio(spi._miso_en_gpio, True)
+        self._freq_hz = spi._freq_hz
+        for _ in range(count):
+            if self._readlen + readlen > SEGMENT_SIZE:
+                self._end_segment()
+            pending._chunks.append(spi._device.read(readlen))
+            self._ctrl._record('read', spi._device.name, 0, readlen)
+            self._cmd += CMD_BYTES + CS_BYTES
+            self._spi += readlen
+            self._readlen += readlen
+        self._reads.append(pending)
+        if spi._miso_en_gpio is not None:
+            self.gpio(spi._miso_en_gpio, False)
+        if self._ctrl._recorder is not None:
+            self._ctrl._recorder.txn_read(spi, readlen, count)
+        return pending
+
+    def gpio(self, gpio, value):
+        if not self._gpio:
+            # The port state is read once per transaction
+            self._ctrl._usb(1, 1, read=True)
+            self._gpio = True
+        gpio._value = value
+        self._ctrl._gpio_updates += 1
+        self._ctrl._record('gpio', gpio._pin, 3)
+        self._cmd += 3
+
+    def flush(self):
+        if self._ctrl._recorder is not None:
+            self._ctrl._recorder.flush()
+        self._flush()
+
+    def _flush(self):
+        self._end_segment()
+        stats = self._ctrl._stats
+        if stats is not None and self._segments:
+            start = stats.start()
+        try:
+            for cmd, spi, readlen, freq_hz in self._segments:
+                self._ctrl._usb(cmd, readlen, read=readlen > 0, spi_bytes=spi,
+                                freq_hz=freq_hz)
+        except BaseException:
+            if stats is not None and self._segments:
+                stats.cancel()
+            raise
+        if stats is not None and self._segments:
+            stats.record('bus', 'flush', start, sum(cmd for cmd, _, _, _ in self._segments),
+                         sum(readlen for _, _, readlen, _ in self._segments))
+        self._segments = []
+        for pending in self._reads:
+            pending._complete()
+        if self._ctrl._recorder is not None:
+            for pending in self._reads:
+                self._ctrl._recorder.read_data(pending.data)
+        self._reads = []
+
+    def commit(self):
+        self._flush()
+        self._ctrl._transactions += 1
+
+    def _end_segment(self):
+        if not self._cmd:
+            return
+        self._segments.append((self._cmd + int(self._readlen > 0), self._spi, self._readlen,
+                               self._freq_hz))
+        self._cmd = 0
+        self._spi = 0
+        self._readlen = 0
+
+
+class PlanGpio:
+
+    def __init__(self, controller, pin, direction, active_low):
+        if direction not in ('input', 'output'):
+            raise ValueError('direction: Expected \'input\' or \'output\'.')
+        if not isinstance(active_low, bool):
+            raise TypeError('active_low: Expected bool.')
+        self._ctrl = controller
+        self._pin = pin
+        self._target = 'gpio{}'.format(pin)
+        self._output = direction == 'output'
+        self._active_low = active_low
+
+    @property
+    def _value(self):
+        return self._ctrl._levels.get(self._pin, False) ^ self._active_low
+
+    @_value.setter
+    def _value(self, value):
+        self._ctrl._set_level(self._pin, value ^ self._active_low)
+
+    def set(self, value):
+        if not self._output:
+            raise RuntimeError('Gpio is not an output, cannot set value' \
+                               ' of an input.')
+        if not isinstance(value, bool):
+            raise TypeError('value: Expected bool.')
+        with self._ctrl.lock:
+            self._ctrl._drain()
+            stats = self._ctrl._stats
+            if stats is not None:
+                start = stats.start()
+            try:
+                self._set(value)
+            except BaseException:
+                if stats is not None:
+                    stats.cancel()
+                raise
+            if self._ctrl._recorder is not None:
+                self._ctrl._recorder.gpio_set(self, value)
+            if stats is not None:
+                stats.record(self._target, 'gpio_write', start)
+
+    def _set(self, value):
+        txn = self._ctrl._transaction
+        if txn is not None:
+            txn.gpio(self, value)
+            return
+        # io.Gpio reads the port before writing it
+        self._ctrl._usb(1, 1, read=True)
+        self._ctrl._usb(3)
+        self._ctrl._gpio_updates += 1
+        self._ctrl._record('gpio', self._pin, 3)
+        self._value = value
+
+    def get(self):
+        with self._ctrl.lock:
+            self._ctrl._drain()
+            stats = self._ctrl._stats
+            if stats is not None:
+                start = stats.start()
+            try:
+                txn = self._ctrl._transaction
+                if txn is not None:
+                    txn._flush()
+                self._ctrl._usb(1, 1, read=True)
+            except BaseException:
+                if stats is not None:
+                    stats.cancel()
+                raise
+            self._ctrl._record('gpio_get', self._pin, 1, 1)
+            if self._ctrl._recorder is not None:
+                self._ctrl._recorder.gpio_get(self, self._value)
+            if stats is not None:
+                stats.record(self._target, 'gpio_read', start)
+            return self._value
+
+    def _config(self):
+        return {'type': 'gpio', 'pin': self._pin,
+                'direction': 'output' if self._output else 'input',
+                'active_low': self._active_low}
+
+
+class PlanSpi:
+
+    def __init__(self, controller, cs, device, freq_hz, mode, miso_en_gpio=None):
+        self._ctrl = controller
+        self._cs = cs
+        self._target = 'cs{}'.format(cs)
+        self._device = device
+        self._freq_hz = freq_hz
+        self._mode = mode
+        self._miso_en_gpio = miso_en_gpio
+
+    def _config(self):
+        return {'type': 'spi', 'cs': self._cs, 'freq_hz': self._freq_hz, 'mode': self._mode,
+                'miso_en_gpio': self._miso_en_gpio}
+
+    def on_discard(self, callback):
+        """See io.Spi.on_discard()."""
+        self._ctrl._discard_callbacks.append(callback)
+
+    def write(self, data, address=None):
+        """See io.Spi.write()."""
+        write_behind = self._ctrl._write_behind
+        if write_behind is not None and not self._ctrl.lock.owned() and \
+          write_behind.put(self, data, address):
+            return
+        with self._ctrl.lock:
+            stats = self._ctrl._stats
+            if stats is not None:
+                start = stats.start()
+            try:
+                txn = self._ctrl._transaction
+                if txn is not None:
+                    txn.write(self, data)
+                else:
+                    self._device.write(bytes(data))
+                    self._ctrl._record('write', self._device.name, len(data))
+                    self._ctrl._usb(CMD_BYTES + CS_BYTES + len(data), spi_bytes=len(data),
+                                    freq_hz=self._freq_hz)
+            except BaseException:
+                if stats is not None:
+                    stats.cancel()
+                raise
+            if self._ctrl._recorder is not None:
+                self._ctrl._recorder.write(self, data)
+            if stats is not None:
+                stats.record(self._target, 'write', start, len(data))
+
+    def read(self, readlen=0, start=True, stop=True):
+        return self._transfer('read', b'', readlen)
+
+    def query(self, out, readlen=0, start=True, stop=True, duplex=False):
+        return self._transfer('query', out, readlen)
+
+    def read_repeated(self, readlen, count):
+        with self._ctrl.lock:
+            stats = self._ctrl._stats
+            if stats is not None:
+                start = stats.start()
+            try:
+                with self._ctrl.transaction() as txn:
+                    pending = txn.read(self, readlen, count)
+                    txn.flush()
+            except BaseException:
+                if stats is not None:
+                    stats.cancel()
+                raise
+            if stats is not None:
+                stats.record(self._target, 'read', start, 0, len(pending.data))
+            return pending.data
+
+    def _transfer(self, kind, out, readlen):
+        with self._ctrl.lock:
+            self._ctrl._drain()
+            stats = self._ctrl._stats
+            if stats is not None:
+                start = stats.start()
+            try:
+                if self._miso_en_gpio is not None:
+                    self._miso_en_gpio._set(True)
+                txn = self._ctrl._transaction
+                if txn is not None:
+                    txn._flush()
+                out = bytes(out)
+                rdata = self._device.exchange(out, readlen) if out else \
+                    self._device.read(readlen)
+                self._ctrl._record(kind, self._device.name, len(out), readlen)
+                self._ctrl._usb(2 * CMD_BYTES + CS_BYTES + len(out) + 1, readlen, read=True,
+                                spi_bytes=len(out) + readlen, freq_hz=self._freq_hz)
+                if self._miso_en_gpio is not None:
+                    self._miso_en_gpio._set(False)
+            except BaseException:
+                if stats is not None:
+                    stats.cancel()
+                raise
+            if self._ctrl._recorder is not None:
+                if kind == 'read':
+                    self._ctrl._recorder.read(self, rdata)
+                else:
+                    self._ctrl._recorder.exchange(self, out, rdata)
+            if stats is not None:
+                stats.record(self._target, 'read' if kind == 'read' else 'exchange', start,
+                             len(out), len(rdata))
+            return rdata
+
+
+class DeviceModel:
+    """Register model of a SPI device. Counts transfers and detects read-modify-write
+    cycles, i.e. a write to a register that was read by the previous transfer."""
+
+    def __init__(self, name):
+        self.name = name
+        self._last_read = ()
+        self.reset_counters()
+
+    def reset_counters(self):
+        self._counters = dict(writes=0, reads=0, bytes_out=0, bytes_in=0, rmw_reads=0)
+
+    def counters(self):
+        return dict(self._counters)
+
+    def write(self, data):
+        self._counters['writes'] += 1
+        self._counters['bytes_out'] += len(data)
+        addresses = self._write(data)
+        if set(addresses) & set(self._last_read):
+            self._counters['rmw_reads'] += 1
+        self._last_read = ()
+
+    def exchange(self, data, readlen):
+        self._counters['reads'] += 1
+        self._counters['bytes_out'] += len(data)
+        self._counters['bytes_in'] += readlen
+        rdata, self._last_read = self._exchange(data, readlen)
+        return rdata
+
+    def read(self, readlen):
+        self._counters['reads'] += 1
+        self._counters['bytes_in'] += readlen
+        self._last_read = ()
+        return self._read(readlen)
+
+    def _write(self, data):
+        return ()
+
+    def _exchange(self, data, readlen):
+        return bytes(readlen), ()
+
+    def _read(self, readlen):
+        return bytes(readlen)
+
+
+class Merlin2bModel(DeviceModel):
+    """Merlin2b register file with the probe magic words. While RESETN is held low, see
+    set_resetn(), the registers are reset, writes are ignored and reads return zeros."""
+
+    MAGIC = {0x0: 0xABCD0100, 0x1000: 0x12340101, 0x3000: 0x9ABC0103}
+
+    def __init__(self, name='merlin2b'):
+        super().__init__(name)
+        self.registers = dict(self.MAGIC)
+        self.in_reset = False
+
+    def set_resetn(self, level):
+        """
+        Args:
+            level (bool): electrical level of the RESETN pin
+        """
+        self.in_reset = not level
+        if self.in_reset:
+            self.registers = dict(self.MAGIC)
+
+    def _write(self, data):
+        address = int.from_bytes(data[:2], byteorder='big') * 4
+        if self.in_reset:
+            return ()
+        addresses = []
+        for offset in range(0, len(data) - 2, 4):
+            self.registers[address + offset] = int.from_bytes(data[2 + offset:6 + offset],
+                                                              byteorder='big')
+            addresses.append(address + offset)
+        return addresses
+
+    def _exchange(self, data, readlen):
+        address = (int.from_bytes(data[:2], byteorder='big') & 0x1FFF) * 4
+        addresses = [address + 4 * index for index in range(readlen // 4)]
+        if self.in_reset:
+            return bytes(readlen), addresses
+        rdata = b''.join(self.registers.get(a, 0).to_bytes(4, byteorder='big')
+                         for a in addresses)
+        return rdata, addresses
+
+
+class Ltc55xxModel(DeviceModel):
+    """LTC5586 / LTC5594 register file. Setting the reset bit restores the defaults."""
+
+    DEFAULTS = {0x16: 0xF0}
+
+    def __init__(self, name='ltc55xx'):
+        super().__init__(name)
+        self.registers = dict(self.DEFAULTS)
+
+    def _write(self, data):
+        address, value = data[0] & 0x7F, data[1]
+        if address == 0x16 and value & 0x08:
+            self.registers = dict(self.DEFAULTS)
+        else:
+            self.registers[address] = value
+        return (address,)
+
+    def _exchange(self, data, readlen):
+        address = data[0] & 0x7F
+        return bytes((self.registers.get(address, 0),)) * readlen, (address,)
+
+
+class Ads7866Model(DeviceModel):
+    """ADS7866 returning a constant 12-bit code."""
+
+    def __init__(self, name='ads7866', code=0x800):
+        super().__init__(name)
+        self.code = code
+
+    def _read(self, readlen):
+        return (self.code & 0xFFF).to_bytes(2, byteorder='big') * (readlen // 2)
+
+
+def plan_eval(chip_revision=2, latency=None, layout='ft232h'):
+    """Merlin2bEval on a planning controller.
+
+    Args:
+        chip_revision (int, optional): Merlin2b revision
+        latency (LatencyModel, optional): latency model
+        layout (str or BoardLayout, optional): board layout
+
+    Returns:
+        Merlin2bEval: board, the controller of the Merlin2b is board._io and the
+                      controllers by interface are board._ios
+    """
+    from .merlin2b_board import Merlin2bEval
+    models = {'downmixer0': Ltc55xxModel('ltc5594[0]'), 'downmixer1': Ltc55xxModel('ltc5594[1]'),
+              'ic': Merlin2bModel(), 'adc': Ads7866Model()}
+    return Merlin2bEval(chip_revision=chip_revision, layout=layout,
+                        controller=_plan_controllers(Merlin2bEval, layout, models, latency))
+
+
+def plan_test(chip_revision=2, latency=None, layout='ft232h'):
+    """Merlin2bTest on a planning controller.
+
+    Args:
+        chip_revision (int, optional): Merlin2b revision
+        latency (LatencyModel, optional): latency model
+        layout (str or BoardLayout, optional): board layout
+
+    Returns:
+        Merlin2bTest: board, the controller of the Merlin2b is board._io and the
+                      controllers by interface are board._ios
+    """
+    from .merlin2b_board import Merlin2bTest
+    models = {'downmixer0': Ltc55xxModel('ltc5586[0]'), 'downmixer1': Ltc55xxModel('ltc5586[1]'),
+              'ic': Merlin2bModel()}
+    return Merlin2bTest(chip_revision=chip_revision, layout=layout,
+                        controller=_plan_controllers(Merlin2bTest, layout, models, latency))
+
+
+def _plan_controllers(board_class, layout, models, latency):
+    # One planning controller per interface of the layout
+    layout = board_class.LAYOUTS.get(layout) if isinstance(layout, str) else layout
+    if layout is None:
+        raise ValueError('layout: Expected one of {}.'.format(sorted(board_class.LAYOUTS)))
+    devices = {interface: {} for interface, _ in layout.gpio.values()}
+    for name, (interface, cs) in layout.spi.items():
+        devices.setdefault(interface, {})[cs] = models[name]
+    controllers = {interface: PlanController(d, latency) for interface, d in devices.items()}
+    interface, pin = layout.gpio['reset']
+    controllers[interface].watch(pin, models['ic'].set_resetn)
+    return controllers
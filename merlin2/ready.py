@@ -0,0 +1,112 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from collections import namedtuple
+from threading import Lock
+from time import perf_counter, sleep
+
+
+SettleStats = namedtuple('SettleStats', ('count', 'min', 'mean', 'max', 'last'))
+
+
+class Readiness:
+    """Wait for devices to become ready by polling instead of sleeping for a fixed time.
+
+    Each wait is named, e.g. 'reset' or 'power', and the observed settle times are
+    recorded per name so bring-up can be tuned to what the hardware actually needs.
+    """
+
+    def __init__(self, timeout=0.5, interval=100e-6, backoff=2., max_interval=5e-3):
+        """
+        Args:
+            timeout (float, optional): default timeout in seconds
+            interval (float, optional): first poll interval in seconds
+            backoff (float, optional): poll interval growth factor, >= 1
+            max_interval (float, optional): maximum poll interval in seconds
+        """
+        if not isinstance(timeout, (float, int)) or timeout <= 0:
+            raise ValueError('timeout: Expected positive float.')
+        if not isinstance(interval, (float, int)) or interval <= 0:
+            raise ValueError('interval: Expected positive float.')
+        if not isinstance(backoff, (float, int)) or backoff < 1:
+            raise ValueError('backoff: Expected float >= 1.')
+        if not isinstance(max_interval, (float, int)) or max_interval < interval:
+            raise ValueError('max_interval: Expected float >= interval.')
+        self.timeout = timeout
+        self.interval = interval
+        self.backoff = backoff
+        self.max_interval = max_interval
+        self._lock = Lock()
+        self._times = {}
+
+    def wait(self, name, predicate=None, minimum=0., start=None, timeout=None):
+        """Wait until a minimum time has passed and predicate() is true.
+
+        Args:
+            name (str): name the settle time is recorded under
+            predicate (callable, optional): readiness test, polled with backoff
+            minimum (float, optional): minimum settle time in seconds
+            start (float, optional): perf_counter() time the settle time is measured
+                                     from, default now. Lets a minimum overlap other work.
+            timeout (float, optional): timeout in seconds, default self.timeout
+
+        Returns:
+            float: settle time in seconds
+        """
+        start = perf_counter() if start is None else start
+        timeout = self.timeout if timeout is None else timeout
+        remaining = start + minimum - perf_counter()
+        if remaining > 0:
+            sleep(remaining)
+        interval = self.interval
+        while predicate is not None and not predicate():
+            elapsed = perf_counter() - start
+            if elapsed > timeout:
+                raise RuntimeError('{}: Not ready after {:g} s.'.format(name, elapsed))
+            sleep(min(interval, max(timeout - elapsed, 0.)))
+            interval = min(interval * self.backoff, self.max_interval)
+        elapsed = perf_counter() - start
+        with self._lock:
+            stats = self._times.get(name)
+            if stats is None:
+                self._times[name] = [1, elapsed, elapsed, elapsed, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] = min(stats[1], elapsed)
+                stats[2] += elapsed
+                stats[3] = max(stats[3], elapsed)
+                stats[4] = elapsed
+        return elapsed
+
+    def settle_times(self, reset=False):
+        """Observed settle times.
+
+        Args:
+            reset (bool, optional): discard the recorded times
+
+        Returns:
+            dict: SettleStats in seconds by name
+        """
+        with self._lock:
+            times = self._times
+            if reset:
+                self._times = {}
+            return {name: SettleStats(count, low, total / count, high, last)
+                    for name, (count, low, total, high, last) in times.items()}
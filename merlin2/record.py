@@ -0,0 +1,341 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from collections import deque, namedtuple
+from time import perf_counter_ns, sleep
+import json
+import mmap
+import struct
+
+
+MAGIC = b'M2REC\x00\x01\x00'
+
+# Entry header: time in ns, kind, target, length of written data, length of read data
+ENTRY = struct.Struct('<qBBII')
+
+# Entry kinds, 0 marks the end of the log
+(CONFIG, WRITE, READ, EXCHANGE, GPIO_SET, GPIO_GET, BEGIN, END, ABORT, TXN_READ,
+ READ_DATA, FLUSH) = range(1, 13)
+
+KIND_NAMES = {CONFIG: 'config', WRITE: 'write', READ: 'read', EXCHANGE: 'exchange',
+              GPIO_SET: 'gpio_set', GPIO_GET: 'gpio_get', BEGIN: 'begin', END: 'end',
+              ABORT: 'abort', TXN_READ: 'txn_read', READ_DATA: 'read_data', FLUSH: 'flush'}
+
+Entry = namedtuple('Entry', ('time', 'kind', 'target', 'out', 'data'))
+
+Divergence = namedtuple('Divergence', ('index', 'kind', 'target', 'expected', 'actual'))
+
+ReplayResult = namedtuple('ReplayResult', ('num_entries', 'divergences', 'elapsed'))
+
+
+class Recorder:
+    """Binary log of the SPI and GPIO traffic of a controller.
+
+    Every SPI write, read and exchange, GPIO update and read, and transaction
+    boundary issued through the controller is appended to a memory-mapped file as an
+    entry with a nanosecond timestamp, the target chip select or GPIO, and the bytes
+    written and read. The configuration of each target is logged on first use, so
+    logs are self-contained. The file grows as needed and is truncated to its
+    contents on close. Works with io.Controller and plan.PlanController.
+    """
+
+    def __init__(self, controller, path, size=2**24):
+        """
+        Args:
+            controller (Controller): controller to record
+            path (str): log file name
+            size (int, optional): initial file size in bytes
+        """
+        if not isinstance(size, int) or size < len(MAGIC) + ENTRY.size:
+            raise ValueError('size: Expected integer >= {}.'.format(len(MAGIC) + ENTRY.size))
+        self._ctrl = controller
+        self._file = open(path, 'w+b')
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._map[:len(MAGIC)] = MAGIC
+        self._pos = len(MAGIC)
+        self._targets = {}
+        self._origin = None
+
+    @property
+    def size(self):
+        """Bytes used by the log.
+
+        Returns:
+            int: size
+        """
+        return self._pos
+
+    def start(self):
+        """Start recording."""
+        with self._ctrl.lock:
+            if self._map is None:
+                raise RuntimeError('Recorder is closed.')
+            if self._ctrl._recorder is not None and self._ctrl._recorder is not self:
+                raise RuntimeError('Controller is already being recorded.')
+            if self._origin is None:
+                self._origin = perf_counter_ns()
+            self._ctrl._recorder = self
+
+    def stop(self):
+        """Stop recording."""
+        with self._ctrl.lock:
+            if self._ctrl._recorder is self:
+                self._ctrl._recorder = None
+
+    def close(self):
+        """Stop recording and truncate the log file to its contents."""
+        if self._map is None:
+            return
+        self.stop()
+        self._map.flush()
+        self._map.close()
+        self._map = None
+        self._file.truncate(self._pos)
+        self._file.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def begin(self):
+        self._append(BEGIN)
+
+    def end(self):
+        self._append(END)
+
+    def abort(self):
+        self._append(ABORT)
+
+    def flush(self):
+        self._append(FLUSH)
+
+    def write(self, spi, data):
+        self._append(WRITE, self._target(spi), bytes(data))
+
+    def read(self, spi, data):
+        self._append(READ, self._target(spi), b'', bytes(data))
+
+    def exchange(self, spi, out, data):
+        self._append(EXCHANGE, self._target(spi), bytes(out), bytes(data))
+
+    def gpio_set(self, gpio, value):
+        self._append(GPIO_SET, self._target(gpio), bytes((value,)))
+
+    def gpio_get(self, gpio, value):
+        self._append(GPIO_GET, self._target(gpio), b'', bytes((value,)))
+
+    def txn_read(self, spi, readlen, count):
+        self._append(TXN_READ, self._target(spi), struct.pack('<II', readlen, count))
+
+    def read_data(self, data):
+        self._append(READ_DATA, 0, b'', data)
+
+    def _target(self, obj):
+        target = self._targets.get(obj)
+        if target is None:
+            config = obj._config()
+            miso_en_gpio = config.get('miso_en_gpio')
+            if miso_en_gpio is not None:
+                config['miso_en_gpio'] = self._target(miso_en_gpio)
+            target = len(self._targets) + 1
+            if target > 255:
+                raise RuntimeError('Too many targets to record.')
+            self._targets[obj] = target
+            self._append(CONFIG, target, json.dumps(config).encode())
+        return target
+
+    def _append(self, kind, target=0, out=b'', data=b''):
+        end = self._pos + ENTRY.size + len(out) + len(data)
+        if end > len(self._map):
+            self._grow(end)
+        ENTRY.pack_into(self._map, self._pos, perf_counter_ns() - self._origin, kind, target,
+                        len(out), len(data))
+        pos = self._pos + ENTRY.size
+        self._map[pos:pos + len(out)] = out
+        pos += len(out)
+        self._map[pos:pos + len(data)] = data
+        self._pos = end
+
+    def _grow(self, end):
+        size = len(self._map)
+        while size < end:
+            size *= 2
+        self._map.flush()
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+
+class RecordLog:
+    """Reader of a Recorder log."""
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): log file name
+        """
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError('path: Not a recorder log.')
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        """Iterate over entries.
+
+        Returns:
+            iterator: Entry(time, kind, target, out, data) with time in ns since the
+                      start of recording, CONFIG entries have the JSON configuration
+                      of their target in out
+        """
+        data = self._map
+        pos = len(MAGIC)
+        while pos + ENTRY.size <= len(data):
+            time, kind, target, out_len, data_len = ENTRY.unpack_from(data, pos)
+            if not kind:
+                break
+            pos += ENTRY.size
+            out = data[pos:pos + out_len]
+            pos += out_len
+            yield Entry(time, kind, target, out, data[pos:pos + data_len])
+            pos += data_len
+
+    def targets(self):
+        """Configuration of the recorded targets.
+
+        Returns:
+            dict: configuration dicts by target
+        """
+        return {e.target: json.loads(e.out.decode()) for e in self if e.kind == CONFIG}
+
+
+class Replayer:
+    """Replays a Recorder log through a controller, e.g. io.Controller against
+    hardware or plan.PlanController, and compares read results with the log.
+
+    SPI interfaces and GPIOs are created on the controller from the logged
+    configuration, so replay does not need a board object. Transactions, queued reads
+    and flushes are replayed as recorded.
+    """
+
+    def __init__(self, log, controller, speed=None):
+        """
+        Args:
+            log (RecordLog): log
+            controller (Controller): controller to replay on
+            speed (float, optional): replay speed relative to the recording, default
+                                     as fast as possible
+        """
+        if speed is not None and not speed > 0:
+            raise ValueError('speed: Expected float > 0.')
+        self._log = log
+        self._ctrl = controller
+        self.speed = speed
+
+    def run(self, check=True, stop_on_divergence=False):
+        """Replay the log.
+
+        Args:
+            check (bool, optional): compare read results with the log
+            stop_on_divergence (bool, optional): stop at the first divergence
+
+        Returns:
+            ReplayResult: number of entries replayed, list of Divergence and elapsed
+                          time in seconds
+        """
+        targets = {}
+        configs = {}
+        pending = deque()
+        divergences = []
+        txn_context = txn = None
+        start = perf_counter_ns()
+        index = 0
+        for index, entry in enumerate(self._log):
+            if self.speed is not None:
+                delay = entry.time / self.speed - (perf_counter_ns() - start)
+                if delay > 0:
+                    sleep(delay * 1e-9)
+            kind = entry.kind
+            target = targets.get(entry.target)
+            actual = None
+            if kind == CONFIG:
+                configs[entry.target] = json.loads(entry.out.decode())
+                targets[entry.target] = self._create(configs[entry.target], targets)
+            elif kind == WRITE:
+                target.write(entry.out)
+            elif kind == READ:
+                actual = target.read(readlen=len(entry.data))
+            elif kind == EXCHANGE:
+                actual = target.query(entry.out, len(entry.data))
+            elif kind == GPIO_SET:
+                target.set(bool(entry.out[0]))
+            elif kind == GPIO_GET:
+                actual = bytes((target.get(),))
+            elif kind == BEGIN:
+                txn_context = self._ctrl.transaction()
+                txn = txn_context.__enter__()
+            elif kind in (END, ABORT):
+                if kind == END:
+                    txn_context.__exit__(None, None, None)
+                else:
+                    txn_context.__exit__(_Abort, _Abort(), None)
+                txn_context = txn = None
+            elif kind == TXN_READ:
+                pending.append(txn.read(target, *struct.unpack('<II', entry.out)))
+            elif kind == READ_DATA:
+                read = pending.popleft()
+                if read.data is None:
+                    # Completed by a flush inside the following synchronous call
+                    self._ctrl._transaction._flush()
+                actual = read.data
+            elif kind == FLUSH:
+                txn.flush()
+            if check and actual is not None and bytes(actual) != entry.data:
+                divergences.append(Divergence(index, KIND_NAMES[kind], configs.get(entry.target),
+                                              entry.data, bytes(actual)))
+                if stop_on_divergence:
+                    break
+        if txn_context is not None:
+            txn_context.__exit__(None, None, None)
+        return ReplayResult(index + 1, divergences, (perf_counter_ns() - start) * 1e-9)
+
+    def _create(self, config, targets):
+        if config['type'] == 'gpio':
+            return self._ctrl.get_gpio(config['pin'], direction=config['direction'],
+                                       active_low=config['active_low'])
+        miso_en_gpio = config.get('miso_en_gpio')
+        return self._ctrl.get_spi(config['cs'], config['freq_hz'], config['mode'],
+                                  miso_en_gpio=targets.get(miso_en_gpio))
+
+
+class _Abort(Exception):
+    pass
@@ -0,0 +1,239 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from threading import Thread, Event, Lock
+from time import time, perf_counter
+import numpy as np
+from .io import MONITORING, priority
+
+
+class AdcSampler:
+    """Continuous ADC sampling on a background thread.
+
+    Blocks of measurements are read with Ads7866.read_block(), which holds the bus
+    lock for one block only at MONITORING priority, so foreground SPI traffic is
+    interleaved between blocks and served first.
+    Samples are stored with timestamps in a preallocated ring buffer, decimated on the
+    fly into (mean, min, max) windows and optionally spilled to a memory-mapped file.
+
+    Both ring buffers are mirrored (every entry is stored twice, `length` entries
+    apart), so the latest `n <= length` entries are always contiguous and can be
+    returned as views without copying.
+    """
+
+    SAMPLE_DTYPE = np.dtype([('time', np.float64), ('value', np.float32)])
+    WINDOW_DTYPE = np.dtype([('time', np.float64), ('mean', np.float32),
+                             ('min', np.float32), ('max', np.float32)])
+
+    def __init__(self, adc, length=65536, block_size=64, decimation=64,
+                 interval=0., spill=None, spill_length=2**24):
+        """
+        Args:
+            adc (Ads7866): ADC to sample
+            length (int, optional): ring buffer length in samples
+            block_size (int, optional): samples per bus transaction
+            decimation (int, optional): samples per decimation window
+            interval (float, optional): pause between blocks in seconds
+            spill (str, optional): path of memory-mapped file receiving all samples
+            spill_length (int, optional): capacity of spill file in samples, samples
+                                          beyond it are counted in spill_dropped
+        """
+        if not isinstance(length, int) or length < 1:
+            raise ValueError('length: Expected integer > 0.')
+        if not isinstance(block_size, int) or not 0 < block_size <= length:
+            raise ValueError('block_size: Expected integer in range [1, length].')
+        if not isinstance(decimation, int) or not 0 < decimation <= length:
+            raise ValueError('decimation: Expected integer in range [1, length].')
+        if not isinstance(interval, (float, int)) or interval < 0:
+            raise ValueError('interval: Expected float >= 0.')
+        self._adc = adc
+        self._length = length
+        self._block_size = block_size
+        self._decimation = decimation
+        self._interval = interval
+        self._samples = np.zeros(2 * length, dtype=AdcSampler.SAMPLE_DTYPE)
+        self._num_windows = max(length // decimation, 1)
+        self._windows = np.zeros(2 * self._num_windows, dtype=AdcSampler.WINDOW_DTYPE)
+        self._carry = np.empty(0, dtype=AdcSampler.SAMPLE_DTYPE)
+        self._count = 0
+        self._window_count = 0
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+        self.error = None
+        if spill is None:
+            self._spill = None
+        else:
+            self._spill = np.memmap(spill, dtype=AdcSampler.SAMPLE_DTYPE, mode='w+',
+                                    shape=(spill_length,))
+        self._spill_count = 0
+        self._spill_dropped = 0
+
+    def start(self):
+        """Start sampling thread."""
+        if self.running:
+            raise RuntimeError('Sampler already running.')
+        self._stop.clear()
+        self.error = None
+        self._thread = Thread(target=self._run, name='AdcSampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling thread and flush spill file."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._spill is not None:
+            self._spill.flush()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def running(self):
+        """Sampling thread is running.
+
+        Returns:
+            bool: running
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def count(self):
+        """Total number of samples acquired.
+
+        Returns:
+            int: number of samples
+        """
+        return self._count
+
+    @property
+    def spill_count(self):
+        """Number of samples written to the spill file.
+
+        Returns:
+            int: number of samples
+        """
+        return self._spill_count
+
+    @property
+    def spill_dropped(self):
+        """Number of samples not written because the spill file was full.
+
+        Returns:
+            int: number of samples
+        """
+        return self._spill_dropped
+
+    def latest(self, n=None):
+        """Latest samples. The returned array is a view into the ring buffer and is
+        valid until the sampler has acquired `length - n` more samples.
+
+        Args:
+            n (int, optional): number of samples, default all available
+
+        Returns:
+            ndarray: structured array with fields 'time' (s since epoch) and 'value'
+        """
+        with self._lock:
+            return self._view(self._samples, self._length, self._count, n)
+
+    def latest_windows(self, n=None):
+        """Latest decimation windows. The returned array is a view into the ring
+        buffer, see latest().
+
+        Args:
+            n (int, optional): number of windows, default all available
+
+        Returns:
+            ndarray: structured array with fields 'time', 'mean', 'min' and 'max'
+        """
+        with self._lock:
+            return self._view(self._windows, self._num_windows, self._window_count, n)
+
+    def _view(self, buffer, length, count, n):
+        available = min(count, length)
+        n = available if n is None else min(n, available)
+        head = count % length + length
+        return buffer[head - n:head]
+
+    def _run(self):
+        offset = time() - perf_counter()
+        try:
+            with priority(MONITORING):
+                self._sample(offset)
+        except Exception as e:
+            self.error = e
+
+    def _sample(self, offset):
+        while not self._stop.is_set():
+            start = perf_counter()
+            values = self._adc.read_block(self._block_size)
+            stop = perf_counter()
+            block = np.empty(len(values), dtype=AdcSampler.SAMPLE_DTYPE)
+            block['time'] = np.linspace(start, stop, len(values)) + offset
+            block['value'] = values
+            self._push(block)
+            if self._interval:
+                self._stop.wait(self._interval)
+
+    def _push(self, block):
+        windows = self._decimate(block)
+        with self._lock:
+            self._count = self._store(self._samples, self._length, self._count, block)
+            if len(windows):
+                self._window_count = self._store(self._windows, self._num_windows,
+                                                 self._window_count, windows)
+        if self._spill is not None:
+            n = min(len(block), len(self._spill) - self._spill_count)
+            self._spill[self._spill_count:self._spill_count + n] = block[:n]
+            self._spill_count += n
+            self._spill_dropped += len(block) - n
+
+    def _decimate(self, block):
+        if len(self._carry):
+            block = np.concatenate((self._carry, block))
+        num = len(block) // self._decimation
+        full = block[:num * self._decimation]
+        self._carry = block[num * self._decimation:].copy()
+        windows = np.empty(num, dtype=AdcSampler.WINDOW_DTYPE)
+        values = full['value'].reshape(num, self._decimation)
+        windows['time'] = full['time'].reshape(num, self._decimation).mean(axis=1)
+        windows['mean'] = values.mean(axis=1)
+        windows['min'] = values.min(axis=1)
+        windows['max'] = values.max(axis=1)
+        return windows
+
+    @staticmethod
+    def _store(buffer, length, count, data):
+        # Only the latest `length` entries fit, the older ones are counted as overwritten
+        total = count + len(data)
+        data = data[-length:]
+        pos = (total - len(data)) % length
+        first = min(len(data), length - pos)
+        for base in (0, length):
+            buffer[base + pos:base + pos + first] = data[:first]
+            buffer[base:base + len(data) - first] = data[first:]
+        return total
@@ -0,0 +1,354 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import struct
+from contextlib import contextmanager
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from threading import Lock
+from time import perf_counter, sleep
+
+from .ltc55xx import Ltc5586, Ltc5594
+from .merlin2b import Merlin2b
+
+# Segment layout, little-endian:
+#   header: magic, sequence, Merlin2b revision, number of downmixers
+#   Merlin2b: one uint32 word and one valid byte per address of Merlin2b.SHADOW_REGIONS
+#   per downmixer: type byte, one value and one valid byte per register of
+#   Ltc5594.SHADOW_REGISTERS
+# The sequence is odd while the publisher updates the segment (seqlock).
+MAGIC = b'M2SHD\x00\x01\x00'
+HEADER = struct.Struct('<8sQII')
+HEADER_SIZE = 32
+IC_ADDRESSES = tuple(base + 4 * index for base, words in Merlin2b.SHADOW_REGIONS
+                     for index in range(words))
+DM_REGISTERS = tuple(Ltc5594.SHADOW_REGISTERS)
+DM_TYPES = (Ltc5594, Ltc5586)
+
+# Names of the segments published by this process
+_published = set()
+
+
+def _layout(num_downmixers):
+    # Offsets of the Merlin2b words, valid bytes and downmixer blocks, and total size
+    words = HEADER_SIZE
+    valid = words + 4 * len(IC_ADDRESSES)
+    downmixers = valid + len(IC_ADDRESSES)
+    block = 1 + 2 * len(DM_REGISTERS)
+    return words, valid, downmixers, block, downmixers + num_downmixers * block
+
+
+class SharedShadow(dict):
+    """Register shadow that mirrors its updates into a shared memory segment.
+
+    Replaces the shadow dict of a driver. Each update() or clear() is one seqlock write
+    section, so readers see all words of a multi-word register write or none.
+    """
+
+    def __init__(self, publisher, index, values, valid, initial=()):
+        super().__init__()
+        self._publisher = publisher
+        self._index = index
+        self._values = values
+        self._valid = valid
+        self.update(initial)
+
+    def __setitem__(self, address, value):
+        self.update(((address, value),))
+
+    def update(self, items=()):
+        items = list(items.items() if isinstance(items, dict) else items)
+        if not items:
+            return
+        index = self._index
+        with self._publisher._write():
+            for address, value in items:
+                dict.__setitem__(self, address, value)
+                i = index.get(address)
+                if i is not None:
+                    self._values[i] = value
+                    self._valid[i] = 1
+
+    def clear(self):
+        with self._publisher._write():
+            dict.clear(self)
+            self._valid[:] = bytes(len(self._valid))
+
+
+class ShadowPublisher:
+    """Publish the register shadows of a board in a shared memory segment.
+
+    Monitoring processes open the segment with ShadowReader and decode register
+    state without bus traffic. The publisher installs SharedShadow instances in the
+    board's drivers, the drivers keep updating them as usual.
+
+    The segment mirrors the driver shadows, i.e. the values the drivers have issued.
+    Writes still queued in an open transaction or in the write-behind queue are
+    visible before they reach the device. When a transaction or write-behind batch
+    fails to commit, the shadows are cleared and the affected values decode as None
+    until they are written again or fill() reads them back.
+    """
+
+    def __init__(self, board, name=None, fill=True):
+        """
+        Args:
+            board (Merlin2bBoard): board
+            name (str, optional): segment name, default generated
+            fill (bool, optional): read registers not shadowed yet, see fill()
+        """
+        self._board = board
+        self._lock = Lock()
+        words, valid, downmixers, block, size = _layout(len(board.downmixers))
+        self._shm = SharedMemory(name=name, create=True, size=size)
+        _published.add(self._shm.name)
+        buf = self._shm.buf
+        HEADER.pack_into(buf, 0, MAGIC, 0, board.ic._revision, len(board.downmixers))
+        self._seq = buf[8:16].cast('Q')
+        self._views = [self._seq]
+        self._drivers = []
+        self._install(board.ic, {a: i for i, a in enumerate(IC_ADDRESSES)},
+                      buf[words:valid].cast('I'), buf[valid:downmixers])
+        dm_index = {a: i for i, a in enumerate(DM_REGISTERS)}
+        for n, dm in enumerate(board.downmixers):
+            offset = downmixers + n * block
+            buf[offset] = DM_TYPES.index(type(dm))
+            split = offset + 1 + len(DM_REGISTERS)
+            self._install(dm, dm_index, buf[offset + 1:split], buf[split:offset + block])
+        if fill:
+            try:
+                self.fill()
+            except BaseException:
+                self.close()
+                raise
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def fill(self):
+        """Read shadowed registers that are not known yet, e.g. after a reset, so
+        readers can decode all of them. Costs one burst per Merlin2b region and one read
+        per missing downmixer register."""
+        ic = self._board.ic
+        for base, words in Merlin2b.SHADOW_REGIONS:
+            if any(base + 4 * i not in ic._shadow for i in range(words)):
+                ic.read(base, length=words)
+        for dm in self._board.downmixers:
+            for address in DM_REGISTERS:
+                if address not in dm._shadow:
+                    dm.read(address)
+
+    def close(self, unlink=True):
+        """Restore plain shadows in the drivers and release the segment.
+
+        Args:
+            unlink (bool, optional): remove the segment, readers keep their mapping
+        """
+        if self._shm is None:
+            return
+        for driver, shadow in self._drivers:
+            driver._shadow = dict(shadow)
+        self._drivers = []
+        for view in self._views:
+            view.release()
+        self._views = []
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+        _published.discard(self._shm.name)
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _install(self, driver, index, values, valid):
+        self._views += [values, valid]
+        shadow = SharedShadow(self, index, values, valid, driver._shadow)
+        driver._shadow = shadow
+        self._drivers.append((driver, shadow))
+
+    @contextmanager
+    def _write(self):
+        with self._lock:
+            self._seq[0] += 1
+            try:
+                yield
+            finally:
+                self._seq[0] += 1
+
+
+class _Missing(RuntimeError):
+    pass
+
+
+class _NoBus:
+    # Interface of the decoding drivers, all registers must come from the shadow
+
+    def query(self, *args, **kwargs):
+        raise _Missing('Register not in shared shadow.')
+
+    write = read = query
+
+
+def _decode(fn, *args):
+    try:
+        return fn(*args)
+    except _Missing:
+        return None
+
+
+class ShadowReader:
+    """Read a board's register shadows published by ShadowPublisher, from any process."""
+
+    def __init__(self, name, timeout=1.):
+        """
+        Args:
+            name (str): segment name
+            timeout (float, optional): time in seconds to retry reading a consistent
+                                       snapshot
+        """
+        # The publisher owns the segment, do not let this process remove it at exit
+        try:
+            self._shm = SharedMemory(name=name, track=False)
+        except TypeError:
+            self._shm = SharedMemory(name=name)
+            if self._shm.name not in _published:
+                resource_tracker.unregister(self._shm._name, 'shared_memory')
+        magic, _, self.revision, num_downmixers = HEADER.unpack_from(self._shm.buf, 0)
+        if magic != MAGIC:
+            self._shm.close()
+            raise ValueError('name: Not a Merlin2 register shadow segment.')
+        self.timeout = timeout
+        buf = self._shm.buf
+        words, valid, downmixers, block, _ = _layout(num_downmixers)
+        self._seq = buf[8:16].cast('Q')
+        self._ic_words = buf[words:valid].cast('I')
+        self._ic_valid = buf[valid:downmixers]
+        self._downmixers = []
+        for n in range(num_downmixers):
+            offset = downmixers + n * block
+            split = offset + 1 + len(DM_REGISTERS)
+            self._downmixers.append((DM_TYPES[buf[offset]], buf[offset + 1:split],
+                                     buf[split:offset + block]))
+
+    @property
+    def version(self):
+        """Sequence number, changes with every update. Odd while an update is in progress.
+
+        Returns:
+            int: sequence number
+        """
+        return self._seq[0]
+
+    def read(self, fn):
+        """Call fn with zero-copy views of the segment until it completes without a
+        concurrent update. fn must not keep references to the views.
+
+        Args:
+            fn (callable): called as fn(ic_words, ic_valid, downmixers) with memoryviews
+                           of the Merlin2b words and valid bytes, and a list of
+                           (type, values, valid) per downmixer
+
+        Returns:
+            object: result of fn
+
+        Raises:
+            RuntimeError: if no consistent snapshot was read within the timeout
+        """
+        deadline = perf_counter() + self.timeout
+        while True:
+            seq = self._seq[0]
+            if not seq & 1:
+                result = fn(self._ic_words, self._ic_valid, self._downmixers)
+                if self._seq[0] == seq:
+                    return result
+            if perf_counter() > deadline:
+                raise RuntimeError('Failed to read a consistent snapshot.')
+            # Let the publisher finish its update
+            sleep(0)
+
+    def snapshot(self):
+        """Consistent copy of the valid registers.
+
+        Returns:
+            tuple: Merlin2b words by address, list of downmixer registers by address
+        """
+        def copy(ic_words, ic_valid, downmixers):
+            ic = {a: ic_words[i] for i, a in enumerate(IC_ADDRESSES) if ic_valid[i]}
+            dms = [{a: values[i] for i, a in enumerate(DM_REGISTERS) if valid[i]}
+                   for _, values, valid in downmixers]
+            return ic, dms
+
+        return self.read(copy)
+
+    def state(self):
+        """Decode driver state from a consistent snapshot. Values whose registers were
+        never shadowed, e.g. untouched since a reset, are None.
+
+        Returns:
+            dict: 'chained', 'bandwidth', 'gains', 'vga_gain', 'input_dc_offset' and
+                  'output_dc_offset' (tuples per input / output), 'weights' (ndarray),
+                  and 'downmixers', a list of dicts with 'vga_gain', 'dc_offset' and
+                  'registers'
+        """
+        ic_shadow, dm_shadows = self.snapshot()
+        ic = Merlin2b(_NoBus(), None, None, revision=self.revision)
+        ic._shadow = ic_shadow
+        ic._shadow_cached = True
+        ic._chained = bool(ic_shadow.get(0x4, 0) & 0x1)
+        state = {
+            'chained': ic._chained if 0x4 in ic_shadow else None,
+            'bandwidth': _decode(lambda: ic.delays[0].bandwidth),
+            'gains': _decode(ic.get_gain_profile),
+            'vga_gain': _decode(ic.get_vga_gain),
+            'input_dc_offset': tuple(_decode(lambda: inp.dc_offset) for inp in ic.inputs),
+            'output_dc_offset': tuple(_decode(lambda: out.dc_offset) for out in ic.outputs),
+            'weights': _decode(ic.get_weights),
+            'downmixers': [],
+        }
+        for (dm_type, _, _), registers in zip(self._downmixers, dm_shadows):
+            dm = dm_type(_NoBus())
+            dm._shadow = registers
+            dm._shadow_cached = True
+            state['downmixers'].append({'vga_gain': _decode(lambda: dm.vga_gain),
+                                        'dc_offset': _decode(lambda: dm.dc_offset),
+                                        'registers': registers})
+        return state
+
+    def close(self):
+        if self._shm is None:
+            return
+        for view in (self._seq, self._ic_words, self._ic_valid):
+            view.release()
+        for _, values, valid in self._downmixers:
+            values.release()
+            valid.release()
+        self._downmixers = []
+        self._shm.close()
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
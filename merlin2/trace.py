@@ -0,0 +1,300 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from inspect import isgeneratorfunction
+from threading import Lock, get_ident, current_thread
+from time import perf_counter_ns
+import json
+import numpy as np
+
+from .io import BusController, Controller, Spi, Gpio, Transaction
+from .plan import PlanController, PlanSpi, PlanGpio, PlanTransaction
+from .ltc55xx import Ltc5594, Ltc5586
+from .ads7866 import Ads7866
+from .merlin2b_board import Merlin2bBoard, Merlin2bEval, Merlin2bTest
+from .merlin2b import Merlin2b
+from .merlin2b.block import Block
+from .merlin2b.filter import Filter
+from .merlin2b.delaygroup import DelayGroup
+from .merlin2b.input import Input
+from .merlin2b.output import Output
+from .merlin2b.summer import Summer
+
+
+LAYERS = {
+    'board': (Merlin2bBoard, Merlin2bEval, Merlin2bTest),
+    'ic': (Merlin2b, Ltc5594, Ltc5586, Ads7866),
+    'block': (Block, Filter, DelayGroup, Input, Output, Summer),
+    'transport': (BusController, Controller, Spi, Gpio, Transaction, PlanController, PlanSpi,
+                  PlanGpio, PlanTransaction),
+}
+
+_active = None
+_hooks_lock = Lock()
+
+
+class Tracer:
+    """Span tracer of the board, IC, block and transport layers.
+
+    While a tracer is started, every public method call and property access of the
+    classes in the selected layers is recorded as a span with monotonic nanosecond
+    timestamps and the calling thread. Context managers such as
+    BusController.transaction() are timed over their with block. The hooks are
+    installed on the classes, so all boards in the process are traced, and removed
+    again on stop, so there is no overhead while no tracer is started. Only one
+    tracer can be started at a time. Spans are stored in preallocated arrays, spans
+    beyond the capacity are counted as dropped.
+    """
+
+    def __init__(self, capacity=2**20, layers=None):
+        """
+        Args:
+            capacity (int, optional): maximum number of spans
+            layers (sequence, optional): names of layers to trace, default all of
+                                         'board', 'ic', 'block' and 'transport'
+        """
+        if not isinstance(capacity, int) or capacity < 1:
+            raise ValueError('capacity: Expected integer > 0.')
+        layers = tuple(LAYERS) if layers is None else tuple(layers)
+        if not all(layer in LAYERS for layer in layers):
+            raise ValueError('layers: Expected names in {}.'.format(tuple(LAYERS)))
+        self.capacity = capacity
+        self.layers = layers
+        self._start = np.empty(capacity, dtype=np.int64)
+        self._end = np.empty(capacity, dtype=np.int64)
+        self._name = np.empty(capacity, dtype=np.int32)
+        self._thread = np.empty(capacity, dtype=np.int64)
+        self._names = []
+        self._thread_names = {}
+        self._origin = None
+        self._lock = Lock()
+        self.clear()
+
+    def clear(self):
+        """Discard recorded spans."""
+        with self._lock:
+            self._count = 0
+            self.dropped = 0
+
+    def start(self):
+        """Install hooks and start recording.
+
+        Raises:
+            RuntimeError: if this or another tracer is already started
+        """
+        global _active
+        with _hooks_lock:
+            if _active is self:
+                raise RuntimeError('Tracer is already started.')
+            if _active is not None or _installed:
+                raise RuntimeError('Another tracer is already started.')
+            self._origin = perf_counter_ns() if self._origin is None else self._origin
+            try:
+                self._install()
+            except BaseException:
+                _uninstall()
+                raise
+            _active = self
+
+    def stop(self):
+        """Stop recording and remove hooks."""
+        global _active
+        with _hooks_lock:
+            if _active is self:
+                _active = None
+                _uninstall()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def span(self, name):
+        """Record a user span around a block of code.
+
+        Args:
+            name (str): span name
+
+        Returns:
+            context manager
+        """
+        return _Span(self, self._intern(name))
+
+    @property
+    def count(self):
+        """Number of recorded spans.
+
+        Returns:
+            int: count
+        """
+        return self._count
+
+    def spans(self):
+        """Recorded spans ordered by start time.
+
+        Returns:
+            list: tuples (name, thread, start, duration) with times in seconds
+                  relative to the first start of the tracer
+        """
+        num = self.count
+        order = np.argsort(self._start[:num], kind='stable')
+        origin = self._origin or 0
+        return [(self._names[self._name[i]], int(self._thread[i]),
+                 float(self._start[i] - origin) * 1e-9,
+                 float(self._end[i] - self._start[i]) * 1e-9)
+                for i in order]
+
+    def export(self, fp):
+        """Export spans as Chrome trace-event JSON, e.g. for chrome://tracing or
+        https://ui.perfetto.dev.
+
+        Args:
+            fp (str, file): file name or text file object
+        """
+        num = self.count
+        origin = self._origin or 0
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid,
+                   'args': {'name': name}} for tid, name in self._thread_names.items()]
+        order = np.argsort(self._start[:num], kind='stable')
+        starts = (self._start[order] - origin) / 1e3
+        durations = (self._end[order] - self._start[order]) / 1e3
+        for i, index in enumerate(order):
+            name = self._names[self._name[index]]
+            events.append({'name': name, 'cat': name.split('.', 1)[0], 'ph': 'X',
+                           'ts': float(starts[i]), 'dur': float(durations[i]), 'pid': 1,
+                           'tid': int(self._thread[index])})
+        trace = {'traceEvents': events, 'displayTimeUnit': 'ns',
+                 'otherData': {'dropped': self.dropped}}
+        if isinstance(fp, str):
+            with open(fp, 'w') as f:
+                json.dump(trace, f)
+        else:
+            json.dump(trace, fp)
+
+    def _intern(self, name):
+        with self._lock:
+            try:
+                return self._names.index(name)
+            except ValueError:
+                self._names.append(name)
+                return len(self._names) - 1
+
+    def _record(self, name, start, end):
+        with self._lock:
+            index = self._count
+            if index >= self.capacity:
+                self.dropped += 1
+                return
+            self._count += 1
+        thread = get_ident()
+        if thread not in self._thread_names:
+            self._thread_names[thread] = current_thread().name
+        self._start[index] = start
+        self._end[index] = end
+        self._name[index] = name
+        self._thread[index] = thread
+
+    def _install(self):
+        for layer in self.layers:
+            for cls in LAYERS[layer]:
+                for attr, value in list(vars(cls).items()):
+                    if attr.startswith('_'):
+                        continue
+                    if isinstance(value, property):
+                        fget = value.fget and _wrap(self, value.fget, '{}.{}.get'
+                                                    .format(cls.__name__, attr))
+                        fset = value.fset and _wrap(self, value.fset, '{}.{}.set'
+                                                    .format(cls.__name__, attr))
+                        wrapped = property(fget, fset, value.fdel, value.__doc__)
+                    elif callable(value) and not isinstance(value, (staticmethod, classmethod)):
+                        wrapped = _wrap(self, value, '{}.{}'.format(cls.__name__, attr))
+                    else:
+                        continue
+                    _installed.append((cls, attr, value))
+                    setattr(cls, attr, wrapped)
+
+
+_installed = []
+
+
+def _uninstall():
+    while _installed:
+        cls, attr, value = _installed.pop()
+        setattr(cls, attr, value)
+
+
+def _wrap(tracer, fn, name):
+    name = tracer._intern(name)
+    if isgeneratorfunction(getattr(fn, '__wrapped__', None)):
+        # @contextmanager, the span covers the with block rather than the call
+        def traced(*args, **kwargs):
+            context = fn(*args, **kwargs)
+            if _active is not tracer:
+                return context
+            return _TracedContext(tracer, name, context)
+    else:
+        def traced(*args, **kwargs):
+            if _active is not tracer:
+                return fn(*args, **kwargs)
+            start = perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                tracer._record(name, start, perf_counter_ns())
+
+    traced.__name__ = fn.__name__
+    traced.__qualname__ = fn.__qualname__
+    traced.__doc__ = fn.__doc__
+    traced.__wrapped__ = fn
+    return traced
+
+
+class _Span:
+
+    def __init__(self, tracer, name):
+        self._tracer = tracer
+        self._name = name
+
+    def __enter__(self):
+        self._begin = perf_counter_ns()
+        return self
+
+    def __exit__(self, *args):
+        self._tracer._record(self._name, self._begin, perf_counter_ns())
+
+
+class _TracedContext:
+
+    def __init__(self, tracer, name, context):
+        self._tracer = tracer
+        self._name = name
+        self._context = context
+
+    def __enter__(self):
+        self._begin = perf_counter_ns()
+        return self._context.__enter__()
+
+    def __exit__(self, *args):
+        try:
+            return self._context.__exit__(*args)
+        finally:
+            self._tracer._record(self._name, self._begin, perf_counter_ns())
@@ -0,0 +1,193 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from time import perf_counter
+import numpy as np
+
+from .io import REALTIME, priority
+from .merlin2b import FilterModel, WeightSolver
+
+
+class ChannelTracker:
+    """Incremental weight tracking of a time-varying channel.
+
+    Weights are updated with every measurement of a stream and only pushed to the
+    board when their quantized codes change, writing just the changed taps:
+
+    - 'rls' consumes channel estimates H(f) and tracks the exponentially weighted
+      least-squares weights, with forgetting factor in (0, 1].
+    - 'lms' consumes residual measurements H(f) - response(weights) taken with the
+      currently applied weights and takes a normalized gradient step per residual,
+      forgetting < 1 leaks weights towards 0.
+
+    Pushes are throttled to at most one per min_interval seconds, and APLS is toggled
+    once per apply_every pushes. Measurements received in between still update the
+    weights, the next push carries the latest weights.
+    """
+
+    METHODS = ('rls', 'lms')
+
+    def __init__(self, board, model, freqs, method='rls', forgetting=None, step=0.5,
+                 regularization=1e-4, quantizer=None, min_interval=0., apply_every=1):
+        """
+        Args:
+            board (Merlin2bEval, Merlin2bTest): board
+            model (FilterModel): filter model of the board configuration
+            freqs (ndarray): baseband frequencies in Hz of shape (num_freqs,)
+            method (str, optional): 'rls' or 'lms'
+            forgetting (float, optional): forgetting factor in (0, 1], default 0.9
+                                          for 'rls' and 1 for 'lms'
+            step (float, optional): 'lms' step size in (0, 2)
+            regularization (float, optional): 'rls' regularization of WeightSolver
+            quantizer (callable, optional): maps weights to integer codes, e.g. a
+                                            Quantizer, default rounding
+            min_interval (float, optional): minimum time between pushes in seconds
+            apply_every (int, optional): number of pushes per apply
+        """
+        if method not in ChannelTracker.METHODS:
+            raise ValueError('method: Expected one of {}.'.format(ChannelTracker.METHODS))
+        if not isinstance(model, FilterModel):
+            raise TypeError('model: Expected FilterModel.')
+        if forgetting is None:
+            forgetting = 0.9 if method == 'rls' else 1.
+        if not 0 < forgetting <= 1:
+            raise ValueError('forgetting: Expected float in range (0, 1].')
+        if not 0 < step < 2:
+            raise ValueError('step: Expected float in range (0, 2).')
+        if min_interval < 0:
+            raise ValueError('min_interval: Expected float >= 0.')
+        if not isinstance(apply_every, int) or apply_every < 1:
+            raise ValueError('apply_every: Expected integer > 0.')
+        self._io = board._io
+        self._ic = board.ic
+        if model.shape != ((23, 2) if self._ic._chained else (12, 4)):
+            raise ValueError('model: Chaining does not match board configuration.')
+        self.method = method
+        self.forgetting = float(forgetting)
+        self.step = float(step)
+        self.min_interval = float(min_interval)
+        self.apply_every = apply_every
+        self._quantizer = quantizer
+        self._solver = WeightSolver(model, freqs, regularization)
+        basis = model.basis(self._solver.freqs)
+        self._basis_h = np.ascontiguousarray(basis.conj().T)
+        self._lms_scale = self.step / np.linalg.eigvalsh(self._basis_h @ basis)[-1]
+        self._weights = np.zeros(model.shape, dtype=np.complex128)
+        self._mass = 0.
+        self._written = None
+        self._last_push = None
+        self._unapplied = 0
+        self.num_updates = 0
+        self.num_pushes = 0
+        self.num_taps_written = 0
+
+    @property
+    def weights(self):
+        """Tracked weights before quantization.
+
+        Returns:
+            ndarray: complex ndarray of weight matrix shape
+        """
+        return self._weights.copy()
+
+    @property
+    def written(self):
+        """Mapped weights last written to the board.
+
+        Returns:
+            ndarray: complex ndarray of weight matrix shape, None before first push
+        """
+        return None if self._written is None else self._written.copy()
+
+    def update(self, measurement):
+        """Update weights with a measurement and push them if due.
+
+        Args:
+            measurement (ndarray): channel estimate ('rls') or residual ('lms'),
+                                   complex ndarray of shape (num_freqs, num_filters)
+
+        Returns:
+            bool: weights were pushed
+        """
+        measurement = np.asarray(measurement)
+        if measurement.shape != self._solver.shape:
+            raise TypeError('measurement: Expected ndarray of shape {}.'
+                            .format(self._solver.shape))
+        if self.method == 'rls':
+            # Exponentially weighted mean of per-estimate solutions
+            self._mass = self.forgetting * self._mass + 1.
+            estimate = self._solver.solve(measurement, quantize=False)
+            self._weights += (estimate - self._weights) / self._mass
+        else:
+            self._weights *= self.forgetting
+            self._weights += self._lms_scale * (self._basis_h @ measurement)
+            self._weights = np.clip(self._weights.real, -1., 1.) + \
+                1j * np.clip(self._weights.imag, -1., 1.)
+        self.num_updates += 1
+        now = perf_counter()
+        if self._last_push is not None and now - self._last_push < self.min_interval:
+            return False
+        return self._push(now, force_apply=False)
+
+    def run(self, measurements, callback=None):
+        """Track a stream of measurements until it is exhausted.
+
+        Args:
+            measurements (iterable): channel estimates or residuals, e.g. a generator
+            callback (callable, optional): called as callback(tracker, pushed) after
+                                           every update, stops tracking if it
+                                           returns True
+
+        Returns:
+            ndarray: mapped weights written to the board
+        """
+        for measurement in measurements:
+            pushed = self.update(measurement)
+            if callback is not None and callback(self, pushed):
+                break
+        self.flush()
+        return self.written
+
+    def flush(self):
+        """Push pending weights regardless of throttling and apply them."""
+        self._push(perf_counter(), force_apply=True)
+
+    def _push(self, now, force_apply):
+        if self._quantizer is None:
+            codes = np.stack((np.round(np.clip(self._weights.real, -1., 1.) * 255),
+                              np.round(np.clip(self._weights.imag, -1., 1.) * 255)), axis=-1)
+        else:
+            codes = np.asarray(self._quantizer(self._weights))
+        mapped = (codes[..., 0] / 255) + 1j * (codes[..., 1] / 255)
+        with priority(REALTIME), self._io.transaction():
+            if self._written is None:
+                self._written = self._ic.get_weights()
+            changed = np.count_nonzero(mapped != self._written)
+            if changed:
+                self._ic.set_weights(mapped, apply=False, previous=self._written)
+                self._written = mapped
+                self._last_push = now
+                self._unapplied += 1
+                self.num_pushes += 1
+                self.num_taps_written += changed
+            if self._unapplied and (force_apply or self._unapplied >= self.apply_every):
+                self._ic.apply()
+                self._unapplied = 0
+        return bool(changed)
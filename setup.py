@@ -30,7 +30,7 @@ setup(
     author_email='christian@kumunetworks.com',
     license='',
     install_requires=[
-        'pyftdi',
+        'pyftdi>=0.55,<0.58',
         'numpy',
     ],
 )
@@ -0,0 +1,122 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import asyncio
+import threading
+import unittest
+import numpy as np
+from merlin2.aio import AsyncMerlin2bEval, AsyncMerlin2bTest
+from merlin2.plan import plan_eval, plan_test
+
+
+class AsyncBoardTestCase(unittest.TestCase):
+
+    def test_board(self):
+        async def main():
+            async with AsyncMerlin2bTest(board=plan_test()) as dut:
+                await dut.init()
+                self.assertTrue(await dut.probe())
+                await dut.setup(2, 2, 80e6, 1700e6)
+                weights = np.full((12, 4), 0.5)
+                await dut.set_weights(weights)
+                np.testing.assert_allclose(await dut.get_weights(), weights, atol=1 / 255)
+                with self.assertRaises(TypeError):
+                    await dut.set_weights(np.zeros(3))
+                self.assertEqual(await dut.run(lambda: threading.current_thread().name),
+                                 'merlin2-io-PLAN')
+        asyncio.run(main())
+
+    def test_batching(self):
+        async def main():
+            async with AsyncMerlin2bEval(board=plan_eval()) as dut:
+                await dut.init()
+                await dut.setup(2, 2, 80e6, 1700e6)
+                io = dut.board._io
+                # Queue writes behind a blocked call so they are batched
+                release = threading.Event()
+                blocked = asyncio.ensure_future(dut.run(release.wait))
+                await asyncio.sleep(0)
+                writes = [dut.set_weights(np.full((12, 4), 0.25)),
+                          dut.set_input_dc_offset(0.5, -0.5, input=0),
+                          dut.set_weights(np.zeros((12, 4)), apply=False),
+                          dut.set_input_dc_offset(2., 0., input=0)]
+                tasks = [asyncio.ensure_future(w) for w in writes]
+                await asyncio.sleep(0)
+                io.reset_report()
+                release.set()
+                await blocked
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+                self.assertIsInstance(results[3], ValueError)
+                # The failed call discards the batch, the others commit on their own
+                self.assertEqual(io.report().transactions, 3)
+                self.assertEqual(dut.stats()['batched_calls'], 4)
+                np.testing.assert_allclose(await dut.get_input_dc_offset(0), (0.5, -0.5),
+                                           atol=1 / 127)
+                np.testing.assert_array_equal(await dut.get_weights(), np.zeros((12, 4)))
+                # Writes queued by a failing call are discarded, once with the batch and
+                # once on their own
+                discards = []
+                dut.board.ic._iface.on_discard(lambda: discards.append(None))
+
+                def partial():
+                    dut.board.set_input_dc_offset(-0.25, 0.25, input=0)
+                    raise OSError('Lost.')
+
+                release.clear()
+                blocked = asyncio.ensure_future(dut.run(release.wait))
+                await asyncio.sleep(0)
+                worker = dut._board_worker
+                tasks = [asyncio.ensure_future(w) for w in (
+                    dut.set_input_dc_offset(0.25, -0.25, input=1),
+                    worker.submit(partial, batch=True))]
+                await asyncio.sleep(0)
+                io.reset_report()
+                release.set()
+                await blocked
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+                self.assertIsInstance(results[1], OSError)
+                self.assertEqual(len(discards), 2)
+                self.assertEqual(io.report().transactions, 1)
+                np.testing.assert_allclose(await dut.get_input_dc_offset(1), (0.25, -0.25),
+                                           atol=1 / 127)
+                # Batches without failures commit once
+                release.clear()
+                blocked = asyncio.ensure_future(dut.run(release.wait))
+                await asyncio.sleep(0)
+                tasks = [asyncio.ensure_future(w) for w in (
+                    dut.set_weights(np.full((12, 4), 0.25)),
+                    dut.set_input_dc_offset(0., 0., input=0))]
+                await asyncio.sleep(0)
+                io.reset_report()
+                release.set()
+                await blocked
+                await asyncio.gather(*tasks)
+                self.assertEqual(io.report().transactions, 1)
+                # ADC streams
+                stream = dut.adc_stream(block_size=16)
+                blocks = [await stream.__anext__() for _ in range(3)]
+                await stream.aclose()
+                self.assertEqual([b.shape for b in blocks], [(16,)] * 3)
+                self.assertEqual((await dut.adc_read_block(8)).shape, (8,))
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
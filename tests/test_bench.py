@@ -0,0 +1,69 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from merlin2 import bench
+from merlin2.plan import plan_eval, plan_test
+
+
+class BenchTestCase(unittest.TestCase):
+
+    def test_run(self):
+        for board in (plan_eval(), plan_test()):
+            board.init()
+            names = [case.name for case in bench.board_cases(board)]
+            self.assertEqual(len(names), len(set(names)))
+            self.assertEqual('adc_read_block' in names, hasattr(board, 'adc'))
+            results = bench.run(board, repeat=2, cases=('probe', 'set_weights', 'get_weights'))
+            self.assertEqual(set(results), {'probe', 'set_weights', 'get_weights'})
+            for result in results.values():
+                self.assertGreater(result['transfers'], 0)
+                self.assertGreater(result['transport_time'], 0)
+                self.assertLessEqual(result['min_wall_time'], result['wall_time'])
+            self.assertGreater(results['get_weights']['bytes_in'],
+                               results['set_weights']['bytes_in'])
+        with self.assertRaises(ValueError):
+            bench.run(board, cases=('unknown',))
+
+    def test_compare(self):
+        board = plan_eval()
+        board.init()
+        results = bench.run(board, repeat=1, cases=('set_weights',))
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'bench.json')
+            bench.save(results, path, board='eval')
+            baseline = bench.load(path)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(baseline, results)
+        self.assertEqual(bench.compare(baseline, results), [])
+        slower = {'set_weights': dict(results['set_weights'])}
+        slower['set_weights']['transfers'] += 1
+        slower['set_weights']['wall_time'] *= 2
+        regressions = bench.compare(baseline, slower)
+        self.assertEqual([r[1] for r in regressions], ['transfers', 'wall_time'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import os
+import shutil
+import socket
+import stat
+import struct
+import tempfile
+import unittest
+import numpy as np
+from merlin2.daemon import BoardServer, BoardClient, HEADER, MAX_PICKLE_SIZE, send_message
+from merlin2.plan import plan_eval
+
+
+class DaemonTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'merlin2.sock')
+        self._board = plan_eval()
+        self._board.init()
+        self._board.setup(2, 2, 80e6, 1700e6)
+        self._server = BoardServer(self._board, self._path)
+        self._server.start()
+
+    def tearDown(self):
+        self._server.close()
+        shutil.rmtree(self._dir)
+
+    def test_calls(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self._path).st_mode), 0o600)
+        with BoardClient(self._path) as client:
+            weights = np.full((12, 4), 0.5 - 0.25j)
+            mapped = client.set_weights(weights)
+            np.testing.assert_array_equal(mapped, self._board.get_weights())
+            np.testing.assert_array_equal(client.get_weights(), mapped)
+            client.set_output_dc_offset(0.5, -0.5, output=1)
+            self.assertEqual(client.get_output_dc_offset(1),
+                             self._board.get_output_dc_offset(1))
+            block = client.adc_read_block(10000)
+            self.assertEqual(block.shape, (10000,))
+            self.assertEqual(client.serial_number, 'PLAN')
+
+    def test_errors(self):
+        with BoardClient(self._path) as client:
+            with self.assertRaises(TypeError):
+                client.set_weights(np.zeros(3))
+            with self.assertRaises(PermissionError):
+                client.init()
+            with self.assertRaises(AttributeError):
+                client.call('_io.transaction')
+            # The connection survives errors
+            self.assertTrue(client.probe())
+        self.assertEqual(self._server.num_requests, 4)
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self._path)
+        sock.settimeout(5)
+        return sock
+
+    def test_restricted(self):
+        # A frame that references a function is refused and the connection dropped
+        with self._connect() as sock:
+            send_message(sock, ('probe', (os.getpid,), {}))
+            self.assertEqual(sock.recv(1), b'')
+        # Oversized frames are refused from the header alone
+        with self._connect() as sock:
+            sock.sendall(HEADER.pack(MAX_PICKLE_SIZE + 1, 0))
+            self.assertEqual(sock.recv(1), b'')
+        with self._connect() as sock:
+            sock.sendall(HEADER.pack(16, 1) + struct.pack('<Q', 1 << 62))
+            self.assertEqual(sock.recv(1), b'')
+        with BoardClient(self._path) as client:
+            self.assertTrue(client.probe())
+        self.assertEqual(self._server.num_requests, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import time
+import unittest
+import numpy as np
+from merlin2.fleet import Fleet, FleetError
+from merlin2.plan import LatencyModel, plan_eval
+
+
+def _open(serial_number):
+    if serial_number == 'MISSING':
+        raise RuntimeError('No such device.')
+    board = plan_eval()
+    if serial_number == 'BROKEN':
+        # Wrong magic word, also after a reset
+        model = board._io.devices[2]
+        model.MAGIC = {**model.MAGIC, 0x0: 0}
+        model.registers = dict(model.MAGIC)
+    return board
+
+
+class FleetTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._fleet = Fleet.open(['A', 'B', 'BROKEN', 'MISSING'], factory=_open)
+
+    def test_open(self):
+        self.assertEqual(self._fleet.serial_numbers, ['A', 'B', 'BROKEN'])
+        self.assertEqual(list(self._fleet.open_errors), ['MISSING'])
+
+    def test_isolation(self):
+        result = self._fleet.init()
+        self.assertEqual(set(result.results), {'A', 'B'})
+        self.assertIsInstance(result.errors['BROKEN'], RuntimeError)
+        self.assertEqual(set(result.times), {'A', 'B', 'BROKEN'})
+        self.assertGreaterEqual(result.elapsed, max(result.times.values()))
+        with self.assertRaises(FleetError) as cm:
+            self._fleet.call('init', check=True)
+        self.assertEqual(list(cm.exception.result.errors), ['BROKEN'])
+        self.assertEqual(self._fleet.call('probe').results,
+                         {'A': True, 'B': True, 'BROKEN': False})
+        with self.assertRaises(KeyError):
+            self._fleet.init(serial_numbers=['C'])
+
+    def test_operations(self):
+        good = ['A', 'B']
+        self._fleet.init(serial_numbers=good, check=True)
+        self._fleet.setup(2, 2, 80e6, 1700e6, serial_numbers=good, check=True)
+        weights = {'A': np.full((12, 4), 0.5), 'B': np.full((12, 4), -0.25j)}
+        self._fleet.set_weights(weights, check=True)
+        result = self._fleet.call('get_weights', serial_numbers=good, check=True)
+        for sn in good:
+            np.testing.assert_allclose(result.results[sn], weights[sn], atol=1 / 255)
+        result = self._fleet.calibrate(iterations=2, serial_numbers=good, check=True)
+        self.assertEqual(set(result.results), set(good))
+
+    def test_apply_all(self):
+        good = ['A', 'B']
+        self._fleet.init(serial_numbers=good, check=True)
+        self._fleet.stage_weights(np.full((12, 4), 0.5), serial_numbers=good, check=True)
+        for _ in range(3):
+            result = self._fleet.apply_all(serial_numbers=good)
+        self.assertEqual(result.errors, {})
+        self.assertEqual(set(result.offsets), set(good))
+        self.assertEqual(min(result.offsets.values()), 0.)
+        self.assertEqual(result.skew, max(result.offsets.values()))
+        self.assertEqual(self._fleet.skew_stats()['count'], 3)
+        # A failure before the strobes cancels all boards
+        board = self._fleet['A']
+        board.apply = lambda: 1 / 0
+        result = self._fleet.apply_all(serial_numbers=good)
+        self.assertIsInstance(result.errors['A'], ZeroDivisionError)
+        self.assertIsNone(result.skew)
+        self.assertEqual(self._fleet.skew_stats()['count'], 3)
+        # A barrier timeout is reported for every board, none is strobed
+        board.apply = lambda: time.sleep(0.2)
+        result = self._fleet.apply_all(serial_numbers=good, timeout=0.05)
+        self.assertEqual(result.offsets, {})
+        self.assertEqual(set(result.errors), set(good))
+        self.assertTrue(all(isinstance(e, TimeoutError) for e in result.errors.values()))
+        del board.apply
+        # A strobe that fails after the barrier does not hide the strobed boards
+        other = self._fleet['B']
+        other._io.latency = LatencyModel()
+        apply = other.apply
+
+        def failing_apply():
+            apply()
+            other._io.latency.fail = True
+
+        other.apply = failing_apply
+        result = self._fleet.apply_all(serial_numbers=good)
+        other._io.latency.fail = False
+        self.assertEqual(set(result.offsets), {'A'})
+        self.assertEqual(result.skew, 0.)
+        self.assertIsInstance(result.errors['B'], OSError)
+        self.assertEqual(self._fleet.skew_stats()['count'], 3)
+        # Shared trigger line
+        trigger = board._io.get_gpio(4, direction='output')
+        result = self._fleet.apply_all(trigger=trigger)
+        self.assertEqual(result.skew, 0.)
+
+    def test_apply_all_write_behind(self):
+        good = ['A', 'B']
+        self._fleet.init(serial_numbers=good, check=True)
+        board = self._fleet['A']
+        board.enable_write_behind(linger=0.2)
+        transfers = []
+        usb = board._io._usb
+
+        def recorded_usb(bytes_out, *args, **kwargs):
+            transfers.append(bytes_out)
+            usb(bytes_out, *args, **kwargs)
+
+        board._io._usb = recorded_usb
+        try:
+            self._fleet.stage_weights(np.full((12, 4), 0.5), serial_numbers=good, check=True)
+            result = self._fleet.apply_all(serial_numbers=good)
+        finally:
+            board.enable_write_behind(False)
+        self.assertEqual(result.errors, {})
+        # Staged writes were sent ahead, the last transfer only carries the strobe
+        self.assertGreater(sum(transfers), 100)
+        self.assertLess(transfers[-1], 10)
+        np.testing.assert_allclose(board.get_weights(), 0.5, atol=1 / 255)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import threading
+import time
+import unittest
+from unittest import mock
+from pyftdi.spi import SpiController
+from merlin2.io import BusLock, Mpsse, TransportStats, priority, get_priority, REALTIME, \
+    CONTROL, MONITORING
+
+
+class BusLockTestCase(unittest.TestCase):
+
+    def _contend(self, lock, requests):
+        # Queue requests of (priority, name) behind the main thread, then release
+        order = []
+
+        def worker(value, name):
+            with priority(value), lock:
+                order.append(name)
+
+        lock.acquire()
+        threads = []
+        for value, name in requests:
+            thread = threading.Thread(target=worker, args=(value, name))
+            thread.start()
+            threads.append(thread)
+            while lock.stats()['realtime'].queued + lock.stats()['control'].queued + \
+                    lock.stats()['monitoring'].queued < len(threads):
+                time.sleep(1e-3)
+        lock.release()
+        for thread in threads:
+            thread.join()
+        return order
+
+    def test_priority(self):
+        lock = BusLock()
+        order = self._contend(lock, [(MONITORING, 'm0'), (CONTROL, 'c0'), (MONITORING, 'm1'),
+                                     (REALTIME, 'r0'), (CONTROL, 'c1')])
+        self.assertEqual(order, ['r0', 'c0', 'c1', 'm0', 'm1'])
+        stats = lock.stats(reset=True)
+        self.assertEqual(stats['monitoring'].grants, 2)
+        self.assertEqual(stats['monitoring'].max_queued, 2)
+        self.assertEqual(stats['monitoring'].queued, 0)
+        self.assertGreater(stats['monitoring'].max_wait, stats['realtime'].max_wait)
+        self.assertEqual(lock.stats()['control'].grants, 0)
+
+    def test_bounded_wait(self):
+        lock = BusLock(max_wait=(None, None, 0.))
+        order = self._contend(lock, [(CONTROL, 'c0'), (MONITORING, 'm0'), (REALTIME, 'r0')])
+        self.assertEqual(order, ['m0', 'r0', 'c0'])
+        self.assertEqual(lock.stats()['monitoring'].overdue, 1)
+
+    def test_reentrant(self):
+        lock = BusLock()
+        errors = []
+
+        def release():
+            try:
+                lock.release()
+            except RuntimeError as e:
+                errors.append(e)
+
+        with lock:
+            with lock:
+                pass
+            thread = threading.Thread(target=release)
+            thread.start()
+            thread.join()
+        self.assertEqual(len(errors), 1)
+        with self.assertRaises(RuntimeError):
+            lock.release()
+
+    def test_thread_priority(self):
+        self.assertEqual(get_priority(), CONTROL)
+        with priority(MONITORING):
+            with priority(REALTIME):
+                self.assertEqual(get_priority(), REALTIME)
+            self.assertEqual(get_priority(), MONITORING)
+        self.assertEqual(get_priority(), CONTROL)
+        with self.assertRaises(ValueError):
+            with priority(3):
+                pass
+
+
+class TransportStatsTestCase(unittest.TestCase):
+
+    def test_cancel(self):
+        stats = TransportStats()
+        outer = stats.start()
+        inner = stats.start()
+        stats.record('gpio0', 'gpio_write', inner)
+        stats.record('cs0', 'read', outer, 0, 2)
+        total = stats.snapshot()['time']
+        self.assertGreater(total, 0)
+        # A call that raised is not counted and does not stop the total time
+        stats.start()
+        stats.cancel()
+        start = stats.start()
+        time.sleep(1e-3)
+        stats.record('cs0', 'read', start, 0, 2)
+        snapshot = stats.snapshot()
+        self.assertGreaterEqual(snapshot['time'] - total, 1e-3)
+        self.assertEqual(snapshot['operations'][('cs0', 'read')].count, 2)
+        self.assertEqual(snapshot['bytes_in'], 4)
+
+
+class MpsseTestCase(unittest.TestCase):
+
+    def test_supported(self):
+        dev = SpiController(cs_count=2)
+        mpsse = Mpsse(dev)
+        self.assertEqual(mpsse.clock(), (dev.frequency, False))
+        self.assertEqual(mpsse.direction, dev.direction)
+
+    def test_unsupported(self):
+        with mock.patch('pyftdi.__version__', '0.58.0'):
+            with self.assertRaises(RuntimeError):
+                Mpsse(SpiController())
+        dev = SpiController()
+        del dev._cs_bits
+        with self.assertRaises(RuntimeError):
+            Mpsse(dev)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -21,6 +21,8 @@ POSSIBILITY OF SUCH DAMAGE.
 from random import randint, shuffle, sample, choice
 from functools import partial
 import numpy as np
+from merlin2.merlin2b import FilterModel, Quantizer, DigitalTwin
+from merlin2.tracker import ChannelTracker
 
 
 class Merlin2bTestCase:
@@ -163,6 +165,65 @@ class Merlin2bTestCase:
                 error = 20 * np.log10(np.max(np.abs(wdata - rdata)))
                 self.assertLess(error, -50) # This error ought to be less than 50 dB
 
+        # set_weights with quantizer
+        for chain in (True, False):
+            self._dut.setup(2, 2, 80e6, 1700e6, chain=chain)
+            model = FilterModel.from_ic(self._dut.ic)
+            quantizer = Quantizer(model, model.grid(64))
+            num_taps, num_filters = model.shape
+            wdata = (np.random.rand(num_taps, num_filters) * 2 - 1) + \
+                    1j * (np.random.rand(num_taps, num_filters) * 2 - 1)
+            mapped = self._dut.set_weights(wdata, quantizer=quantizer)
+            codes = quantizer(wdata)
+            self.assertTrue(np.array_equal(mapped,
+                                           (codes[..., 0] / 255) + 1j * (codes[..., 1] / 255)))
+            self.assertTrue(np.array_equal(self._dut.get_weights(), mapped))
+
+        # set_weights with previous
+        for chain in (True, False):
+            self._dut.setup(2, 2, 80e6, 1700e6, chain=chain)
+            num_taps = 23 if chain else 12
+            num_filters = 2 if chain else 4
+            wdata = (np.random.rand(num_taps, num_filters) * 2 - 1) + \
+                    1j * (np.random.rand(num_taps, num_filters) * 2 - 1)
+            previous = self._dut.set_weights(wdata)
+            wdata[randint(0, num_taps - 1), randint(0, num_filters - 1)] *= -1
+            mapped = self._dut.set_weights(wdata, previous=previous)
+            self.assertTrue(np.array_equal(self._dut.get_weights(), mapped))
+
+        # ChannelTracker
+        for method in ChannelTracker.METHODS:
+            self._dut.setup(2, 2, 80e6, 1700e6)
+            model = FilterModel.from_ic(self._dut.ic)
+            freqs = model.grid(32)
+            wdata = (np.random.rand(12, 4) - 0.5) + 1j * (np.random.rand(12, 4) - 0.5)
+            channel = model.response(wdata, freqs)
+            tracker = ChannelTracker(self._dut, model, freqs, method=method, apply_every=2)
+            if method == 'rls':
+                mapped = tracker.run(channel for _ in range(10))
+            else:
+                def residuals():
+                    for _ in range(50):
+                        yield channel - model.response(self._dut.get_weights(), freqs)
+                mapped = tracker.run(residuals())
+            self.assertTrue(np.array_equal(self._dut.get_weights(), mapped))
+            error = np.sum(np.abs(model.response(mapped, freqs) - channel) ** 2) / \
+                    np.sum(np.abs(channel) ** 2)
+            self.assertLess(error, 1e-2)
+            self.assertGreater(tracker.num_pushes, 0)
+
+        # DigitalTwin
+        for chain in (True, False):
+            self._dut.setup(2, 2, 80e6, 1700e6, chain=chain)
+            num_taps = 23 if chain else 12
+            num_filters = 2 if chain else 4
+            wdata = self._dut.set_weights(np.random.rand(num_taps, num_filters) - 0.5)
+            twin = DigitalTwin.from_ic(self._dut.ic, 160e6)
+            self.assertTrue(np.array_equal(twin.weights, wdata))
+            self.assertEqual(twin.num_inputs, 1 if chain else 2)
+            samples = np.random.randn(1000, twin.num_inputs) + 0j
+            self.assertEqual(twin.run(samples).shape, (1000, 2))
+
         # clear_weights
         for chain in (True, False):
             self._dut.setup(2, 2, 80e6, 1700e6, chain=chain)
@@ -174,6 +235,23 @@ class Merlin2bTestCase:
             self.assertTrue(mapped.dtype == np.complex128)
             self.assertTrue(np.count_nonzero(mapped) == 0)
 
+    def test_attach(self):
+        self._dut.setup(1, 2, 40e6, 1700e6, chain=True)
+        weights = np.zeros((23, 2), dtype=np.complex128)
+        weights[3, 0] = 0.5 - 0.25j
+        self._dut.set_weights(weights)
+        gains = self._dut.get_gain_profile()
+        self._dut.ic._chained = False
+        state = self._dut.attach()
+        self.assertTrue(state['configured'])
+        self.assertTrue(state['chained'])
+        self.assertTrue(self._dut.ic._chained)
+        self.assertEqual(state['bandwidth'], 40e6)
+        self.assertEqual(state['gains'], gains)
+        self.assertEqual(len(state['downmixers']), len(self._dut.downmixers))
+        np.testing.assert_allclose(state['weights'], self._dut.get_weights())
+        np.testing.assert_allclose(state['weights'][3, 0], 0.5 - 0.25j, atol=1 / 255)
+
     def test_filter(self):
         """Test Merlin2b filter."""
         attrs = {
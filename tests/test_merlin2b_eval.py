@@ -20,8 +20,12 @@ POSSIBILITY OF SUCH DAMAGE.
 
 import unittest
 from merlin2 import Merlin2bEval
+from merlin2.sampler import AdcSampler
+from merlin2.optimizer import WeightOptimizer
 from test_merlin2b import Merlin2bTestCase
 from random import randint
+from time import sleep
+import numpy as np
 
 
 class Merlin2bEvalTestCase(unittest.TestCase, Merlin2bTestCase):
@@ -39,6 +43,69 @@ class Merlin2bEvalTestCase(unittest.TestCase, Merlin2bTestCase):
         self.assertIsInstance(value, float)
         self.assertTrue(0 <= value < 1)
 
+    def test_adc_block(self):
+        for count in (1, 100, 1000):
+            values = self._dut.adc.read_block(count)
+            self.assertIsInstance(values, np.ndarray)
+            self.assertEqual(values.shape, (count,))
+            self.assertEqual(values.dtype, np.float32)
+            self.assertTrue(((values >= 0) & (values < 1)).all())
+            self.assertGreater(self._dut.adc.sample_rate, 0)
+        words = self._dut.adc.read_block(100, dtype=np.uint16)
+        self.assertEqual(words.dtype, np.uint16)
+        self.assertTrue((words < 4096).all())
+
+    def test_adc_sampler(self):
+        sampler = AdcSampler(self._dut.adc, length=4096, block_size=64, decimation=32)
+        with sampler:
+            # Foreground traffic must interleave with the sampler
+            for it in range(10):
+                self.assertTrue(self._dut.probe())
+                sleep(10e-3)
+        self.assertIsNone(sampler.error)
+        self.assertGreater(sampler.count, 0)
+        samples = sampler.latest(100)
+        self.assertTrue(len(samples) <= 100)
+        self.assertTrue(((samples['value'] >= 0) & (samples['value'] < 1)).all())
+        self.assertTrue((np.diff(samples['time']) >= 0).all())
+        windows = sampler.latest_windows()
+        self.assertTrue((windows['min'] <= windows['mean']).all())
+        self.assertTrue((windows['mean'] <= windows['max']).all())
+
+    def test_optimizer(self):
+        for chain in (True, False):
+            self._dut.setup(2, 2, 80e6, 1700e6, chain=chain)
+            shape = (23, 2) if chain else (12, 4)
+            for method in WeightOptimizer.METHODS:
+                optimizer = WeightOptimizer(self._dut, num_samples=16, seed=0)
+                result = optimizer.run(np.zeros(shape, dtype=np.complex128),
+                                       method=method, iterations=2)
+                self.assertIsInstance(result.weights, np.ndarray)
+                self.assertEqual(result.weights.shape, shape)
+                self.assertTrue(np.array_equal(result.weights, self._dut.get_weights()))
+                self.assertTrue(0 <= result.cost < 1)
+                self.assertEqual(result.cost, result.trace.min())
+                self.assertGreater(result.num_probes, 0)
+
+    def test_stats(self):
+        io = self._dut._io
+        self.assertIsNone(io.stats())
+        io.enable_stats()
+        self.assertTrue(self._dut.probe())
+        self._dut.adc.read_block(100)
+        stats = io.stats(reset=True)
+        operations = stats['operations']
+        self.assertIn(('cs2', 'exchange'), operations)
+        self.assertEqual(operations[('cs3', 'read')].bytes_in, 200)
+        for op in operations.values():
+            self.assertEqual(sum(op.histogram), op.count)
+            self.assertTrue(0 <= op.min_time <= op.max_time <= op.time)
+        self.assertGreater(stats['time'], 0)
+        self.assertLessEqual(stats['time'], stats['window'])
+        self.assertEqual(io.stats()['operations'], {})
+        io.enable_stats(False)
+        self.assertIsNone(io.stats())
+
     def test_downmixer(self):
         """Test LTC5586 downmixer."""
         for dm in self._dut.downmixers:
@@ -0,0 +1,48 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import unittest
+import numpy as np
+from merlin2 import microbench
+
+
+class MicrobenchTestCase(unittest.TestCase):
+
+    def test_null_transport(self):
+        ic = microbench.null_ic()
+        weights = np.full((12, 4), 0.5 + 0.25j)
+        ic.set_weights(weights, apply=False)
+        self.assertEqual(ic._iface.bytes_out, 4 * (2 + 12 * 4))
+        self.assertEqual(ic.read(0x0), 0x00010203)
+        self.assertEqual(ic.filters[0][0].get_weights().shape, (12, 3))
+
+    def test_run(self):
+        names = ('merlin2b_read', 'output_get_dc_offset')
+        results = microbench.run(repeat=1, names=names)
+        self.assertEqual(set(results), set(names))
+        for result in results.values():
+            self.assertGreater(result['ns_per_op'], 0)
+            self.assertGreater(result['peak_bytes'], 0)
+        with self.assertRaises(ValueError):
+            microbench.run(names=('unknown',))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,237 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import unittest
+import numpy as np
+import os
+import tempfile
+from merlin2.merlin2b import FilterModel, WeightSolver, Quantizer, GainProfileOptimizer, \
+    DigitalTwin
+
+
+class FilterModelTestCase(unittest.TestCase):
+
+    def test_response(self):
+        rng = np.random.default_rng(0)
+        for bandwidth in (20e6, 40e6, 80e6):
+            for chain in (True, False):
+                model = FilterModel(bandwidth, chain=chain)
+                num_taps, num_filters = model.shape
+                freqs = model.grid(32)
+                weights = rng.standard_normal((num_taps, num_filters)) + \
+                          1j * rng.standard_normal((num_taps, num_filters))
+                response = model.response(weights, freqs)
+                self.assertEqual(response.shape, (32, num_filters))
+                gains = np.concatenate(([0.], np.cumsum(model.gains)))
+                expected = np.zeros((32, num_filters), dtype=np.complex128)
+                for k in range(num_taps):
+                    tap = 10 ** (gains[k] / 20) * \
+                          np.exp(-2j * np.pi * freqs * k * model.tap_delay)
+                    expected += np.outer(tap, weights[k, :])
+                self.assertTrue(np.allclose(response, expected))
+
+    def test_vectorized(self):
+        rng = np.random.default_rng(0)
+        model = FilterModel(80e6, gains=(-4, -2, 2, 0, -2, 0, 2, 0, -2, 0, 2))
+        freqs = model.grid(16)
+        weights = rng.standard_normal((3, 5, 12, 4)) + 1j * rng.standard_normal((3, 5, 12, 4))
+        response = model.response(weights, freqs)
+        self.assertEqual(response.shape, (3, 5, 16, 4))
+        self.assertTrue(np.allclose(response[2, 4], model.response(weights[2, 4], freqs)))
+
+    def test_basis_cache(self):
+        model = FilterModel(40e6, chain=True)
+        freqs = model.grid(8)
+        basis = model.basis(freqs)
+        self.assertEqual(basis.shape, (8, 23))
+        self.assertIs(basis, FilterModel(40e6, chain=True).basis(freqs.copy()))
+        self.assertIsNot(basis, FilterModel(20e6, chain=True).basis(freqs))
+        self.assertFalse(basis.flags.writeable)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            FilterModel(10e6)
+        with self.assertRaises(TypeError):
+            FilterModel(80e6, gains=(0,) * 11, chain=True)
+        with self.assertRaises(ValueError):
+            FilterModel(80e6, gains=(2,) * 11)
+        with self.assertRaises(TypeError):
+            FilterModel(80e6).response(np.zeros((23, 2)), np.zeros(4))
+
+
+class WeightSolverTestCase(unittest.TestCase):
+
+    def test_solve(self):
+        rng = np.random.default_rng(0)
+        for chain in (True, False):
+            model = FilterModel(80e6, chain=chain)
+            freqs = model.grid(64)
+            solver = WeightSolver(model, freqs)
+            num_taps, num_filters = model.shape
+            weights = rng.uniform(-0.5, 0.5, (20, num_taps, num_filters)) + \
+                      1j * rng.uniform(-0.5, 0.5, (20, num_taps, num_filters))
+            channel = model.response(weights, freqs)
+            exact = solver.solve(channel, quantize=False)
+            self.assertEqual(exact.shape, (20, num_taps, num_filters))
+            self.assertLess(np.max(solver.residual(exact, channel)), 1e-3)
+            quantized = solver.solve(channel)
+            codes = np.stack((quantized.real, quantized.imag)) * 255
+            self.assertTrue(np.allclose(codes, np.round(codes)))
+            self.assertTrue((np.abs(codes) <= 255 + 1e-9).all())
+            # Quantization-aware refinement beats independent rounding
+            rounded = (np.round(exact.real * 255) + 1j * np.round(exact.imag * 255)) / 255
+            self.assertLess(np.sum(solver.residual(quantized, channel)),
+                            np.sum(solver.residual(rounded, channel)))
+
+    def test_range(self):
+        model = FilterModel(20e6)
+        freqs = model.grid(16)
+        solver = WeightSolver(model, freqs)
+        channel = 100 * np.ones((16, 4), dtype=np.complex128)
+        for quantize in (True, False):
+            weights = solver.solve(channel, quantize=quantize)
+            self.assertTrue((np.abs(weights.real) <= 1).all())
+            self.assertTrue((np.abs(weights.imag) <= 1).all())
+
+
+class QuantizerTestCase(unittest.TestCase):
+
+    def test_quantize(self):
+        rng = np.random.default_rng(0)
+        for chain in (True, False):
+            model = FilterModel(40e6, chain=chain)
+            freqs = model.grid(48)
+            num_taps, num_filters = model.shape
+            weights = rng.uniform(-1, 1, (50, num_taps, num_filters)) + \
+                      1j * rng.uniform(-1, 1, (50, num_taps, num_filters))
+            for workers in (1, 4):
+                codes, error = Quantizer(model, freqs, workers=workers).quantize(weights)
+                self.assertEqual(codes.shape, (50, num_taps, num_filters, 2))
+                self.assertEqual(codes.dtype, np.int16)
+                self.assertTrue((np.abs(codes) <= 255).all())
+                self.assertEqual(error.shape, (50, num_filters))
+                basis = model.basis(freqs)
+                reference = np.sum(np.abs(basis @ weights) ** 2, axis=-2)
+                def residual(codes):
+                    quantized = (codes[..., 0] + 1j * codes[..., 1]) / 255
+                    return np.sum(np.abs(basis @ (quantized - weights)) ** 2, axis=-2) / reference
+                self.assertTrue(np.allclose(residual(codes), error))
+                rounded = np.stack((np.round(weights.real * 255),
+                                    np.round(weights.imag * 255)), axis=-1)
+                self.assertTrue((error <= residual(rounded) + 1e-12).all())
+                self.assertLess(np.sum(error), np.sum(residual(rounded)))
+
+    def test_quantize_workers(self):
+        model = FilterModel(40e6)
+        weights = np.random.default_rng(0).uniform(-1, 1, (20,) + model.shape)
+        with Quantizer(model, model.grid(48), workers=4) as quantizer:
+            codes, _ = quantizer.quantize(weights)
+            pool = quantizer._pool
+            np.testing.assert_array_equal(quantizer(weights), codes)
+            # The worker threads are kept between calls
+            self.assertIs(quantizer._pool, pool)
+        self.assertIsNone(quantizer._pool)
+        with Quantizer(model, model.grid(48)) as quantizer:
+            np.testing.assert_array_equal(quantizer(weights), codes)
+            self.assertIsNone(quantizer._pool)
+
+
+class GainProfileOptimizerTestCase(unittest.TestCase):
+
+    def test_optimize(self):
+        model = FilterModel(80e6, gains=(-4, -2, 2, 2, -2, 0, 2, 0, -2, -2, 0))
+        freqs = model.grid(32)
+        rng = np.random.default_rng(0)
+        weights = rng.uniform(-1, 1, (12, 4)) + 1j * rng.uniform(-1, 1, (12, 4))
+        channel = model.response(weights, freqs)
+        results = GainProfileOptimizer(80e6, freqs, workers=2).optimize(channel, top_k=3)
+        self.assertEqual(len(results), 3)
+        errors = [result.error for result in results]
+        self.assertEqual(errors, sorted(errors))
+        default = FilterModel(80e6)
+        fitted = default.response(WeightSolver(default, freqs).solve(channel), freqs)
+        reference = np.sum(np.abs(fitted - channel) ** 2) / np.sum(np.abs(channel) ** 2)
+        self.assertLessEqual(errors[0], reference)
+        for result in results:
+            self.assertEqual(len(result.gains), 11)
+            self.assertEqual(result.weights.shape, (12, 4))
+            profile = FilterModel(80e6, result.gains)
+            residual = np.sum(np.abs(profile.response(result.weights, freqs) - channel) ** 2)
+            self.assertAlmostEqual(residual / np.sum(np.abs(channel) ** 2), result.error)
+
+    def test_chained(self):
+        rng = np.random.default_rng(0)
+        model = FilterModel(40e6, chain=True)
+        freqs = model.grid(32)
+        channel = model.response(rng.uniform(-1, 1, (23, 2)) + 0j, freqs)
+        results = GainProfileOptimizer(40e6, freqs, chain=True, workers=1) \
+            .optimize(channel, top_k=2, rounds=1)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(results[0].gains), 22)
+        self.assertEqual(results[0].weights.shape, (23, 2))
+
+
+class DigitalTwinTestCase(unittest.TestCase):
+
+    def test_response(self):
+        rng = np.random.default_rng(0)
+        for chain in (True, False):
+            model = FilterModel(40e6, chain=chain)
+            weights = rng.uniform(-1, 1, model.shape) + \
+                      1j * rng.uniform(-1, 1, model.shape)
+            twin = DigitalTwin(model, weights, 100e6)
+            freqs = model.grid(32)
+            # Frequency response of the impulse responses without latency
+            n = np.arange(twin.length) - twin.latency
+            response = np.einsum('fn,ion->fio', np.exp(-2j * np.pi * np.outer(freqs, n) / 100e6),
+                                 twin.impulse_response)
+            response = response.reshape(32, -1)
+            expected = model.response(weights, freqs)
+            self.assertLess(np.max(np.abs(response - expected)), 1e-3 * np.max(np.abs(expected)))
+
+    def test_stream(self):
+        rng = np.random.default_rng(0)
+        for chain in (True, False):
+            model = FilterModel(80e6, chain=chain)
+            weights = rng.uniform(-1, 1, model.shape) + \
+                      1j * rng.uniform(-1, 1, model.shape)
+            twin = DigitalTwin(model, weights, 160e6, fft_size=256)
+            num_samples = 10000
+            with tempfile.TemporaryDirectory() as path:
+                inputs = np.memmap(os.path.join(path, 'inputs'), dtype=np.complex64, mode='w+',
+                                   shape=(num_samples, twin.num_inputs))
+                inputs[:] = rng.standard_normal((num_samples, twin.num_inputs)) + \
+                            1j * rng.standard_normal((num_samples, twin.num_inputs))
+                out = np.memmap(os.path.join(path, 'out'), dtype=np.complex64, mode='w+',
+                                shape=(num_samples, 2))
+                with twin:
+                    twin.run(inputs, out=out, chunk_size=3000)
+                expected = np.zeros((num_samples + twin.length - 1, 2), dtype=np.complex128)
+                for inp in range(twin.num_inputs):
+                    for out_index in range(2):
+                        expected[:, out_index] += np.convolve(
+                            inputs[:, inp], twin.impulse_response[inp, out_index])
+                expected = expected[twin.latency:twin.latency + num_samples]
+                self.assertLess(np.max(np.abs(out - expected)), 1e-4)
+                del inputs, out
+
+
+if __name__ == '__main__':
+    unittest.main()
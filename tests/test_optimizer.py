@@ -0,0 +1,66 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import unittest
+import numpy as np
+from merlin2.optimizer import WeightOptimizer
+from merlin2.plan import Ads7866Model, plan_eval
+
+
+class WeightOptimizerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._board = plan_eval()
+        self._board.init()
+        self._board.setup(2, 2, 80e6, 1700e6)
+        adc = [m for m in self._board._adc_io.devices.values() if isinstance(m, Ads7866Model)]
+        self._adc = adc[0]
+        rng = np.random.default_rng(1)
+        self._mask = np.zeros((12, 4), dtype=bool)
+        self._mask[:2, :2] = True
+        self._target = np.zeros((12, 4), dtype=np.complex128)
+        self._target[self._mask] = rng.uniform(-0.8, 0.8, 4) + 1j * rng.uniform(-0.8, 0.8, 4)
+        # The ADC reads the squared distance of the applied weights to the target
+        set_weights = self._board.ic.set_weights
+
+        def traced_set_weights(weights, apply=True):
+            mapped = set_weights(weights, apply=apply)
+            cost = np.sum(np.abs(mapped - self._target)[self._mask] ** 2) / 4
+            self._adc.code = min(int(cost * 4096), 0xFFF)
+            return mapped
+
+        self._board.ic.set_weights = traced_set_weights
+
+    def test_convergence(self):
+        start = np.zeros((12, 4), dtype=np.complex128)
+        for method, step in (('spsa', 1.), ('gradient', 0.1), ('coordinate', 0.1)):
+            optimizer = WeightOptimizer(self._board, num_samples=4, discard=0,
+                                        mask=self._mask, seed=0)
+            result = optimizer.run(start, method=method, iterations=100, step=step)
+            self.assertLess(result.cost, result.trace[0] / 100, method)
+            self.assertEqual(result.cost, result.trace.min())
+            np.testing.assert_array_equal(result.weights[~self._mask], 0)
+            np.testing.assert_allclose(result.weights[self._mask], self._target[self._mask],
+                                       atol=0.05, err_msg=method)
+            np.testing.assert_array_equal(result.weights, self._board.get_weights())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,306 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import threading
+import unittest
+from unittest import mock
+import numpy as np
+from merlin2.io import Controller
+from merlin2.merlin2b.input import Input
+from merlin2.merlin2b_board import BoardLayout, Merlin2bEval
+from merlin2.plan import LatencyModel, plan_eval, plan_test
+from test_merlin2b import Merlin2bTestCase
+
+
+class PlanEvalTestCase(unittest.TestCase, Merlin2bTestCase):
+
+    def setUp(self):
+        self._dut = plan_eval()
+        self._dut.init()
+
+    def test_report(self):
+        io = self._dut._io
+        with io.measure() as report:
+            self._dut.setup(2, 2, 80e6, 1700e6)
+        report = report[0]
+        self.assertGreater(report.usb_writes, 0)
+        self.assertGreaterEqual(report.usb_writes, report.usb_reads)
+        self.assertEqual(report.spi_writes, sum(d['writes'] for d in report.devices.values()))
+        self.assertGreater(report.rmw_reads, 0)
+        self.assertGreater(report.time, 0)
+        self.assertEqual(len(io.operations), report.spi_writes + report.spi_reads +
+                         report.gpio_updates + sum(op.kind == 'gpio_get' for op in io.operations))
+        # A transaction batches the weight writes and APLS toggle into one USB write
+        with io.measure() as report:
+            with io.transaction():
+                self._dut.set_weights(np.zeros((12, 4)))
+        self.assertEqual(report[0].transactions, 1)
+        self.assertEqual(report[0].spi_writes, 4)
+        self.assertEqual(report[0].usb_writes - report[0].usb_reads, 1)
+
+    def test_attach(self):
+        self._dut.setup(2, 2, 80e6, 1700e6)
+        self._dut.set_vga_gain(2.)
+        io = self._dut._io
+        # A second process attaching to the running board only reads
+        board = Merlin2bEval(controller=io)
+        with io.measure() as report:
+            state = board.attach()
+        self.assertEqual(report[0].spi_writes, 0)
+        # Merlin2b probe and one burst per region, downmixer probe and register file
+        self.assertEqual(report[0].spi_reads, 3 + 4 + 2 * (1 + 22))
+        self.assertFalse(state['chained'])
+        self.assertEqual(state['vga_gain'], self._dut.get_vga_gain())
+        self.assertEqual(state['downmixers'][0][0x0], self._dut.downmixers[0].read(0x0))
+        # Masked writes are served from the shadow
+        with io.measure() as report:
+            board.set_vga_gain(0.)
+            board.downmixers[0].vga_gain = 10
+        self.assertEqual(report[0].rmw_reads, 0)
+        # A discarded transaction invalidates it
+        with self.assertRaises(RuntimeError):
+            with io.transaction():
+                board.set_vga_gain(2.)
+                raise RuntimeError()
+        self.assertEqual(board.ic._shadow, {})
+        self.assertEqual(board.downmixers[0]._shadow, {})
+        with io.measure() as report:
+            board.set_vga_gain(0.)
+        self.assertEqual(report[0].rmw_reads, 2)
+
+    def test_adc(self):
+        with self._dut._io.measure() as report:
+            data = self._dut.adc.read_block(1000)
+        self.assertTrue(np.all(data == 0.5))
+        self.assertEqual(report[0].devices['ads7866']['reads'], 1000)
+        self.assertEqual(report[0].bytes_in, 2001)
+
+
+class PlanTestTestCase(unittest.TestCase, Merlin2bTestCase):
+
+    def setUp(self):
+        self._dut = plan_test()
+        self._dut.init()
+
+
+class PlanEvalDualTestCase(unittest.TestCase, Merlin2bTestCase):
+
+    def setUp(self):
+        self._dut = plan_eval(layout='ft2232h')
+        self._dut.init()
+
+    def test_interfaces(self):
+        ic_io, adc_io = self._dut._ios[1], self._dut._ios[2]
+        self.assertIs(self._dut._io, ic_io)
+        self.assertEqual(sorted(d.name for d in adc_io.devices.values()),
+                         ['ads7866', 'ltc5594[0]', 'ltc5594[1]'])
+        # ADC reads do not wait for the Merlin2b bus
+        done = threading.Event()
+        with ic_io.transaction():
+            thread = threading.Thread(target=lambda: (self._dut.adc.read_block(100),
+                                                      done.set()))
+            thread.start()
+            self.assertTrue(done.wait(5))
+        thread.join()
+        with ic_io.measure() as report:
+            self._dut.adc.read_block(100)
+        self.assertEqual(report[0].usb_writes, 0)
+        with self.assertRaises(ValueError):
+            plan_eval(layout='ft999h')
+        with self.assertRaises(ValueError):
+            Controller(device='4232h', interface=3)
+        # Interfaces without chip selects get the one chip select pyftdi requires
+        layout = BoardLayout('2232h', {'ic': (1, 0), 'downmixer0': (1, 1), 'downmixer1': (1, 2),
+                                       'adc': (1, 3)},
+                             {'reset': (1, 8), 'apls': (1, 9), 'miso_en': (2, 4)})
+        with mock.patch('merlin2.merlin2b_board.Controller') as controller:
+            Merlin2bEval(layout=layout)
+        self.assertEqual([call.kwargs['cs_count'] for call in controller.call_args_list],
+                         [4, 1])
+
+
+class PlanEvalWriteBehindTestCase(unittest.TestCase, Merlin2bTestCase):
+
+    def setUp(self):
+        self._dut = plan_eval()
+        self._dut.enable_write_behind()
+        self._dut.init()
+
+    def tearDown(self):
+        self._dut.enable_write_behind(False)
+
+    def test_write_behind(self):
+        io = self._dut._io
+        ic = self._dut.ic
+        self._dut.setup(2, 2, 80e6, 1700e6)
+        self._dut.flush()
+        write_behind = io._write_behind
+        coalesced = write_behind.coalesced
+        # Setters return while another thread holds the bus
+        done = threading.Event()
+
+        def setters():
+            for gain in (0., 2., 0., 4.):
+                ic.inputs[0].vga_gain = gain
+            ic.delays[0].rc_cal = 5
+            self._dut.barrier()
+            ic.delays[0].rc_cal = 6
+            done.set()
+
+        with io.lock:
+            thread = threading.Thread(target=setters)
+            thread.start()
+            self.assertTrue(done.wait(5))
+            thread.join()
+        self.assertEqual(write_behind.coalesced - coalesced, 3)
+        with io.measure() as report:
+            self._dut.flush()
+        self.assertLessEqual(report[0].spi_writes, 3)
+        self.assertLessEqual(report[0].usb_writes, 1)
+        gains = Input.VGA_GAIN_TABLE
+        self.assertEqual(ic.inputs[0].vga_gain, float(gains[np.abs(gains - 4.).argmin()]))
+        self.assertEqual(ic.delays[0].rc_cal, 6)
+        # apply() sends pending writes before toggling APLS
+        ic.delays[0].rc_cal = 7
+        self._dut.apply()
+        self.assertFalse(write_behind.pending)
+        # Disabling sends pending writes
+        ic.delays[0].rc_cal = 8
+        self._dut.enable_write_behind(False)
+        self.assertIsNone(io._write_behind)
+        self.assertEqual(ic.delays[0].rc_cal, 8)
+
+
+class FailedCommitTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._latency = LatencyModel()
+        self._dut = plan_eval(latency=self._latency)
+        self._dut.setup(2, 2, 80e6, 1700e6)
+        self._dut.attach()
+
+    def _assert_discarded(self):
+        self.assertEqual(self._dut.ic._shadow, {})
+        self.assertEqual(self._dut.downmixers[0]._shadow, {})
+
+    def test_commit(self):
+        io = self._dut._io
+        with self.assertRaises(OSError):
+            with io.transaction():
+                self._dut.set_vga_gain(2.)
+                self._dut.downmixers[0].vga_gain = 12
+                self._latency.fail = True
+        self._latency.fail = False
+        self._assert_discarded()
+        self.assertIsNone(io._transaction)
+
+    def test_direct_write(self):
+        self._latency.fail = True
+        with self.assertRaises(OSError):
+            self._dut.ic.delays[0].rc_cal = 3
+        with self.assertRaises(OSError):
+            self._dut.downmixers[0].vga_gain = 12
+        self._latency.fail = False
+        self._assert_discarded()
+
+    def test_masked_write(self):
+        # Masked writes after a failed commit merge against the device, not the shadow
+        io = self._dut._io
+        with self.assertRaises(OSError):
+            with io.transaction():
+                self._dut.ic.delays[0].rc_cal = 3
+                self._dut.downmixers[0].vga_gain = 12
+                self._latency.fail = True
+        self._latency.fail = False
+        with io.measure() as report:
+            self._dut.ic.delays[0].enable = (True, False, True)
+        self.assertEqual(report[0].spi_reads, 1)
+        self.assertEqual(report[0].rmw_reads, 1)
+        with self._dut._ios[1].measure() as report:
+            self._dut.downmixers[0].vga_gain = 10
+        self.assertEqual(report[0].rmw_reads, 1)
+        self.assertEqual(self._dut.ic.delays[0].rc_cal, 3)
+        self.assertEqual(self._dut.ic.delays[0].enable, (True, False, True))
+
+    def test_stats(self):
+        io = self._dut._io
+        io.enable_stats()
+        spi = self._dut.ic._iface
+        self._latency.fail = True
+        with self.assertRaises(OSError):
+            spi.read(2)
+        self._latency.fail = False
+        self.assertEqual(spi.read(2), bytes(2))
+        stats = io.stats()
+        self.assertEqual(stats['operations'][(spi._target, 'read')].count, 1)
+        self.assertGreater(stats['time'], 0)
+        self.assertEqual(stats['bytes_in'], 2)
+
+    def test_stats_usb_writes(self):
+        io = self._dut._io
+        io.enable_stats()
+        with io.measure() as report:
+            self._dut.set_weights(np.full((12, 4), 0.5))
+            self._dut.get_weights()
+        stats = io.stats()
+        self.assertGreater(stats['usb_writes'], 0)
+        self.assertEqual(stats['usb_writes'], report[0].usb_writes)
+
+    def _queue_writes(self):
+        self._dut.ic.delays[0].rc_cal = 3
+        self._dut.downmixers[0].vga_gain = 12
+
+    def test_write_behind(self):
+        io = self._dut._io
+        io.enable_write_behind()
+        try:
+            # Queue from another thread while the bus is held, then fail the batch
+            with io.lock:
+                thread = threading.Thread(target=self._queue_writes)
+                thread.start()
+                thread.join()
+                self.assertTrue(io._write_behind.pending)
+                self._latency.fail = True
+            # The sender or flush() sends the batch, flush() reports the failure either way
+            with self.assertRaises((OSError, RuntimeError)):
+                io.flush()
+            self._latency.fail = False
+            self._assert_discarded()
+        finally:
+            self._latency.fail = False
+            io.enable_write_behind(False)
+
+
+class PlanEvalQuadTestCase(unittest.TestCase, Merlin2bTestCase):
+
+    def setUp(self):
+        self._dut = plan_eval(layout='ft4232h')
+        self._dut.init()
+
+
+class PlanTestDualTestCase(unittest.TestCase, Merlin2bTestCase):
+
+    def setUp(self):
+        self._dut = plan_test(layout='ft2232h')
+        self._dut.init()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import unittest
+from time import perf_counter
+from merlin2.plan import plan_eval, plan_test
+from merlin2.ready import Readiness
+
+
+class ReadinessTestCase(unittest.TestCase):
+
+    def test_wait(self):
+        ready = Readiness(interval=1e-4, backoff=2., max_interval=1e-3)
+        polls = []
+        elapsed = ready.wait('poll', lambda: polls.append(1) or len(polls) > 5)
+        self.assertEqual(len(polls), 6)
+        self.assertGreater(elapsed, 0)
+        self.assertLess(elapsed, 0.1)
+        stats = ready.settle_times()['poll']
+        self.assertEqual(stats.count, 1)
+        self.assertEqual(stats.last, elapsed)
+
+    def test_minimum(self):
+        ready = Readiness()
+        start = perf_counter()
+        self.assertGreaterEqual(ready.wait('min', minimum=5e-3), 5e-3)
+        # The minimum is measured from start, time already spent counts
+        elapsed = ready.wait('min', minimum=5e-3, start=start)
+        self.assertGreaterEqual(elapsed, 5e-3)
+        self.assertLess(perf_counter() - start, 0.1)
+        stats = ready.settle_times(reset=True)['min']
+        self.assertEqual(stats.count, 2)
+        self.assertLessEqual(stats.min, stats.mean)
+        self.assertLessEqual(stats.mean, stats.max)
+        self.assertEqual(ready.settle_times(), {})
+
+    def test_timeout(self):
+        ready = Readiness(timeout=5e-3)
+        with self.assertRaises(RuntimeError):
+            ready.wait('never', lambda: False)
+        self.assertEqual(ready.settle_times(), {})
+        with self.assertRaises(ValueError):
+            Readiness(backoff=0.5)
+
+    def test_cold_init(self):
+        # The GPIO latch is 0 after open, which holds the IC in reset until init()
+        for plan in (plan_eval, plan_test):
+            dut = plan()
+            dut.readiness.timeout = 0.05
+            self.assertTrue(dut.ic._iface._device.in_reset)
+            self.assertFalse(dut.ic.probe())
+            dut.init()
+            self.assertFalse(dut.ic._iface._device.in_reset)
+            self.assertTrue(dut.probe())
+            dut.ic._resetn_gpio.set(True)
+            self.assertFalse(dut.ic.probe())
+            with self.assertRaises(RuntimeError):
+                dut.readiness.wait('reset', dut.ic.probe)
+        # The test board polls the IC after enabling the supplies instead of sleeping
+        dut = plan_test()
+        dut.readiness.timeout = 0.05
+        dut.init()
+        self.assertLess(dut.readiness.settle_times()['power'].last, 1e-3)
+        model = dut.ic._iface._device
+        model.MAGIC = {}
+        with self.assertRaises(RuntimeError):
+            dut.init()
+
+    def test_board(self):
+        for dut, name in ((plan_eval(), 'miso_en'), (plan_test(), 'power')):
+            dut.init()
+            dut.setup(2, 2, 80e6, 1700e6)
+            times = dut.readiness.settle_times()
+            self.assertEqual(set(times), {name, 'reset', 'bandgap'})
+            self.assertEqual(times['reset'].count, 2)
+            self.assertEqual(times[name].count, 1)
+            self.assertGreaterEqual(times['bandgap'].min, dut.ic.BANDGAP_SETTLE)
+            if name == 'miso_en':
+                # Measured from the MISO enable update, the IC reset counts towards it
+                self.assertGreaterEqual(times[name].min, 1e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
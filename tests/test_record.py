@@ -0,0 +1,80 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from merlin2.plan import plan_eval
+from merlin2.record import Recorder, RecordLog, Replayer, CONFIG
+
+
+class RecorderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'session.rec')
+        self._dut = plan_eval()
+        self._dut.init()
+        with Recorder(self._dut._io, self._path, size=256) as rec:
+            self._dut.setup(2, 2, 80e6, 1700e6)
+            self._dut.set_weights(np.full((12, 4), 0.25))
+            with self._dut._io.transaction() as txn:
+                self._dut.set_weights(np.full((12, 4), 0.125))
+                self._dut.adc.queue_block(txn, 8)
+            self._dut.adc.read_block(4)
+            self._dut.probe()
+        self._size = rec.size
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_log(self):
+        self.assertEqual(os.path.getsize(self._path), self._size)
+        with RecordLog(self._path) as log:
+            entries = list(log)
+            targets = log.targets()
+        self.assertEqual(sum(e.kind == CONFIG for e in entries), len(targets))
+        self.assertEqual(sorted(e.time for e in entries), [e.time for e in entries])
+        spi = {c['cs'] for c in targets.values() if c['type'] == 'spi'}
+        self.assertEqual(spi, {0, 1, 2, 3})
+
+    def test_replay(self):
+        dut = plan_eval()
+        with RecordLog(self._path) as log:
+            result = Replayer(log, dut._io).run()
+            self.assertEqual(result.num_entries, len(list(log)))
+        self.assertEqual(result.divergences, [])
+        np.testing.assert_array_equal(dut.get_weights(), self._dut.get_weights())
+
+    def test_divergence(self):
+        dut = plan_eval()
+        dut._io.devices[2].registers[0] = 0
+        with RecordLog(self._path) as log:
+            result = Replayer(log, dut._io).run(stop_on_divergence=True)
+        self.assertEqual(len(result.divergences), 1)
+        divergence = result.divergences[0]
+        self.assertEqual(divergence.target['cs'], 2)
+        self.assertEqual(divergence.expected, bytes.fromhex('abcd0100'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from time import sleep
+import numpy as np
+from merlin2.plan import plan_eval
+from merlin2.sampler import AdcSampler
+
+
+def _ramp(start, stop):
+    block = np.empty(stop - start, dtype=AdcSampler.SAMPLE_DTYPE)
+    block['time'] = np.arange(start, stop)
+    block['value'] = np.arange(start, stop)
+    return block
+
+
+class AdcSamplerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._board = plan_eval()
+        self._board.init()
+
+    def test_wraparound(self):
+        sampler = AdcSampler(self._board.adc, length=100, block_size=100, decimation=10)
+        sampler._push(_ramp(0, 70))
+        sampler._push(_ramp(70, 140))
+        self.assertEqual(sampler.count, 140)
+        np.testing.assert_array_equal(sampler.latest()['value'], np.arange(40, 140))
+        np.testing.assert_array_equal(sampler.latest(5)['value'], np.arange(135, 140))
+        # Blocks longer than the ring buffer keep their latest samples and are counted
+        sampler._push(_ramp(140, 390))
+        self.assertEqual(sampler.count, 390)
+        np.testing.assert_array_equal(sampler.latest()['value'], np.arange(290, 390))
+
+    def test_decimation(self):
+        sampler = AdcSampler(self._board.adc, length=100, block_size=100, decimation=40)
+        sampler._push(_ramp(0, 100))
+        sampler._push(_ramp(100, 200))
+        # The second push completes three windows, more than the two that fit
+        self.assertEqual(sampler._window_count, 5)
+        windows = sampler.latest_windows()
+        np.testing.assert_array_equal(windows['mean'], [139.5, 179.5])
+        np.testing.assert_array_equal(windows['min'], [120, 160])
+        np.testing.assert_array_equal(windows['max'], [159, 199])
+        np.testing.assert_array_equal(windows['time'], [139.5, 179.5])
+
+    def test_spill(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'spill.bin')
+            with AdcSampler(self._board.adc, length=256, block_size=64, decimation=16,
+                            spill=path, spill_length=1000) as sampler:
+                while sampler.count < 1200 and sampler.error is None:
+                    sleep(1e-3)
+            self.assertIsNone(sampler.error)
+            self.assertEqual(sampler.count % 64, 0)
+            self.assertEqual(sampler.spill_count, 1000)
+            self.assertEqual(sampler.spill_dropped, sampler.count - 1000)
+            self.assertEqual(len(sampler.latest_windows()), 16)
+            spill = np.memmap(path, dtype=AdcSampler.SAMPLE_DTYPE, mode='r')
+            np.testing.assert_array_equal(spill['value'], 0.5)
+            self.assertTrue(np.all(np.diff(spill['time']) >= 0))
+            del spill
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+import numpy as np
+from merlin2.plan import LatencyModel, plan_eval, plan_test
+from merlin2.shared import ShadowPublisher, ShadowReader
+
+
+class SharedShadowTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._dut = plan_eval()
+        self._dut.setup(2, 2, 40e6, 1700e6)
+        self._publisher = ShadowPublisher(self._dut)
+        self._reader = ShadowReader(self._publisher.name)
+
+    def tearDown(self):
+        self._reader.close()
+        self._publisher.close()
+
+    def test_state(self):
+        weights = np.zeros((12, 4), dtype=np.complex128)
+        weights[2, 1] = 0.3 + 0.1j
+        self._dut.set_weights(weights)
+        self._dut.set_vga_gain(2.)
+        self._dut.set_input_dc_offset(0.25, -0.5, input=1)
+        self._dut.downmixers[1].vga_gain = 12
+        io = self._dut._io
+        with io.measure() as report:
+            state = self._reader.state()
+        self.assertEqual(report[0].spi_reads + report[0].spi_writes, 0)
+        self.assertFalse(state['chained'])
+        self.assertEqual(state['bandwidth'], 40e6)
+        self.assertEqual(state['gains'], self._dut.get_gain_profile())
+        self.assertEqual(state['vga_gain'], self._dut.get_vga_gain())
+        self.assertEqual(state['input_dc_offset'][1], self._dut.ic.inputs[1].dc_offset)
+        self.assertEqual(state['output_dc_offset'][0], self._dut.ic.outputs[0].dc_offset)
+        np.testing.assert_array_equal(state['weights'], self._dut.get_weights())
+        self.assertEqual(state['downmixers'][1]['vga_gain'], 12.)
+        self.assertEqual(state['downmixers'][0]['dc_offset'], self._dut.downmixers[0].dc_offset)
+
+    def test_seqlock(self):
+        version = self._reader.version
+        self.assertEqual(version % 2, 0)
+        self._dut.ic.delays[0].rc_cal = 3
+        self.assertEqual(self._reader.version, version + 2)
+        # Readers retry while an update is in progress
+        timeout, self._reader.timeout = self._reader.timeout, 0.01
+        with self._publisher._write():
+            self.assertEqual(self._reader.version % 2, 1)
+            with self.assertRaises(RuntimeError):
+                self._reader.snapshot()
+        self._reader.timeout = timeout
+        updating = threading.Event()
+
+        def update():
+            with self._publisher._write():
+                updating.set()
+                time.sleep(0.05)
+
+        thread = threading.Thread(target=update)
+        thread.start()
+        updating.wait()
+        self.assertEqual(len(self._reader.snapshot()[1]), 2)
+        thread.join()
+        ic, downmixers = self._reader.snapshot()
+        self.assertEqual((ic[0x8] >> 5) & 0x1F, 3)
+        self.assertEqual(len(downmixers), 2)
+
+    def test_reset(self):
+        self._dut.reset()
+        state = self._reader.state()
+        self.assertIsNone(state['weights'])
+        self.assertIsNone(state['downmixers'][0]['vga_gain'])
+        self._publisher.fill()
+        self.assertIsNotNone(self._reader.state()['weights'])
+
+    def test_failed_commit(self):
+        latency = self._dut._io.latency = LatencyModel()
+        with self.assertRaises(OSError):
+            with self._dut._io.transaction():
+                self._dut.ic.delays[0].rc_cal = 3
+                # Issued values are visible before the commit
+                self.assertEqual((self._reader.snapshot()[0][0x8] >> 5) & 0x1F, 3)
+                latency.fail = True
+        latency.fail = False
+        state = self._reader.state()
+        self.assertIsNone(state['bandwidth'])
+        self.assertIsNone(state['weights'])
+        self.assertEqual(state['downmixers'][0]['registers'], {})
+        self._publisher.fill()
+        self.assertEqual(self._reader.state()['bandwidth'], 40e6)
+
+    def test_failed_fill(self):
+        dut = plan_eval()
+        dut.setup(1, 1, 80e6, 'default')
+        dut.reset()
+        dut._io.latency = LatencyModel()
+        dut._io.latency.fail = True
+        with self.assertRaises(OSError):
+            ShadowPublisher(dut, 'merlin2-test-failed-fill')
+        self.assertIs(type(dut.ic._shadow), dict)
+        with self.assertRaises(FileNotFoundError):
+            ShadowReader('merlin2-test-failed-fill')
+
+    def test_close(self):
+        self._publisher.close()
+        self.assertIs(type(self._dut.ic._shadow), dict)
+        self.assertIs(type(self._dut.downmixers[0]._shadow), dict)
+        # Drivers keep their shadow contents
+        with self._dut._io.measure() as report:
+            self._dut.ic.delays[0].rc_cal = 3
+        self.assertEqual(report[0].spi_reads, 0)
+
+    def test_process(self):
+        code = ('from merlin2.shared import ShadowReader\n'
+                'with ShadowReader({!r}) as reader:\n'
+                '    print(reader.state()["bandwidth"])\n').format(self._publisher.name)
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in (os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))), env.get('PYTHONPATH')) if p)
+        output = subprocess.check_output([sys.executable, '-c', code], env=env, timeout=60)
+        self.assertEqual(float(output), 40e6)
+
+    def test_test_board(self):
+        dut = plan_test()
+        dut.setup(1, 1, 80e6, 'default')
+        with ShadowPublisher(dut) as publisher, ShadowReader(publisher.name) as reader:
+            state = reader.state()
+        self.assertEqual(state['vga_gain'], dut.get_vga_gain())
+        self.assertEqual(state['downmixers'][0]['registers'], dut.downmixers[0]._shadow)
+
+
+if __name__ == '__main__':
+    unittest.main()
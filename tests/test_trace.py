@@ -0,0 +1,130 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import io
+import json
+import threading
+import unittest
+from time import sleep
+from merlin2.plan import plan_eval
+from merlin2.trace import Tracer
+from merlin2.merlin2b.delaygroup import DelayGroup
+
+
+class TracerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._dut = plan_eval()
+        self._dut.init()
+
+    def test_spans(self):
+        setter = DelayGroup.gains
+        with Tracer() as tracer:
+            with tracer.span('session'):
+                self._dut.setup(2, 2, 80e6, 1700e6)
+        # Hooks are removed on stop
+        self.assertIs(DelayGroup.gains, setter)
+        self._dut.probe()
+        spans = tracer.spans()
+        self.assertEqual(len(spans), tracer.count)
+        self.assertEqual(tracer.dropped, 0)
+        names = [span[0] for span in spans]
+        self.assertEqual(names[:3], ['session', 'Merlin2bBoard.setup', 'Merlin2b.setup'])
+        for name in ('DelayGroup.gains.set', 'Block.write', 'Merlin2b.write',
+                     'Merlin2b.read', 'PlanSpi.write', 'PlanSpi.query'):
+            self.assertIn(name, names)
+        # Spans nest within the session span
+        _, _, start, duration = spans[0]
+        for _, _, span_start, span_duration in spans[1:]:
+            self.assertGreaterEqual(span_start, start)
+            self.assertLessEqual(span_start + span_duration, start + duration)
+
+    def test_transaction(self):
+        with Tracer(layers=('transport',)) as tracer:
+            with self._dut._io.transaction():
+                self._dut.ic.write(0x1004, 0x1)
+                sleep(0.01)
+        spans = {span[0]: span for span in tracer.spans()}
+        # The span covers the with block up to the commit
+        _, _, start, duration = spans['BusController.transaction']
+        self.assertGreaterEqual(duration, 0.01)
+        _, _, write_start, _ = spans['PlanSpi.write']
+        self.assertGreater(write_start, start)
+
+    def test_layers(self):
+        with Tracer(layers=('board',)) as tracer:
+            self._dut.probe()
+        self.assertEqual([span[0] for span in tracer.spans()], ['Merlin2bBoard.probe'])
+        with self.assertRaises(ValueError):
+            Tracer(layers=('unknown',))
+
+    def test_capacity(self):
+        with Tracer(capacity=10) as tracer:
+            self._dut.probe()
+        self.assertEqual(tracer.count, 10)
+        self.assertGreater(tracer.dropped, 0)
+        tracer.clear()
+        self.assertEqual(tracer.count, 0)
+        # Concurrent spans are either recorded or counted as dropped
+        tracer = Tracer(capacity=100)
+
+        def record():
+            for _ in range(1000):
+                with tracer.span('span'):
+                    pass
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(tracer.count, 100)
+        self.assertEqual(tracer.dropped, 3900)
+
+    def test_single_tracer(self):
+        setter = DelayGroup.gains
+        with Tracer() as tracer:
+            with self.assertRaises(RuntimeError):
+                tracer.start()
+            with self.assertRaises(RuntimeError):
+                with Tracer():
+                    pass
+            self._dut.probe()
+        self.assertIs(DelayGroup.gains, setter)
+        self.assertGreater(tracer.count, 0)
+        # Hooks are removed on stop, so the next tracer can start
+        with Tracer() as other:
+            self._dut.probe()
+        self.assertEqual(other.count, tracer.count)
+
+    def test_export(self):
+        with Tracer() as tracer:
+            self._dut.probe()
+        fp = io.StringIO()
+        tracer.export(fp)
+        trace = json.loads(fp.getvalue())
+        events = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+        self.assertEqual(len(events), tracer.count)
+        self.assertTrue(all(e['dur'] >= 0 for e in events))
+        self.assertTrue(any(e['ph'] == 'M' for e in trace['traceEvents']))
+
+
+if __name__ == '__main__':
+    unittest.main()
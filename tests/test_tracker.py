@@ -0,0 +1,103 @@
+"""Copyright (C) Kumu Networks, Inc. All rights reserved.
+
+THIS SOFTWARE IS PROVIDED UNDER A SOFTWARE LICENSE AGREEMENT BY KUMU NETWORKS. BY DOWNLOADING THE
+SOFTWARE AND/OR CLICKING THE APPLICABLE BUTTON TO COMPLETE THE INSTALLATION PROCESS, YOU AGREE TO BE
+BOUND BY THE TERMS OF THIS AGREEMENT. IF YOU DO NOT WISH TO BECOME A PARTY TO THIS AGREEMENT AND BE
+BOUND BY ITS TERMS AND CONDITIONS, DO NOT INSTALL OR USE THE SOFTWARE, AND RETURN THE SOFTWARE
+WITHIN THIRTY (30) DAYS OF RECEIPT. ALL RETURNS TO KUMU WILL BE SUBJECT TO KUMU's THEN-CURRENT
+RETURN POLICY. IF YOU ARE ACCEPTING THESE TERMS ON BEHALF OF AN ENTITY, YOU AGREE THAT YOU HAVE
+AUTHORITY TO BIND THE ENTITY TO THESE TERMS.
+
+THIS SOFTWARE IS PROVIDED "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT
+OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import unittest
+import numpy as np
+from merlin2.merlin2b import FilterModel
+from merlin2.plan import plan_eval
+from merlin2.tracker import ChannelTracker
+
+
+class ChannelTrackerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._board = plan_eval()
+        self._board.setup(2, 2, 80e6, 1700e6)
+        self._model = FilterModel.from_ic(self._board.ic)
+        self._freqs = self._model.grid(32)
+        # Weights on the code grid, so the unregularized estimates map back to exact codes
+        rng = np.random.default_rng(0)
+        codes = rng.integers(-100, 101, (12, 4)) + 1j * rng.integers(-100, 101, (12, 4))
+        self._weights = codes / 255
+        self._applies = 0
+        apply = self._board.ic.apply
+
+        def counted_apply():
+            self._applies += 1
+            apply()
+
+        self._board.ic.apply = counted_apply
+
+    def _error(self, weights, channel):
+        residual = self._model.response(weights, self._freqs) - channel
+        return np.sum(np.abs(residual) ** 2) / np.sum(np.abs(channel) ** 2)
+
+    def test_rls(self):
+        channel = self._model.response(self._weights, self._freqs)
+        tracker = ChannelTracker(self._board, self._model, self._freqs, method='rls',
+                                 forgetting=0.5, regularization=0.)
+        mapped = tracker.run(channel for _ in range(5))
+        np.testing.assert_array_equal(mapped, self._board.get_weights())
+        np.testing.assert_allclose(mapped, self._weights, atol=1 / 255)
+        self.assertLess(self._error(mapped, channel), 1e-3)
+        # Unchanged estimates are not pushed again
+        self.assertEqual(tracker.num_updates, 5)
+        self.assertLessEqual(tracker.num_pushes, 2)
+
+    def test_lms(self):
+        channel = self._model.response(self._weights, self._freqs)
+        tracker = ChannelTracker(self._board, self._model, self._freqs, method='lms',
+                                 step=1., apply_every=3)
+
+        def residuals():
+            for _ in range(200):
+                yield channel - self._model.response(self._board.get_weights(), self._freqs)
+
+        mapped = tracker.run(residuals())
+        np.testing.assert_array_equal(mapped, self._board.get_weights())
+        self.assertLess(self._error(mapped, channel), 1e-2)
+        self.assertGreater(tracker.num_pushes, 3)
+        # APLS is toggled once per apply_every pushes, flush() applies the rest
+        self.assertEqual(self._applies, -(-tracker.num_pushes // 3))
+
+    def test_partial_writes(self):
+        channel = self._model.response(self._weights, self._freqs)
+        tracker = ChannelTracker(self._board, self._model, self._freqs, method='rls',
+                                 forgetting=1e-6, regularization=0.)
+        io = self._board._io
+        with io.measure() as full:
+            self.assertTrue(tracker.update(channel))
+        self.assertEqual(tracker.num_taps_written, np.count_nonzero(self._weights))
+        # A single changed tap only rewrites that tap
+        weights = self._weights.copy()
+        weights[5, 2] = (weights[5, 2].real * 255 + 7) / 255 + 1j * weights[5, 2].imag
+        with io.measure() as partial:
+            self.assertTrue(tracker.update(self._model.response(weights, self._freqs)))
+        self.assertEqual(tracker.num_taps_written, np.count_nonzero(self._weights) + 1)
+        writes = partial[0].devices['merlin2b']['writes']
+        self.assertGreater(writes, 0)
+        self.assertLess(writes, full[0].devices['merlin2b']['writes'])
+        tracker.flush()
+        np.testing.assert_allclose(self._board.get_weights(), weights, atol=1e-12)
+        self.assertFalse(tracker.update(self._model.response(weights, self._freqs)))
+
+
+if __name__ == '__main__':
+    unittest.main()